@@ -0,0 +1,262 @@
+"""End-to-end benchmark of the scraper (and extractor) against the local mock site.
+
+Starts benchmarks/mock_facebook.py in its own process, writes a link file for
+the synthetic posts, and runs scraper_script.run with each download engine.
+The extractor's HTTP tier and, when Chrome is available, its browser tier can
+be measured on the same posts. Every run reports pages/s, images/s, MB/s,
+p50/p99 fetch and download latency and peak RSS. It is appended to
+benchmarks/results/e2e.jsonl and compared with the previous run of the same
+scenario, label and settings.
+
+    python benchmarks/bench_e2e.py
+    python benchmarks/bench_e2e.py --posts 200 --engines threads,asyncio --latency 0.1 --throttle-rate 0.05
+    python benchmarks/bench_e2e.py --extractor http,browser --browsers 3 --label after-tab-tier
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+
+import scraper_script
+from mock_facebook import PAGE_HOST, CDN_HOST, config_arguments, config_from_args
+from rate_control import RateController
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+RESULTS_FILE = os.path.join(BENCH_DIR, "results", "e2e.jsonl")
+SAMPLE_INTERVAL = 0.2
+
+class PeakRSS:
+    """Peak resident memory of this process and its children (browsers) while the block runs."""
+
+    def __init__(self):
+        self.peak_mb = 0.0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        me = psutil.Process()
+        while not self.stop_event.is_set():
+            total = 0
+            for process in [me] + me.children(recursive=True):
+                try:
+                    total += process.memory_info().rss
+                except psutil.Error:
+                    pass
+            self.peak_mb = max(self.peak_mb, total / (1024 * 1024))
+            self.stop_event.wait(SAMPLE_INTERVAL)
+
+    def __enter__(self):
+        if psutil is not None:
+            self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if psutil is not None:
+            self.stop_event.set()
+            self.thread.join()
+        else:
+            # Lifetime peak of this process only (KB on Linux)
+            self.peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def histogram_quantile(metrics, name, q, **labels):
+    """q-th quantile of a run_metrics histogram, interpolated linearly inside its bucket."""
+    _, histograms = metrics.snapshot()
+    wanted = set(labels.items())
+    counts = None
+    for (key_name, key_labels), (bucket_counts, _, _) in histograms.items():
+        if key_name == name and wanted <= set(key_labels):
+            counts = bucket_counts if counts is None else [a + b for a, b in zip(counts, bucket_counts)]
+    if not counts or not sum(counts):
+        return None
+    target = q * sum(counts)
+    seen = 0
+    lower = 0.0
+    for index, count in enumerate(counts):
+        upper = metrics.buckets[index] if index < len(metrics.buckets) else lower
+        if count and seen + count >= target:
+            return round(lower + (upper - lower) * (target - seen) / count, 4)
+        seen += count
+        lower = upper
+    return round(lower, 4)
+
+def start_mock(args):
+    """Run the mock site in a child process so its memory and CPU are not counted. Returns (process, base URL)."""
+    command = [sys.executable, os.path.join(BENCH_DIR, "mock_facebook.py"), "--port", "0"]
+    for name, value in config_from_args(args).to_dict().items():
+        command += ["--" + name.replace("_", "-"), str(value)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    return process, process.stdout.readline().strip()
+
+def write_link_file(path, base_url, posts, photos_per_post, first_post_id=100000):
+    """Same link file as MockFacebookServer.write_link_file, for a server in another process."""
+    links = {}
+    for post_id in range(first_post_id, first_post_id + posts):
+        links[f"{base_url}/posts/{post_id}"] = [
+            f"{base_url}/photo/?fbid={post_id * 1000 + index}&set=pcb.{post_id}" for index in range(photos_per_post)]
+    with open(path, "w") as f:
+        json.dump(links, f)
+    return list(links)
+
+def reset_scraper_state():
+    """Fresh metrics, so runs in one process do not affect each other; run() creates fresh rate limits itself."""
+    scraper_script.metrics.reset()
+    # The mock serves pages from PAGE_HOST, which gets the facebook.com page limit
+    if PAGE_HOST not in scraper_script.PAGE_HOSTS:
+        scraper_script.PAGE_HOSTS += (PAGE_HOST,)
+
+def bench_scraper(engine, link_file):
+    reset_scraper_state()
+    scraper_script.DOWNLOAD_ENGINE = engine
+    scraper_script.QUIET = True
+    scraper_script.METRICS_REPORT = None
+    with tempfile.TemporaryDirectory() as output_folder, PeakRSS() as rss:
+        start_time = time.perf_counter()
+        summary = scraper_script.run(link_file, output_folder)
+        elapsed = time.perf_counter() - start_time
+    metrics = scraper_script.metrics
+    pages = metrics.counter('http_responses_total', host='page')
+    return {
+        'scenario': f"scraper:{engine}",
+        'seconds': round(elapsed, 3),
+        'pages_per_sec': round(pages / elapsed, 2),
+        'images_per_sec': round(summary.images / elapsed, 2),
+        'mb_per_sec': round(summary.bytes / 1e6 / elapsed, 2),
+        'images': summary.images,
+        'bytes': summary.bytes,
+        'fetch_p50': histogram_quantile(metrics, 'stage_seconds', 0.5, stage='fetch'),
+        'fetch_p99': histogram_quantile(metrics, 'stage_seconds', 0.99, stage='fetch'),
+        'download_p50': histogram_quantile(metrics, 'stage_seconds', 0.5, stage='download'),
+        'download_p99': histogram_quantile(metrics, 'stage_seconds', 0.99, stage='download'),
+        'throttled': metrics.counter('http_responses_total', status=429),
+        'errors': metrics.counter('http_errors_total'),
+        'peak_rss_mb': round(rss.peak_mb, 1),
+    }
+
+def bench_extractor(tier, post_urls, browsers):
+    import extractor_script
+    # The extractor has its own metrics and HTTP rate limits; reset them like the scraper's
+    extractor_script.metrics.reset()
+    extractor_script.http_rate_controller = RateController(extractor_script.HTTP_TIER_WORKERS)
+    extractor_script.QUIET = True
+    stats = extractor_script.TierStats(tier)
+    with PeakRSS() as rss:
+        start_time = time.perf_counter()
+        if tier == "http":
+            results, _ = extractor_script.process_posts_http_tier(post_urls, stats=stats)
+        else:
+            results = extractor_script.process_multiple_posts_parallel(post_urls, False, None, True, browsers, stats=stats)
+        elapsed = time.perf_counter() - start_time
+    latencies = sorted(stats.latencies)
+    links = sum(len(links) for links in results.values())
+    return {
+        'scenario': f"extractor:{tier}" + (f"x{browsers}" if tier == "browser" else ""),
+        'seconds': round(elapsed, 3),
+        'pages_per_sec': round(len(post_urls) / elapsed, 2),
+        'links': links,
+        'posts_found': sum(1 for links in results.values() if links),
+        'post_p50': round(latencies[len(latencies) // 2], 4) if latencies else None,
+        'post_p99': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 4) if latencies else None,
+        'peak_rss_mb': round(rss.peak_mb, 1),
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+def result_key(record):
+    """Runs are comparable when label, scenario, post count and mock settings all match."""
+    return (record.get('label'), record.get('scenario'), record.get('posts'),
+            json.dumps(record.get('config'), sort_keys=True))
+
+def previous_results(path):
+    """Latest saved result for each result_key."""
+    latest = {}
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                latest[result_key(record)] = record
+    return latest
+
+def print_result(result, previous):
+    line = f"{result['scenario']:>20}: {result['seconds']:>7.2f}s, {result['pages_per_sec']:>7.1f} pages/s"
+    if 'images_per_sec' in result:
+        line += (f", {result['images_per_sec']:>7.1f} images/s, {result['mb_per_sec']:>6.2f} MB/s, "
+                 f"fetch p50/p99 {result['fetch_p50']}/{result['fetch_p99']}s, "
+                 f"download p50/p99 {result['download_p50']}/{result['download_p99']}s")
+    else:
+        line += f", {result['links']} links, post p50/p99 {result['post_p50']}/{result['post_p99']}s"
+    line += f", peak {result['peak_rss_mb']:.0f} MB"
+    print(line)
+    if previous:
+        key = 'images_per_sec' if 'images_per_sec' in result else 'pages_per_sec'
+        if previous.get(key):
+            change = (result[key] - previous[key]) / previous[key] * 100
+            print(f"{'':>22}{change:+.1f}% {key} vs {previous.get('commit') or 'previous run'} "
+                  f"({previous[key]} on {previous.get('timestamp', '?')})")
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark against the local mock Facebook site")
+    parser.add_argument('--posts', type=int, default=50)
+    parser.add_argument('--engines', default="threads,pipeline,asyncio",
+                        help="Comma-separated scraper engines; empty to skip the scraper")
+    parser.add_argument('--extractor', default="http", help="Comma-separated extractor tiers: http, browser; empty to skip")
+    parser.add_argument('--browsers', type=int, default=3)
+    parser.add_argument('--label', default="default",
+                        help="Runs are compared with the previous run of the same label and settings")
+    parser.add_argument('--results', default=RESULTS_FILE)
+    config_arguments(parser)
+    args = parser.parse_args()
+    config = config_from_args(args)
+
+    process, base_url = start_mock(args)
+    previous = previous_results(args.results)
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            link_file = os.path.join(work_dir, "image_urls.json")
+            post_urls = write_link_file(link_file, base_url, args.posts, config.photos_per_post)
+            print(f"Mock site at {base_url} ({CDN_HOST} for images): {args.posts} posts x {config.photos_per_post} photos")
+            for engine in filter(None, args.engines.split(",")):
+                results.append(bench_scraper(engine, link_file))
+            for tier in filter(None, args.extractor.split(",")):
+                try:
+                    results.append(bench_extractor(tier, post_urls, args.browsers))
+                except Exception as e:
+                    print(f"⚠️ Skipping extractor:{tier}: {e}")
+    finally:
+        process.terminate()
+        process.wait()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.results)), exist_ok=True)
+    timestamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+    commit = git_commit()
+    print(f"\n{'='*80}")
+    with open(args.results, "a") as f:
+        for result in results:
+            record = dict(result, label=args.label, timestamp=timestamp, commit=commit, posts=args.posts,
+                          config=config.to_dict())
+            print_result(record, previous.get(result_key(record)))
+            f.write(json.dumps(record) + "\n")
+    print(f"Results appended to {args.results}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Microbenchmark for the scraper's HTML extractor backends.
+
+Runs every backend in scraper_script.EXTRACTOR_BACKENDS over the saved photo
+page fixtures and prints pages/sec for each.
+
+    python benchmarks/bench_extractors.py [iterations]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import scraper_script
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+class SilentProgress:
+    """Stand-in for the tqdm bar that discards log lines."""
+
+    def write(self, message):
+        pass
+
+def load_fixtures():
+    fixtures = {}
+    for name in sorted(os.listdir(FIXTURES_DIR)):
+        if name.endswith(".html"):
+            with open(os.path.join(FIXTURES_DIR, name), "r", encoding="utf-8") as f:
+                fixtures[name] = f.read()
+    return fixtures
+
+def bench(html, backend, iterations):
+    pbar = SilentProgress()
+    image_urls = scraper_script.extract_image_urls(html, pbar, backend)
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        scraper_script.extract_image_urls(html, pbar, backend)
+    elapsed = time.perf_counter() - start_time
+    return iterations / elapsed, image_urls
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for name, html in load_fixtures().items():
+        print(f"{name} ({len(html) / 1024:.0f} KB)")
+        for backend in scraper_script.EXTRACTOR_BACKENDS:
+            pages_per_sec, image_urls = bench(html, backend, iterations)
+            print(f"  {backend:>6}: {pages_per_sec:8.1f} pages/sec, {len(image_urls)} image URLs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Memory versus throughput of browsers x tabs for the multi-tab extraction tier.
+
+Loads the same posts with each layout (browsers, tabs per browser) through
+extractor_script.process_posts_tab_tier and prints posts/sec and the peak
+resident memory of all browser processes. Requires Chrome and psutil, and uses
+the saved fb_session.json if there is one.
+
+    python benchmarks/bench_tabs.py posts.txt [browsers x tabs ...]
+    python benchmarks/bench_tabs.py posts.txt 1x1 3x1 1x10 2x10 2x25
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import psutil
+
+import extractor_script
+from session_manager import SessionManager
+
+DEFAULT_LAYOUTS = ["1x1", "3x1", "5x1", "1x10", "2x10", "2x25"]
+SAMPLE_INTERVAL = 0.5
+
+class MemorySampler:
+    """Track the peak resident memory of every process started by this one."""
+
+    def __init__(self):
+        self.peak_mb = 0.0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        me = psutil.Process()
+        while not self.stop_event.is_set():
+            total = 0
+            for process in me.children(recursive=True):
+                try:
+                    total += process.memory_info().rss
+                except psutil.Error:
+                    pass
+            self.peak_mb = max(self.peak_mb, total / (1024 * 1024))
+            self.stop_event.wait(SAMPLE_INTERVAL)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop_event.set()
+        self.thread.join()
+
+def load_urls(file_path):
+    with open(file_path, "r") as f:
+        return [line.split()[0] for line in f if line.strip().startswith("http")]
+
+def bench(urls, browsers, tabs, session_manager):
+    stats = extractor_script.TierStats("tab")
+    with MemorySampler() as sampler:
+        start_time = time.perf_counter()
+        results, _ = extractor_script.process_posts_tab_tier(urls, session_manager, True, browsers, tabs, stats=stats)
+        elapsed = time.perf_counter() - start_time
+    return len(urls) / elapsed, sampler.peak_mb, len(results)
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+    urls = load_urls(sys.argv[1])
+    layouts = sys.argv[2:] or DEFAULT_LAYOUTS
+    session_manager = SessionManager()
+    print(f"{len(urls)} posts")
+    print(f"{'layout':>8} {'concurrent':>10} {'posts/sec':>10} {'peak MB':>9} {'MB/post slot':>12} {'found':>6}")
+    for layout in layouts:
+        browsers, tabs = (int(part) for part in layout.split("x"))
+        posts_per_sec, peak_mb, found = bench(urls, browsers, tabs, session_manager)
+        slots = browsers * tabs
+        print(f"{layout:>8} {slots:>10} {posts_per_sec:>10.2f} {peak_mb:>9.0f} {peak_mb / slots:>12.0f} {found:>6}")
+
+if __name__ == "__main__":
+    main()
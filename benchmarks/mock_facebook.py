@@ -0,0 +1,265 @@
+"""Local stand-in for facebook.com and the scontent CDN, for end-to-end benchmarks.
+
+Serves synthetic post pages (photo anchors plus the embedded album JSON),
+photo pages with a media-vc-image <img> and a "Next photo" link, a login
+page, and JPEG images whose headers carry real dimensions. Latency,
+per-connection bandwidth, image sizes and the rates of errors, 429s, login
+redirects and truncated images are configurable. Pages are served on "localhost" and
+images on "127.0.0.1", so the scrapers see two hosts like in production.
+
+    python benchmarks/mock_facebook.py [--port 8800] [--latency 0.05] [--throttle-rate 0.02] ...
+"""
+import argparse
+import json
+import math
+import random
+import re
+import struct
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+PAGE_HOST = "localhost"
+CDN_HOST = "127.0.0.1"
+WRITE_CHUNK = 16384
+
+class MockConfig:
+    """Shape of the simulated site and how badly it behaves."""
+
+    def __init__(self, photos_per_post=10, latency=0.05, latency_jitter=0.5, bandwidth=0,
+                 median_image_kb=150, image_size_sigma=0.6, min_image_kb=5, max_image_kb=2048,
+                 small_image_rate=0.0, error_rate=0.0, throttle_rate=0.0, retry_after=1, login_rate=0.0,
+                 truncated_image_rate=0.0, embed_album=True, seed=1):
+        self.photos_per_post = photos_per_post
+        self.latency = latency  # Mean seconds before the first byte of every response
+        self.latency_jitter = latency_jitter  # Latency varies uniformly by +/- this fraction
+        self.bandwidth = bandwidth  # Bytes/sec per connection; 0 for unlimited
+        self.median_image_kb = median_image_kb  # Image sizes are log-normal around this median
+        self.image_size_sigma = image_size_sigma
+        self.min_image_kb = min_image_kb
+        self.max_image_kb = max_image_kb
+        self.small_image_rate = small_image_rate  # Fraction of images served as 64x64 icons
+        self.error_rate = error_rate  # Fraction of requests answered with a 500
+        self.throttle_rate = throttle_rate  # Fraction of requests answered with a 429 and Retry-After
+        self.retry_after = retry_after
+        self.login_rate = login_rate  # Fraction of page requests redirected to /login/
+        self.truncated_image_rate = truncated_image_rate  # Fraction of images whose body stops halfway
+        self.embed_album = embed_album  # Put the album JSON in post pages (the scraper's album mode)
+        self.seed = seed
+
+    def to_dict(self):
+        return dict(vars(self))
+
+def jpeg_bytes(width, height, size):
+    """A JPEG of exactly size bytes whose SOF0 header gives width x height."""
+    header = b'\xff\xd8' + b'\xff\xe0' + struct.pack('>H', 16) + b'JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00'
+    header += b'\xff\xc0' + struct.pack('>HBHHB', 11, 8, height, width, 1) + b'\x01\x11\x00'
+    return header + b'\x00' * max(size - len(header) - 2, 0) + b'\xff\xd9'
+
+def post_photo_fbids(post_id, photos_per_post):
+    return [str(int(post_id) * 1000 + index) for index in range(photos_per_post)]
+
+class MockFacebookServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, config=None, port=0):
+        self.config = config or MockConfig()
+        self.random = random.Random(self.config.seed)
+        self.random_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.stats = {'requests': {}, 'bytes_sent': 0}
+        super().__init__((CDN_HOST, port), MockHandler)
+
+    @property
+    def page_base(self):
+        return f"http://{PAGE_HOST}:{self.server_port}"
+
+    @property
+    def cdn_base(self):
+        return f"http://{CDN_HOST}:{self.server_port}"
+
+    def roll(self, rate):
+        if rate <= 0:
+            return False
+        with self.random_lock:
+            return self.random.random() < rate
+
+    def latency(self):
+        config = self.config
+        with self.random_lock:
+            return max(0.0, config.latency * (1 + self.random.uniform(-config.latency_jitter, config.latency_jitter)))
+
+    def record(self, route, status, size):
+        key = f"{route} {status}"
+        with self.stats_lock:
+            self.stats['requests'][key] = self.stats['requests'].get(key, 0) + 1
+            self.stats['bytes_sent'] += size
+
+    def image_for(self, fbid):
+        """Dimensions, size and truncation of an image, the same for every request of that fbid."""
+        config = self.config
+        rng = random.Random(f"{config.seed}:{fbid}")
+        if rng.random() < config.small_image_rate:
+            return 64, 64, 2048, False
+        size_kb = math.exp(rng.gauss(math.log(config.median_image_kb), config.image_size_sigma))
+        size_kb = min(max(size_kb, config.min_image_kb), config.max_image_kb)
+        return 2048, 1536, int(size_kb * 1024), rng.random() < config.truncated_image_rate
+
+    def post_links(self, post_id):
+        """Photo links of a post, as the extractor would save them."""
+        return [f"{self.page_base}/photo/?fbid={fbid}&set=pcb.{post_id}"
+                for fbid in post_photo_fbids(post_id, self.config.photos_per_post)]
+
+    def write_link_file(self, path, posts, first_post_id=100000):
+        """Write a {post_url: [photo links]} file for posts synthetic posts. Returns the post URLs."""
+        links = {}
+        for post_id in range(first_post_id, first_post_id + posts):
+            links[f"{self.page_base}/posts/{post_id}"] = self.post_links(post_id)
+        with open(path, 'w') as f:
+            json.dump(links, f)
+        return list(links)
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def image_url(self, fbid):
+        return f"{self.server.cdn_base}/scontent/v/t39.30808-6/{fbid}_{int(fbid) % 997}_{int(fbid) % 7919}_n.jpg?stp=dst-jpg_s2048x2048"
+
+    def send_body(self, route, status, body, content_type='text/html; charset=utf-8', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        bandwidth = self.server.config.bandwidth
+        try:
+            for start in range(0, len(body), WRITE_CHUNK):
+                chunk = body[start:start + WRITE_CHUNK]
+                self.wfile.write(chunk)
+                if bandwidth:
+                    time.sleep(len(chunk) / bandwidth)
+        except (BrokenPipeError, ConnectionResetError):
+            # The scraper closes the connection early on images it skips after the header probe
+            self.close_connection = True
+        self.server.record(route, status, len(body))
+
+    def do_GET(self):
+        server = self.server
+        config = server.config
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        route = parts.path.strip('/').split('/')[0] or 'root'
+
+        if route == '__stats':
+            with server.stats_lock:
+                body = json.dumps(server.stats).encode('utf-8')
+            self.send_body(route, 200, body, 'application/json')
+            return
+
+        time.sleep(server.latency())
+        if server.roll(config.throttle_rate):
+            self.send_body(route, 429, b'Too Many Requests', 'text/plain', {'Retry-After': str(config.retry_after)})
+            return
+        if server.roll(config.error_rate):
+            self.send_body(route, 500, b'Internal Server Error', 'text/plain')
+            return
+        if route in ('posts', 'photo') and server.roll(config.login_rate):
+            self.send_body(route, 302, b'', headers={'Location': f"{server.page_base}/login/?next={parts.path}"})
+            return
+
+        if route == 'posts':
+            self.send_post(route, parts.path.rstrip('/').split('/')[-1])
+        elif route == 'photo' and query.get('fbid'):
+            self.send_photo(route, query['fbid'][0], query.get('set', [''])[0])
+        elif route == 'scontent':
+            match = re.search(r'/(\d+)_\d+_\d+_n\.jpg$', parts.path)
+            if not match:
+                self.send_body(route, 404, b'Not Found', 'text/plain')
+                return
+            width, height, size, truncated = server.image_for(match.group(1))
+            body = jpeg_bytes(width, height, size)
+            if truncated:
+                # A broken file on the CDN: a complete response whose image has no end
+                body = body[:size // 2]
+            self.send_body(route, 200, body, 'image/jpeg')
+        elif route == 'login':
+            self.send_body(route, 200, b'<html><body><form id="login_form"><input name="email"><input name="pass">'
+                                       b'<button name="login">Log in</button></form></body></html>')
+        else:
+            self.send_body(route, 404, b'Not Found', 'text/plain')
+
+    def send_post(self, route, post_id):
+        if not post_id.isdigit():
+            self.send_body(route, 404, b'Not Found', 'text/plain')
+            return
+        fbids = post_photo_fbids(post_id, self.server.config.photos_per_post)
+        anchors = ''.join(f'<a href="/photo/?fbid={fbid}&amp;set=pcb.{post_id}"><img src="{self.image_url(fbid)}"></a>'
+                          for fbid in fbids)
+        script = ''
+        if self.server.config.embed_album:
+            nodes = [{'__typename': 'Photo', 'id': fbid,
+                      'image': {'uri': self.image_url(fbid), 'width': 960, 'height': 720},
+                      'viewer_image': {'uri': self.image_url(fbid), 'width': 2048, 'height': 1536}}
+                     for fbid in fbids]
+            script = '<script type="application/json">' + json.dumps({'data': {'nodes': nodes}}) + '</script>'
+        html = f'<html><body><div role="article"><p>Post {post_id}</p>{anchors}</div>{script}</body></html>'
+        self.send_body(route, 200, html.encode('utf-8'))
+
+    def send_photo(self, route, fbid, set_param):
+        if not fbid.isdigit():
+            self.send_body(route, 404, b'Not Found', 'text/plain')
+            return
+        post_id = set_param.split('.')[-1]
+        next_link = ''
+        if post_id.isdigit():
+            fbids = post_photo_fbids(post_id, self.server.config.photos_per_post)
+            if fbid in fbids and fbids.index(fbid) + 1 < len(fbids):
+                next_fbid = fbids[fbids.index(fbid) + 1]
+                next_link = f'<a aria-label="Next photo" href="/photo/?fbid={next_fbid}&amp;set={set_param}">Next</a>'
+        html = (f'<html><body><div role="dialog"><img data-visualcompletion="media-vc-image" '
+                f'src="{self.image_url(fbid).replace("&", "&amp;")}">{next_link}</div>'
+                f'<img src="{self.server.cdn_base}/static/icon.png" width="16"></body></html>')
+        self.send_body(route, 200, html.encode('utf-8'))
+
+def start_server(config=None, port=0):
+    """Start the mock site on a background thread. Returns the server; call shutdown() to stop it."""
+    server = MockFacebookServer(config, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def config_arguments(parser):
+    """Add a command-line option for every MockConfig setting."""
+    for name, default in MockConfig().to_dict().items():
+        option = '--' + name.replace('_', '-')
+        if isinstance(default, bool):
+            parser.add_argument(option, type=lambda value: value.lower() in ('1', 'true', 'yes', 'y'), default=default)
+        else:
+            parser.add_argument(option, type=type(default), default=default)
+
+def config_from_args(args):
+    return MockConfig(**{name: getattr(args, name) for name in MockConfig().to_dict()})
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic Facebook site for benchmarks")
+    parser.add_argument('--port', type=int, default=8800)
+    config_arguments(parser)
+    args = parser.parse_args()
+    server = MockFacebookServer(config_from_args(args), args.port)
+    # First line is read by bench_e2e.py to find the port
+    print(server.page_base, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    sys.exit(main())
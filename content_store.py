@@ -0,0 +1,117 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS refs (
+    key TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    url TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS refs_url ON refs (url);
+CREATE TABLE IF NOT EXISTS objects (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    ext TEXT NOT NULL
+);
+"""
+
+class ContentStore:
+    """Content-addressed image store.
+
+    Each image is hashed while it streams to a temporary file and then moved to
+    objects/<aa>/<digest><ext>, so identical images reached through different
+    posts, indexes or CDN URLs are stored once. An index maps each image key
+    (fbid/index) and source URL to its digest, letting later runs skip the
+    transfer entirely.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.tmp_dir = os.path.join(root, "tmp")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+        self.refs = dict(self.conn.execute("SELECT key, digest FROM refs"))
+        self.url_refs = dict(self.conn.execute("SELECT url, digest FROM refs WHERE url IS NOT NULL"))
+        self.object_exts = dict(self.conn.execute("SELECT digest, ext FROM objects"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def object_path(self, digest, ext=".jpg"):
+        return os.path.join(self.objects_dir, digest[:2], digest + ext)
+
+    def lookup(self, key, url=None):
+        """Return the stored path for a key (or source URL), or None if it must be downloaded."""
+        with self.lock:
+            digest = self.refs.get(key) or (url and self.url_refs.get(url))
+            if not digest:
+                return None
+            path = self.object_path(digest, self.object_exts.get(digest, ".jpg"))
+            if not os.path.exists(path):
+                return None
+            if key not in self.refs:
+                # Same CDN URL reached under a new key: record the new reference
+                self._add_ref(key, digest, url)
+            return path
+
+    def save(self, key, chunks, url=None, ext=".jpg"):
+        """Stream chunks to the store, hashing as they arrive. Returns (path, size)."""
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    if chunk:
+                        f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+            digest = digest.hexdigest()
+
+            with self.lock:
+                ext = self.object_exts.get(digest, ext)
+                path = self.object_path(digest, ext)
+                if os.path.exists(path):
+                    os.remove(tmp_path)
+                else:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.replace(tmp_path, path)
+                    self.conn.execute("INSERT OR REPLACE INTO objects (digest, size, ext) VALUES (?, ?, ?)", (digest, size, ext))
+                    self.object_exts[digest] = ext
+                self._add_ref(key, digest, url)
+            return path, size
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _add_ref(self, key, digest, url):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO refs (key, digest, url, updated) VALUES (?, ?, ?, ?)",
+                (key, digest, url, time.time()),
+            )
+        self.refs[key] = digest
+        if url:
+            self.url_refs[url] = digest
@@ -0,0 +1,119 @@
+import json
+import re
+
+# Facebook pages ship their data as JSON inside <script type="application/json">
+# tags. Photo nodes in that data carry the fbid and full-size image URLs, so one
+# page can describe a whole album.
+SCRIPT_JSON_PATTERN = re.compile(r'<script\b[^>]*\btype=["\']application/(?:ld\+)?json["\'][^>]*>(.*?)</script>',
+                                 re.IGNORECASE | re.DOTALL)
+
+# Keys under which a photo node stores an image ({"uri": ..., "width": ..., "height": ...})
+IMAGE_KEYS = ('image', 'viewer_image', 'photo_image', 'full_image', 'large_share_image')
+
+# Node type of the post's own photos
+PHOTO_TYPENAME = 'Photo'
+
+# Untyped nodes count as photos only with a viewer-size image; profile pictures and covers carry a plain 'image'
+UNTYPED_PHOTO_IMAGE_KEYS = ('viewer_image', 'photo_image', 'full_image')
+
+# Subtrees that describe people and pages (avatars, cover photos), not the post's media
+NON_MEDIA_KEYS = frozenset(('actor', 'actors', 'author', 'owner', 'profile_picture', 'profilePicture', 'profile_photo',
+                            'profilePhoto', 'cover_photo', 'coverPhoto', 'cover'))
+
+def iter_json_blobs(html):
+    """Yield every parseable JSON document embedded in <script> tags."""
+    for match in SCRIPT_JSON_PATTERN.finditer(html):
+        text = match.group(1).strip()
+        if not text:
+            continue
+        try:
+            yield json.loads(text)
+        except ValueError:
+            continue
+
+def iter_json_lines(text):
+    """Yield JSON documents from a response body that may hold several, one per line."""
+    # GraphQL responses can start with a "for (;;);" guard and stream results line by line
+    if text.startswith("for (;;);"):
+        text = text[len("for (;;);"):]
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            continue
+
+def iter_nodes(document, skip_keys=()):
+    """Yield every dict nested anywhere in a parsed JSON document, except under the keys in skip_keys."""
+    stack = [document]
+    while stack:
+        node = stack.pop()
+        # Children are pushed in reverse so nodes come out in document order
+        if isinstance(node, dict):
+            yield node
+            stack.extend(reversed([value for key, value in node.items() if key not in skip_keys]))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+
+def photo_image(node, keys=IMAGE_KEYS):
+    """Return (url, width, height) of the largest scontent image under the given keys of a photo node, or None."""
+    best = None
+    for key in keys:
+        image = node.get(key)
+        if not isinstance(image, dict):
+            continue
+        url = image.get('uri') or image.get('url')
+        if not isinstance(url, str) or ('scontent' not in url and 'fbcdn' not in url):
+            continue
+        width = image.get('width') or 0
+        height = image.get('height') or 0
+        if best is None or width > best[1]:
+            best = (url, width, height)
+    return best
+
+def extract_media_from_documents(documents):
+    """Map fbid -> {'url', 'width', 'height'} for every photo node in the documents, in page order."""
+    media = {}
+    for document in documents:
+        for node in iter_nodes(document, NON_MEDIA_KEYS):
+            fbid = node.get('id')
+            if not isinstance(fbid, str) or not fbid.isdigit():
+                continue
+            typename = node.get('__typename')
+            if typename == PHOTO_TYPENAME:
+                image = photo_image(node)
+            elif typename is None:
+                image = photo_image(node, UNTYPED_PHOTO_IMAGE_KEYS)
+            else:
+                continue
+            if image is None:
+                continue
+            url, width, height = image
+            if fbid not in media or width > media[fbid]['width']:
+                media[fbid] = {'url': url, 'width': width, 'height': height}
+    return media
+
+def extract_embedded_media(html):
+    """Map fbid -> full-size image info from the JSON embedded in a post or photo page."""
+    return extract_media_from_documents(iter_json_blobs(html))
+
+def album_set_param(post_url, links=()):
+    """Return the set=pcb.<post id> parameter for a post, from its photo links or a numeric post URL."""
+    for link in links:
+        match = re.search(r'set=pcb\.\d+', link)
+        if match:
+            return match.group(0)
+    match = re.search(r'/posts/(\d+)|story_fbid=(\d+)', post_url)
+    if not match:
+        return None
+    return f"set=pcb.{next(group for group in match.groups() if group)}"
+
+def embedded_album_links(html, post_url, known_links=()):
+    """Build photo viewer links for every photo in the page's embedded JSON."""
+    set_param = album_set_param(post_url, known_links)
+    if not set_param:
+        return []
+    media = extract_embedded_media(html)
+    return [f"https://www.facebook.com/photo/?fbid={fbid}&{set_param}" for fbid in media]
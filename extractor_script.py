@@ -1,7 +1,14 @@
 import time
 import json
 import os
+import re
+import base64
+import queue
+import threading
 import concurrent.futures
+from contextlib import contextmanager
+from html import unescape
+from urllib.parse import urljoin
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
@@ -10,48 +17,238 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, StaleElementReferenceException
 from selenium.webdriver.common.keys import Keys
 
+from job_manifest import JobManifest, DONE, FAILED
+from link_stream import LinkStreamWriter
+from photo_index import PhotoIndex, PHOTO_INDEX_FILE, photo_key, clean_photo_url
+from rate_control import RateController, RetryableError
+from http_client import build_session, http_get
+from embedded_media import (embedded_album_links, album_set_param, extract_embedded_media,
+                            extract_media_from_documents, iter_json_lines)
+from run_metrics import ProgressLine, RunMetrics
+from session_manager import SessionManager, SESSION_FILE
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Configuration
+USE_MANIFEST = True  # Record finished posts so an interrupted run resumes where it stopped
+MANIFEST_FILE = "extractor_manifest.sqlite"
+STREAM_FILE = "image_urls.jsonl"  # One JSON line per post, written as each finishes, for the scraper to follow; None to disable
+HTTP_TIER_WORKERS = 8  # Concurrent plain HTTP fetches in the tiered mode
+EXTRACTION_MODE = "viewer"  # "viewer" (click through the photo viewer) or "network" (read captured GraphQL/XHR responses)
+BLOCKING_PROFILE = "none"  # Key of BLOCKING_PROFILES for the viewer and network-capture browsers, whose waits need the rendered layout
+TAB_BLOCKING_PROFILE = "link-extraction"  # Profile for the multi-tab tier, which only reads anchors and embedded JSON once the page settles
+MEASURE_BLOCKING = False  # Load each post with and without TAB_BLOCKING_PROFILE and report bytes and load time instead of extracting
+DRIVER_MAX_PAGES = 50  # Restart a browser after this many posts
+DRIVER_MAX_MEMORY_MB = 1500  # Restart a browser whose process tree uses more memory than this (requires psutil)
+TABS_PER_BROWSER = 1  # Above 1, each browser loads this many posts at once in separate tabs before the viewer tier
+TAB_LOAD_TIMEOUT = 20  # Give up on a tab whose page has not settled after this many seconds
+BROWSER_THROTTLE_PAUSE = 60  # Seconds every browser waits after Facebook shows a rate-limit page
+QUIET = False  # Replace the per-post log lines with a single progress line
+METRICS_REPORT = "extractor_metrics.json"  # Run report (.prom/.txt for Prometheus text); None to disable
+
+# Event-driven waits: each wait polls its condition and returns as soon as it holds
+WAIT_POLL_INTERVAL = 0.1
+WAIT_TIMEOUTS = {
+    'page_ready': 10,  # Photo anchors settled or DOM stopped changing after driver.get
+    'viewer_open': 3,  # URL shows a photo fbid after clicking an image
+    'next_photo': 3,  # URL fbid changes after "Next photo"
+    'back': 3,  # URL leaves the photo viewer after driver.back()
+    'scroll': 5,  # DOM settles after scrolling to the bottom of the post
+}
+DOM_QUIET_PERIOD = 0.5  # Seconds without DOM changes that count as settled
+LINKS_QUIET_PERIOD = 0.3  # Seconds without new photo anchors that count as settled
+
+# Combined XPath for the post's photo anchors
+PHOTO_LINKS_XPATH = "//a[contains(@href, '/photo/?fbid=')] | //a[contains(@href, '/photo?fbid=')] | //a[contains(@href, 'set=pcb.')] | //div[@role='article']//a[.//img]"
+
+# URL patterns blocked through DevTools Network.setBlockedURLs. Link extraction
+# only needs the HTML, the page's own scripts and its GraphQL responses.
+BLOCKING_PROFILES = {
+    'none': [],
+    'link-extraction': [
+        # Fonts and stylesheets
+        '*.woff', '*.woff2', '*.ttf', '*.otf', '*.css',
+        # Images, including CSS backgrounds and sprites the content setting misses
+        '*.jpg', '*.jpeg', '*.png', '*.gif', '*.webp', '*.svg', '*.ico',
+        # Video and audio
+        '*.mp4', '*.webm', '*.m3u8', '*.mpd', '*.m4a', '*video*.fbcdn.net*',
+        # Analytics and logging beacons
+        '*facebook.com/tr*', '*/ajax/bz*', '*/ajax/bnzai*', '*/ajax/webstorage/*', '*/logging/*',
+        '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*connect.facebook.net*',
+    ],
+}
+
+# Text Facebook shows instead of the post when it is rate limiting the account or IP
+THROTTLE_PAGE_MARKERS = (
+    "You're Temporarily Blocked", "You’re Temporarily Blocked",
+    "You can't use this feature right now", "You’re going too fast", "Rate limit exceeded",
+)
+
+# Browsers share one AIMD limit on facebook.com: a rate-limit page halves the number of
+# posts loading at once and pauses new ones, and successful posts slowly raise it again
+browser_rate_controller = RateController(default_max_limit=5)
+
+# Plain HTTP fetches of the tiered mode get their own per-host limit and retries
+http_rate_controller = RateController(default_max_limit=HTTP_TIER_WORKERS)
+
+# Wait times, page loads and link counts for the run report
+metrics = RunMetrics()
+
+# Photo anchors read in one call per poll in multi-tab mode
+TAB_LINKS_SCRIPT = """
+return Array.from(document.querySelectorAll('a[href]'), a => a.href)
+    .filter(href => href.includes('/photo/?fbid=') || href.includes('/photo?fbid=') || href.includes('set=pcb.'));
+"""
+
+# Same anchors as PHOTO_LINKS_XPATH, matched in static HTML
+PHOTO_HREF_PATTERN = re.compile(r'href="([^"]*(?:/photo/?\?fbid=|set=pcb\.)[^"]*)"')
+
+# Per-post progress in quiet mode, set by process_multiple_posts
+progress_line = None
+
+# Posts sharing each photo, set by run_extraction
+photo_index = None
+
+def log(message):
+    """Print a per-post log line, unless QUIET is set."""
+    if not QUIET:
+        print(message)
+
+def timed_wait(driver, name, condition, timeout=None):
+    """Wait until condition(driver) is truthy and record how long it took. Returns its value, or None on timeout."""
+    start = time.time()
+    try:
+        result = WebDriverWait(driver, timeout or WAIT_TIMEOUTS[name], poll_frequency=WAIT_POLL_INTERVAL).until(condition)
+    except TimeoutException:
+        result = None
+    metrics.observe('browser_wait_seconds', time.time() - start, step=name)
+    if result is None:
+        metrics.inc('browser_wait_timeouts_total', step=name)
+    return result
+
+def fbid_in_url(url):
+    # A whole fbid parameter only; post URLs carry story_fbid=
+    match = re.search(r'[?&]fbid=(\d+)', url)
+    return match.group(1) if match else None
+
+def url_fbid_changed(previous_url):
+    """Condition: the current URL is a photo whose fbid differs from previous_url's."""
+    previous_fbid = fbid_in_url(previous_url)
+    def condition(driver):
+        current_url = driver.current_url
+        fbid = fbid_in_url(current_url)
+        return current_url if fbid and fbid != previous_fbid and 'photo' in current_url else False
+    return condition
+
+def url_back_to(page_url):
+    """Condition: the browser is back on page_url, or at least no longer on a photo viewer URL."""
+    def condition(driver):
+        current_url = driver.current_url
+        return current_url == page_url or not fbid_in_url(current_url)
+    return condition
+
+def dom_stable(quiet_period=DOM_QUIET_PERIOD):
+    """Condition: the document is loaded and its element count has not changed for quiet_period."""
+    state = {'count': None, 'since': time.time()}
+    def condition(driver):
+        count = driver.execute_script(
+            "return document.readyState === 'complete' ? document.getElementsByTagName('*').length : -1")
+        now = time.time()
+        if count != state['count']:
+            state['count'] = count
+            state['since'] = now
+            return False
+        return count >= 0 and now - state['since'] >= quiet_period
+    return condition
+
+def links_settled(xpath, quiet_period=LINKS_QUIET_PERIOD):
+    """Condition: anchors matching xpath exist and no new ones appeared for quiet_period. Returns the elements."""
+    state = {'count': 0, 'since': time.time()}
+    def condition(driver):
+        elements = driver.find_elements(By.XPATH, xpath)
+        now = time.time()
+        if len(elements) != state['count']:
+            state['count'] = len(elements)
+            state['since'] = now
+            return False
+        return elements if elements and now - state['since'] >= quiet_period else False
+    return condition
+
+def first_of(*conditions):
+    """Condition: the first truthy result of any of the given conditions."""
+    def condition(driver):
+        for check in conditions:
+            result = check(driver)
+            if result:
+                return result
+        return False
+    return condition
+
+def wait_report():
+    """Summarize how long each kind of wait actually took, from the browser_wait_seconds histogram."""
+    lines = []
+    _, histograms = metrics.snapshot()
+    for (name, labels), (bucket_counts, total, count) in sorted(histograms.items()):
+        if name != 'browser_wait_seconds' or not count:
+            continue
+        step = dict(labels)['step']
+        timeouts = metrics.counter('browser_wait_timeouts_total', step=step)
+        lines.append(f"{step:>12}: {count} waits, mean {total / count:.2f}s, "
+                     f"p50 <= {metrics.quantile(bucket_counts, 0.5)}s, p99 <= {metrics.quantile(bucket_counts, 0.99)}s, "
+                     f"{timeouts} timeouts")
+    return lines
+
 def extract_facebook_image_urls(post_url, driver, use_login=False):
-    """Extract image URLs from a single Facebook post with optimized timeouts"""
-    
-    timeout = 15
-    short_wait = 2
-    page_load_wait = 3
+    """Extract image URLs from a single Facebook post, waiting only as long as each step needs"""
     
     try:
         # Navigate to the post URL
-        print(f"Navigating to: {post_url}")
-        driver.get(post_url)
-        time.sleep(page_load_wait)  # Reduced wait time
+        log(f"Navigating to: {post_url}")
+        with metrics.timer('page_load_seconds'):
+            driver.get(post_url)
+        timed_wait(driver, 'page_ready', first_of(links_settled(PHOTO_LINKS_XPATH), dom_stable()))
         
         # First get the visible image links as a fallback (faster approach)
         visible_image_links = []
         try:
-            print("Getting visible image links...")
-            # Combined XPath for efficiency
-            combined_xpath = "//a[contains(@href, '/photo/?fbid=')] | //a[contains(@href, '/photo?fbid=')] | //a[contains(@href, 'set=pcb.')] | //div[@role='article']//a[.//img]"
-            elements = driver.find_elements(By.XPATH, combined_xpath)
+            log("Getting visible image links...")
+            elements = driver.find_elements(By.XPATH, PHOTO_LINKS_XPATH)
             
+            # The same photo often appears under several anchors with different tracking parameters
+            seen = set()
             for element in elements:
                 link = element.get_attribute('href')
-                if link and link not in visible_image_links and ('fbid=' in link or 'photo' in link):
-                    visible_image_links.append(link)
+                if link and ('fbid=' in link or 'photo' in link):
+                    key = photo_key(link) or link
+                    if key not in seen:
+                        seen.add(key)
+                        visible_image_links.append(link)
             
-            print(f"Found {len(visible_image_links)} visible image links")
+            log(f"Found {len(visible_image_links)} visible image links")
+            
+            # The page's embedded JSON usually lists the whole album, which makes the viewer loop unnecessary
+            album_links = embedded_album_links(driver.page_source, post_url, visible_image_links)
+            if len(album_links) > len(visible_image_links):
+                log(f"Found {len(album_links)} photo links in the embedded page JSON, skipping viewer navigation")
+                return clean_links(album_links)
             
             # If we have enough links already, return them without trying to open the viewer
             if len(visible_image_links) >= 5:
-                print("Found sufficient links without photo viewer, skipping viewer navigation")
+                log("Found sufficient links without photo viewer, skipping viewer navigation")
                 return clean_links(visible_image_links)
                 
         except Exception as e:
-            print(f"Error finding visible image links: {str(e)}")
+            log(f"Error finding visible image links: {str(e)}")
         
         # Primary approach: Click on the first image and navigate through all photos
         image_links = []
         viewer_opened = False
         
         try:
-            print("Looking for clickable images...")
+            log("Looking for clickable images...")
             
             # Optimized selector strategy - try most reliable ones first
             clickable_selectors = [
@@ -64,47 +261,47 @@ def extract_facebook_image_urls(post_url, driver, use_login=False):
                     images = driver.find_elements(By.XPATH, selector)
                     
                     if images:
-                        print(f"Found {len(images)} potential clickable images")
+                        log(f"Found {len(images)} potential clickable images")
+                        page_url = driver.current_url
                         # Try each image until one opens the viewer
                         for i, img in enumerate(images[:3]):  # Try only first 3 images
                             try:
-                                print(f"Attempting to click image {i+1}...")
+                                log(f"Attempting to click image {i+1}...")
                                 driver.execute_script("arguments[0].scrollIntoView(true);", img)
+                                previous_url = driver.current_url
                                 driver.execute_script("arguments[0].click();", img)  # Using JS click for reliability
-                                time.sleep(short_wait)
                                 
-                                # Check if we're in a photo viewer - simplified check
-                                current_url = driver.current_url
-                                if 'photo' in current_url and 'fbid=' in current_url:
-                                    print("Photo viewer detected through URL")
+                                # Check if we're in a photo viewer - the URL switches to a photo fbid
+                                if timed_wait(driver, 'viewer_open', url_fbid_changed(previous_url)):
+                                    log("Photo viewer detected through URL")
                                     viewer_opened = True
                                     break
                                 else:
-                                    print("Click did not open photo viewer, trying to go back...")
+                                    log("Click did not open photo viewer, trying to go back...")
                                     driver.back()
-                                    time.sleep(1)  # Reduced wait time
+                                    timed_wait(driver, 'back', url_back_to(page_url))
                             except Exception as e:
-                                print(f"Error clicking image {i+1}: {str(e)}")
+                                log(f"Error clicking image {i+1}: {str(e)}")
                                 try:
                                     driver.back()
-                                    time.sleep(1)
+                                    timed_wait(driver, 'back', url_back_to(page_url))
                                 except:
                                     pass
                                 
                         if viewer_opened:
                             break
                 except Exception as e:
-                    print(f"Error with selector {selector}: {str(e)}")
+                    log(f"Error with selector {selector}: {str(e)}")
             
             # If we successfully opened the viewer, extract all images
             if viewer_opened:
-                print("Navigating through photos in the viewer...")
+                log("Navigating through photos in the viewer...")
                 
                 # Record the first image URL
                 current_url = driver.current_url
                 if 'fbid=' in current_url and current_url not in image_links:
                     image_links.append(current_url)
-                    print(f"Added image 1: {current_url}")
+                    log(f"Added image 1: {current_url}")
                 
                 # Navigate through photos with optimized parameters
                 photo_count = 1
@@ -122,91 +319,252 @@ def extract_facebook_image_urls(post_url, driver, use_login=False):
                         }
                         return false;
                         """
+                        previous_url = driver.current_url
                         clicked = driver.execute_script(js_script)
                         
                         if clicked:
-                            time.sleep(1)  # Reduced wait
-                            
-                            # Get the URL of this photo
-                            current_url = driver.current_url
-                            if 'fbid=' in current_url and current_url not in image_links:
+                            # Get the URL of this photo as soon as the viewer moves to it
+                            current_url = timed_wait(driver, 'next_photo', url_fbid_changed(previous_url))
+                            metrics.inc('viewer_steps_total', result='moved' if current_url else 'stuck')
+                            if current_url and current_url not in image_links:
                                 image_links.append(current_url)
                                 photo_count += 1
                                 consecutive_failures = 0
-                                print(f"Added image {photo_count}: {current_url}")
+                                log(f"Added image {photo_count}: {current_url}")
                             else:
                                 consecutive_failures += 1
                         else:
                             consecutive_failures += 1
-                            print("Next button not found, may have reached the end")
+                            log("Next button not found, may have reached the end")
                             
                     except Exception as e:
                         consecutive_failures += 1
-                        print(f"Error navigating to next photo: {str(e)}")
+                        log(f"Error navigating to next photo: {str(e)}")
                     
                     # If failures, we've probably reached the end
                     if consecutive_failures >= 2:
-                        print("Navigation failures, ending photo viewer navigation")
+                        log("Navigation failures, ending photo viewer navigation")
                         break
                 
-                print(f"Found total of {len(image_links)} images through photo viewer")
-                
-                # Return to the post page - simplified navigation
-                driver.get(post_url)
-                time.sleep(short_wait)
+                log(f"Found total of {len(image_links)} images through photo viewer")
             
         except Exception as e:
-            print(f"Error in photo viewer navigation: {str(e)}")
+            log(f"Error in photo viewer navigation: {str(e)}")
         
         # If photo viewer approach failed, use the fallback visible links
         if not image_links and visible_image_links:
-            print("Using fallback visible image links")
+            log("Using fallback visible image links")
             image_links = visible_image_links
         
         return clean_links(image_links)
             
     except Exception as e:
-        print(f"An error occurred processing {post_url}: {str(e)}")
+        log(f"An error occurred processing {post_url}: {str(e)}")
         return []
 
+def read_network_responses(driver):
+    """Yield (resource type, url, body) for finished responses in the Chrome performance log."""
+    responses = {}
+    finished = []
+    for entry in driver.get_log('performance'):
+        try:
+            message = json.loads(entry['message'])['message']
+        except (KeyError, ValueError):
+            continue
+        params = message.get('params', {})
+        if message.get('method') == 'Network.responseReceived':
+            responses[params.get('requestId')] = (params.get('type'), params.get('response', {}).get('url', ''))
+        elif message.get('method') == 'Network.loadingFinished':
+            finished.append(params.get('requestId'))
+    
+    for request_id in finished:
+        resource_type, url = responses.get(request_id, (None, ''))
+        if resource_type not in ('XHR', 'Fetch', 'Document'):
+            continue
+        try:
+            body = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+        except Exception:
+            # Chrome evicts bodies of old or large responses
+            continue
+        text = body.get('body', '')
+        if body.get('base64Encoded'):
+            text = base64.b64decode(text).decode('utf-8', errors='replace')
+        yield resource_type, url, text
+
+def extract_facebook_image_urls_network(post_url, driver, use_login=False):
+    """Extract photo links from the GraphQL/XHR responses the post page makes, without the viewer loop"""
+    try:
+        # Drop log entries left over from the previous post
+        driver.get_log('performance')
+        
+        log(f"Navigating to: {post_url}")
+        with metrics.timer('page_load_seconds'):
+            driver.get(post_url)
+        timed_wait(driver, 'page_ready', first_of(links_settled(PHOTO_LINKS_XPATH), dom_stable()))
+        
+        # One scroll pass makes the page request the rest of the media set
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        timed_wait(driver, 'scroll', dom_stable())
+        
+        media = {}
+        for resource_type, url, body in read_network_responses(driver):
+            if resource_type == 'Document':
+                media.update(extract_embedded_media(body))
+            elif 'graphql' in url or '/ajax/' in url:
+                media.update(extract_media_from_documents(iter_json_lines(body)))
+        
+        visible_links = [element.get_attribute('href') or '' for element in driver.find_elements(By.XPATH, PHOTO_LINKS_XPATH)]
+        set_param = album_set_param(post_url, visible_links)
+        log(f"Captured {len(media)} photos from network responses")
+        
+        if media and set_param:
+            return clean_links([f"https://www.facebook.com/photo/?fbid={fbid}&{set_param}" for fbid in media])
+    except Exception as e:
+        log(f"Error reading network responses for {post_url}: {str(e)}")
+    
+    log("Network capture found no album, falling back to the photo viewer")
+    return extract_facebook_image_urls(post_url, driver, use_login)
+
 def clean_links(image_links):
     """Clean URLs by stripping tracking parameters while keeping essential fbid"""
-    cleaned_links = []
+    # Keyed by the canonical (fbid, set) photo key; dicts keep first-seen order
+    cleaned_links = {}
     for url in image_links:
+        key = photo_key(url)
+        if key and key[1]:
+            cleaned_links.setdefault(key, clean_photo_url(key))
+        else:
+            # Just keep the original URL if we can't parse it properly
+            cleaned_links.setdefault(url, url)
+    return list(cleaned_links.values())
+
+class TierStats:
+    """Posts handled and per-post latency for one extraction tier."""
+    
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.links = 0
+        self.lock = threading.Lock()
+    
+    def record(self, latency, links):
+        # Called from the HTTP tier's worker threads
+        with self.lock:
+            self.latencies.append(latency)
+            self.links += links
+    
+    def report(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            links = self.links
+        if not latencies:
+            return f"{self.name:>8} tier: 0 posts"
+        mean = sum(latencies) / len(latencies)
+        p50 = latencies[len(latencies) // 2]
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        return (f"{self.name:>8} tier: {len(latencies)} posts, {links} links, "
+                f"latency mean {mean:.2f}s / p50 {p50:.2f}s / p95 {p95:.2f}s")
+
+def extract_links_http(session, post_url):
+    """Extract photo links from a post's static HTML with a plain HTTP request."""
+    response = http_get(session, post_url, allow_redirects=True, timeout=30)
+    response.raise_for_status()
+    if '/login/' in response.url:
+        return []
+    
+    links = []
+    seen = set()
+    for href in PHOTO_HREF_PATTERN.findall(response.text):
+        link = urljoin(response.url, unescape(href))
+        if link not in seen and ('fbid=' in link or 'photo' in link):
+            seen.add(link)
+            links.append(link)
+    
+    album_links = embedded_album_links(response.text, post_url, links)
+    if len(album_links) > len(links):
+        links = album_links
+    return clean_links(links)
+
+def process_posts_http_tier(urls, expected_counts=None, stats=None, manifest=None, session_manager=None, stream=None):
+    """Try every post over plain HTTP. Returns (results, urls that still need a browser)."""
+    expected_counts = expected_counts or {}
+    session_manager = session_manager or SessionManager()
+    session = build_session(session_manager.as_dict(), session_manager, HTTP_TIER_WORKERS, http_rate_controller, metrics)
+    results = {}
+    browser_urls = []
+    
+    def fetch(url):
+        start = time.time()
         try:
-            # Extract the essential parts (fbid and set parameters)
-            if 'fbid=' in url and 'set=' in url:
-                # Find fbid parameter
-                fbid_start = url.find('fbid=')
-                fbid_end = url.find('&', fbid_start)
-                if fbid_end == -1:
-                    fbid_end = len(url)
-                fbid_param = url[fbid_start:fbid_end]
-                
-                # Find set parameter
-                set_start = url.find('set=')
-                set_end = url.find('&', set_start)
-                if set_end == -1:
-                    set_end = len(url)
-                set_param = url[set_start:set_end]
-                
-                # Create clean URL
-                clean_url = f"https://www.facebook.com/photo?{fbid_param}&{set_param}"
-                if clean_url not in cleaned_links:
-                    cleaned_links.append(clean_url)
-            else:
-                # Just keep the original URL if we can't parse it properly
-                if url not in cleaned_links:
-                    cleaned_links.append(url)
+            links = extract_links_http(session, url)
         except Exception as e:
-            print(f"Error cleaning URL {url}: {str(e)}")
-            if url not in cleaned_links:
-                cleaned_links.append(url)
+            log(f"HTTP fetch failed for {url}: {str(e)}")
+            links = []
+        if stats is not None:
+            stats.record(time.time() - start, len(links))
+        return links
     
-    return cleaned_links
+    with concurrent.futures.ThreadPoolExecutor(max_workers=HTTP_TIER_WORKERS) as executor:
+        future_to_url = {executor.submit(fetch, url): url for url in urls}
+        for future in concurrent.futures.as_completed(future_to_url):
+            url = future_to_url[future]
+            links = future.result()
+            # Posts with no links, or fewer than the expected count, go to the browser queue
+            if links and len(links) >= expected_counts.get(url, 1):
+                log(f"HTTP tier: found {len(links)} links for {url}")
+                results[url] = links
+                record_post_result(manifest, url, links, stream)
+            else:
+                browser_urls.append(url)
+    
+    # Keep the input order for the browser queue
+    order = {url: i for i, url in enumerate(urls)}
+    browser_urls.sort(key=order.get)
+    return results, browser_urls
+
+def page_is_throttled(driver):
+    """True if the current page is Facebook's rate-limit notice instead of content."""
+    try:
+        text = driver.execute_script("return document.body ? document.body.innerText.slice(0, 2000) : '';")
+    except Exception:
+        return False
+    return isinstance(text, str) and any(marker in text for marker in THROTTLE_PAGE_MARKERS)
+
+def extract_with_stats(post_url, driver, use_login, stats=None, session_manager=None):
+    """Run the browser extraction for one post and record its latency."""
+    start = time.time()
+    extract = extract_facebook_image_urls_network if EXTRACTION_MODE == "network" else extract_facebook_image_urls
+    
+    def attempt():
+        generation = session_manager.generation if session_manager is not None else None
+        image_urls = extract(post_url, driver, use_login)
+        
+        # Sent to the login page: refresh the shared session once and retry the post
+        if session_manager is not None and '/login' in driver.current_url:
+            log(f"Session expired while loading {post_url}, refreshing cookies...")
+            session_manager.refresh(generation)
+            session_manager.apply_to_driver(driver)
+            image_urls = extract(post_url, driver, use_login)
+        if page_is_throttled(driver):
+            raise RetryableError("Facebook is rate limiting this browser", throttled=True,
+                                 retry_after=BROWSER_THROTTLE_PAUSE)
+        return image_urls
+    
+    try:
+        image_urls = browser_rate_controller.call(post_url, attempt, retry_on=(RetryableError,))
+    except RetryableError as e:
+        log(f"⚠️ {e}; giving up on {post_url} for this run")
+        image_urls = []
+    if stats is not None:
+        stats.record(time.time() - start, len(image_urls))
+    return image_urls
 
-def setup_driver(headless=False):
+def setup_driver(headless=False, capture_network=None, blocking_profile=None, page_load_strategy=None):
     """Set up and return a configured Chrome driver"""
+    if capture_network is None:
+        capture_network = EXTRACTION_MODE == "network"
+    if blocking_profile is None:
+        blocking_profile = BLOCKING_PROFILE
     chrome_options = Options()
     if headless:
         chrome_options.add_argument("--headless")
@@ -221,6 +579,8 @@ def setup_driver(headless=False):
     chrome_options.add_argument("--disable-translate")
     chrome_options.add_argument("--disable-web-security")
     chrome_options.add_argument("--dns-prefetch-disable")
+    if page_load_strategy:
+        chrome_options.page_load_strategy = page_load_strategy
     
     # Add performance preferences
     prefs = {
@@ -236,60 +596,373 @@ def setup_driver(headless=False):
     }
     chrome_options.add_experimental_option('prefs', prefs)
     
-    return webdriver.Chrome(options=chrome_options)
+    # DevTools network events in the performance log, read by extract_facebook_image_urls_network
+    if capture_network:
+        chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+        chrome_options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
+    
+    driver = webdriver.Chrome(options=chrome_options)
+    apply_blocking_profile(driver, blocking_profile)
+    return driver
+
+def apply_blocking_profile(driver, profile):
+    """Block the profile's URL patterns in this browser through the DevTools protocol."""
+    patterns = BLOCKING_PROFILES.get(profile or 'none', [])
+    if not patterns:
+        return
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+
+def measure_page_cost(driver, post_url):
+    """Load one post and return (bytes transferred, requests, blocked requests, load seconds)."""
+    driver.get_log('performance')
+    start = time.time()
+    driver.get(post_url)
+    timed_wait(driver, 'page_ready', first_of(links_settled(PHOTO_LINKS_XPATH), dom_stable()))
+    load_time = time.time() - start
+    
+    total_bytes = 0
+    requests_made = 0
+    blocked = 0
+    for entry in driver.get_log('performance'):
+        try:
+            message = json.loads(entry['message'])['message']
+        except (KeyError, ValueError):
+            continue
+        if message.get('method') == 'Network.loadingFinished':
+            total_bytes += message['params'].get('encodedDataLength', 0)
+            requests_made += 1
+        elif message.get('method') == 'Network.loadingFailed' and message['params'].get('blockedReason'):
+            blocked += 1
+    return total_bytes, requests_made, blocked, load_time
+
+def compare_blocking_profiles(urls, headless=True, profile=None):
+    """Load each post with and without the blocking profile and print bytes and load time per post.
+    
+    This measures the page load until the photo anchors settle, which is all the multi-tab tier waits for,
+    so it is the tier TAB_BLOCKING_PROFILE applies to.
+    """
+    profile = profile or TAB_BLOCKING_PROFILE
+    totals = {}
+    for mode in ('none', profile):
+        driver = setup_driver(headless, capture_network=True, blocking_profile=mode)
+        totals[mode] = [0, 0.0]
+        try:
+            for url in urls:
+                total_bytes, requests_made, blocked, load_time = measure_page_cost(driver, url)
+                totals[mode][0] += total_bytes
+                totals[mode][1] += load_time
+                print(f"[{mode}] {url}: {total_bytes / 1024:.0f} KB in {requests_made} requests "
+                      f"({blocked} blocked), loaded in {load_time:.2f}s")
+        finally:
+            driver.quit()
+    
+    print(f"\nBlocking profile '{profile}' over {len(urls)} posts:")
+    for mode, (total_bytes, load_time) in totals.items():
+        print(f"{mode:>16}: {total_bytes / 1024 / max(len(urls), 1):.0f} KB/post, "
+              f"{load_time / max(len(urls), 1):.2f}s/post")
+    return totals
+
+def record_post_result(manifest, url, image_urls, stream=None):
+    """Save a post's extracted links in the manifest and the link stream as soon as it finishes."""
+    if manifest is not None:
+        manifest.mark('post', url, DONE if image_urls else FAILED, data=json.dumps(image_urls))
+    if stream is not None:
+        stream.write(url, image_urls)
+    if photo_index is not None:
+        metrics.inc('shared_photo_links_total', sum(not first for _, first in photo_index.add_post(url, image_urls)))
+    metrics.inc('posts_total', result='found' if image_urls else 'empty')
+    metrics.inc('links_total', len(image_urls))
+    if progress_line is not None:
+        progress_line.advance(f"{len(image_urls)} links in last post")
+
+class DriverPool:
+    """Fixed-size pool of WebDriver instances, each checked out by one worker at a time.
+    
+    Drivers are health-checked when checked out and after every post, and are
+    replaced when they crash, after max_pages posts, or when their process tree
+    grows past max_memory_mb, so the pool keeps its full size for the whole run.
+    """
+    
+    def __init__(self, size, driver_factory, max_pages=DRIVER_MAX_PAGES, max_memory_mb=DRIVER_MAX_MEMORY_MB):
+        self.driver_factory = driver_factory
+        self.max_pages = max_pages
+        self.max_memory_mb = max_memory_mb
+        self.available = queue.Queue()
+        self.pages = {}
+        self.lock = threading.Lock()
+        self.restarts = 0
+        self.all_drivers = []
+        for _ in range(size):
+            self.available.put(self._new_driver())
+    
+    def _new_driver(self):
+        driver = self.driver_factory()
+        with self.lock:
+            self.pages[driver] = 0
+            self.all_drivers.append(driver)
+        return driver
+    
+    def _is_healthy(self, driver):
+        try:
+            driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+    
+    def _memory_mb(self, driver):
+        """Resident memory of the chromedriver process and every browser process under it."""
+        if psutil is None:
+            return 0
+        try:
+            process = psutil.Process(driver.service.process.pid)
+            processes = [process] + process.children(recursive=True)
+            return sum(p.memory_info().rss for p in processes) / (1024 * 1024)
+        except Exception:
+            return 0
+    
+    def _replace(self, driver, reason, kind):
+        log(f"Restarting browser ({reason})")
+        metrics.inc('driver_restarts_total', reason=kind)
+        with self.lock:
+            self.pages.pop(driver, None)
+            if driver in self.all_drivers:
+                self.all_drivers.remove(driver)
+            self.restarts += 1
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        return self._new_driver()
+    
+    @contextmanager
+    def checkout(self):
+        """Yield a healthy driver for exclusive use and return it to the pool afterwards."""
+        driver = self.available.get()
+        try:
+            if not self._is_healthy(driver):
+                driver = self._replace(driver, "failed health check", 'health_check')
+            yield driver
+        finally:
+            try:
+                with self.lock:
+                    self.pages[driver] = self.pages.get(driver, 0) + 1
+                    pages = self.pages[driver]
+                if not self._is_healthy(driver):
+                    driver = self._replace(driver, "browser crashed", 'crash')
+                elif pages >= self.max_pages:
+                    driver = self._replace(driver, f"recycled after {pages} posts", 'max_pages')
+                elif self.max_memory_mb and self._memory_mb(driver) > self.max_memory_mb:
+                    driver = self._replace(driver, f"memory above {self.max_memory_mb} MB", 'memory')
+            except Exception as e:
+                # Keep the slot: the next checkout health check will try the restart again
+                log(f"Error restarting browser: {str(e)}")
+            self.available.put(driver)
+    
+    def total_memory_mb(self):
+        """Resident memory of every browser in the pool."""
+        with self.lock:
+            drivers = list(self.all_drivers)
+        return sum(self._memory_mb(driver) for driver in drivers)
+    
+    def close(self):
+        with self.lock:
+            drivers = list(self.all_drivers)
+            self.all_drivers = []
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+def make_driver_factory(headless, session_manager=None, page_load_strategy=None, blocking_profile=None):
+    """Return a function that starts a browser and injects the shared session cookies."""
+    def factory():
+        driver = setup_driver(headless, page_load_strategy=page_load_strategy, blocking_profile=blocking_profile)
+        if session_manager is not None and session_manager.is_valid():
+            try:
+                session_manager.apply_to_driver(driver)
+            except Exception as e:
+                print(f"Could not apply the saved session: {str(e)}")
+        return driver
+    return factory
+
+def browser_login(email, password, headless=True):
+    """Log in once in a throwaway browser and return its cookies."""
+    driver = setup_driver(headless)
+    try:
+        login_to_facebook(driver, email, password)
+        return driver.get_cookies()
+    finally:
+        driver.quit()
 
-def process_multiple_posts_parallel(urls, use_login, email=None, password=None, headless=True, max_workers=3):
+def process_multiple_posts_parallel(urls, use_login, session_manager=None, headless=True, max_workers=3,
+                                   manifest=None, stats=None, stream=None):
     """Process multiple URLs in parallel using a thread pool"""
     all_results = {}
     
-    # Create a pool of workers
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Create a driver for each worker
-        drivers = []
-        for _ in range(max_workers):
-            driver = setup_driver(headless)
-            drivers.append(driver)
+    # Each worker checks out its own browser, so no two threads share one
+    pool = DriverPool(max_workers, make_driver_factory(headless, session_manager))
+    
+    def work(url):
+        with pool.checkout() as driver:
+            return extract_with_stats(url, driver, use_login, stats, session_manager)
+    
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            future_to_url = {executor.submit(work, url): url for url in urls}
             
-            # Login if required (only needed once per driver)
-            if use_login and email and password:
+            # Process completed tasks
+            for i, future in enumerate(concurrent.futures.as_completed(future_to_url)):
+                url = future_to_url[future]
                 try:
-                    login_to_facebook(driver, email, password)
+                    image_urls = future.result()
+                    log(f"\n[{i+1}/{len(urls)}] Completed: {url}")
+                    
+                    if image_urls:
+                        log(f"Found {len(image_urls)} images for this post")
+                        all_results[url] = image_urls
+                    else:
+                        log("No images found for this post")
+                        all_results[url] = []
+                    record_post_result(manifest, url, image_urls, stream)
                 except Exception as e:
-                    print(f"Login failed: {str(e)}")
-        
-        # Submit tasks
-        future_to_url = {}
-        for i, url in enumerate(urls):
-            # Use round-robin assignment of drivers
-            driver_index = i % len(drivers)
-            future = executor.submit(extract_facebook_image_urls, url, drivers[driver_index], use_login)
-            future_to_url[future] = url
-        
-        # Process completed tasks
-        for i, future in enumerate(concurrent.futures.as_completed(future_to_url)):
-            url = future_to_url[future]
-            try:
-                image_urls = future.result()
-                print(f"\n[{i+1}/{len(urls)}] Completed: {url}")
-                
-                if image_urls:
-                    print(f"Found {len(image_urls)} images for this post")
-                    all_results[url] = image_urls
-                else:
-                    print("No images found for this post")
+                    log(f"Error processing {url}: {str(e)}")
                     all_results[url] = []
-            except Exception as e:
-                print(f"Error processing {url}: {str(e)}")
-                all_results[url] = []
+                    record_post_result(manifest, url, [], stream)
+    finally:
+        # Close all drivers
+        pool.close()
+    
+    if pool.restarts:
+        log(f"Restarted {pool.restarts} browsers during the run")
+    return all_results
+
+def tab_links(driver, post_url):
+    """Photo links of the post loaded in the current tab, from its anchors and its embedded JSON."""
+    links = []
+    seen = set()
+    for link in driver.execute_script(TAB_LINKS_SCRIPT) or []:
+        if link not in seen:
+            seen.add(link)
+            links.append(link)
+    album_links = embedded_album_links(driver.page_source, post_url, links)
+    if len(album_links) > len(links):
+        links = album_links
+    return clean_links(links)
+
+def extract_posts_in_tabs(driver, pending, tabs=TABS_PER_BROWSER):
+    """Load posts from the pending queue in up to `tabs` tabs of one browser at once.
     
-    # Close all drivers
-    for driver in drivers:
+    The driver must use page load strategy "none", so navigating one tab does not
+    block commands to the others. Tabs are polled round-robin, and each post is
+    read and yielded as (url, links, seconds) as soon as its page settles; the
+    tab then loads the next pending post.
+    """
+    active = {}
+    
+    def load_next(handle):
         try:
-            driver.quit()
-        except:
+            url = pending.get_nowait()
+        except queue.Empty:
+            return False
+        driver.switch_to.window(handle)
+        # The marker is gone once the new document replaces the old one
+        driver.execute_script("document.documentElement.dataset.stale = '1'; window.location.href = arguments[0];", url)
+        active[handle] = {'url': url, 'start': time.time(), 'count': -1, 'changed': time.time()}
+        return True
+    
+    handles = [driver.current_window_handle]
+    for _ in range(tabs - 1):
+        driver.switch_to.new_window('tab')
+        # DevTools request blocking is per tab
+        apply_blocking_profile(driver, TAB_BLOCKING_PROFILE)
+        handles.append(driver.current_window_handle)
+    
+    try:
+        for handle in handles:
+            if not load_next(handle):
+                break
+        
+        while active:
+            for handle in list(active):
+                state = active[handle]
+                driver.switch_to.window(handle)
+                now = time.time()
+                try:
+                    ready = driver.execute_script(
+                        "return document.readyState === 'complete' && !document.documentElement.dataset.stale;")
+                    count = len(driver.execute_script(TAB_LINKS_SCRIPT) or []) if ready else -1
+                except Exception:
+                    ready, count = False, -1
+                if count != state['count']:
+                    state['count'] = count
+                    state['changed'] = now
+                
+                settled = ready and now - state['changed'] >= LINKS_QUIET_PERIOD
+                if not settled and now - state['start'] < TAB_LOAD_TIMEOUT:
+                    continue
+                
+                links = []
+                if '/login' not in driver.current_url:
+                    try:
+                        links = tab_links(driver, state['url'])
+                    except Exception as e:
+                        log(f"Error reading tab for {state['url']}: {str(e)}")
+                del active[handle]
+                yield state['url'], links, now - state['start']
+                load_next(handle)
+            time.sleep(WAIT_POLL_INTERVAL)
+    finally:
+        # Keep only the first tab so the pooled driver can be reused
+        for handle in handles[1:]:
+            try:
+                driver.switch_to.window(handle)
+                driver.close()
+            except Exception:
+                pass
+        try:
+            driver.switch_to.window(handles[0])
+        except Exception:
             pass
-            
-    return all_results
+
+def process_posts_tab_tier(urls, session_manager=None, headless=True, browsers=1, tabs=TABS_PER_BROWSER,
+                           expected_counts=None, stats=None, manifest=None, stream=None):
+    """Extract posts with several tabs per browser. Returns (results, urls that still need the viewer)."""
+    expected_counts = expected_counts or {}
+    pending = queue.Queue()
+    for url in urls:
+        pending.put(url)
+    results = {}
+    results_lock = threading.Lock()
+    
+    pool = DriverPool(browsers, make_driver_factory(headless, session_manager, page_load_strategy='none',
+                                                    blocking_profile=TAB_BLOCKING_PROFILE))
+    
+    def work():
+        with pool.checkout() as driver:
+            for url, links, seconds in extract_posts_in_tabs(driver, pending, tabs):
+                if stats is not None:
+                    stats.record(seconds, len(links))
+                with results_lock:
+                    # Posts with no links, or fewer than the expected count, go to the viewer
+                    if links and len(links) >= expected_counts.get(url, 1):
+                        log(f"Tab tier: found {len(links)} links for {url}")
+                        results[url] = links
+                        record_post_result(manifest, url, links, stream)
+    
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=browsers) as executor:
+            for future in [executor.submit(work) for _ in range(browsers)]:
+                try:
+                    future.result()
+                except Exception as e:
+                    log(f"Tab worker failed: {str(e)}")
+    finally:
+        pool.close()
+    
+    # Everything not finished here, including posts a failed worker dropped, goes to the viewer in input order
+    return results, [url for url in urls if url not in results]
 
 def login_to_facebook(driver, email, password):
     """Login to Facebook with the given credentials"""
@@ -328,6 +1001,166 @@ def login_to_facebook(driver, email, password):
     except TimeoutException:
         print("Login may have failed or page structure has changed. Continuing anyway...")
 
+def read_post_urls(file_path):
+    """Read post URLs and optional expected photo counts, one post per line."""
+    post_urls = []
+    expected_counts = {}
+    with open(file_path, 'r') as file:
+        for line in file:
+            # Each line is a URL, optionally followed by the expected number of photos
+            parts = line.split()
+            if parts and parts[0].startswith('http'):
+                post_urls.append(parts[0])
+                if len(parts) > 1 and parts[1].isdigit():
+                    expected_counts[parts[0]] = int(parts[1])
+    return post_urls, expected_counts
+
+def run_extraction(post_urls, expected_counts=None, session_manager=None, use_login=None, headless=True,
+                   parallel=True, max_workers=2, use_http_tier=True, output_dir=None):
+    """Extract every post without prompting, resuming from the manifest. Returns {post URL: links}.
+    
+    The manifest, link stream and run report are written to output_dir when it is given.
+    """
+    global progress_line, photo_index
+    expected_counts = expected_counts or {}
+    session_manager = session_manager or SessionManager()
+    if use_login is None:
+        use_login = session_manager.is_valid()
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    
+    def output_path(name):
+        return os.path.join(output_dir, name) if output_dir else name
+    
+    # Resume from the manifest: finished posts keep their saved links and are not reopened
+    all_results = {}
+    manifest = None
+    if USE_MANIFEST:
+        manifest_path = output_path(MANIFEST_FILE)
+        manifest = JobManifest(manifest_path)
+        wanted = set(post_urls)
+        for url, data in manifest.items('post'):
+            if url in wanted:
+                all_results[url] = json.loads(data)
+        if all_results:
+            post_urls = [url for url in post_urls if url not in all_results]
+            print(f"Skipping {len(all_results)} posts completed in a previous run ({manifest_path})")
+    
+    # Which posts share each photo, kept across runs
+    photo_index = PhotoIndex(output_path(PHOTO_INDEX_FILE))
+    for url, image_urls in all_results.items():
+        photo_index.add_post(url, image_urls)
+    
+    # Stream each post's links as it finishes, starting with the ones resumed from the manifest
+    stream = None
+    if STREAM_FILE:
+        stream_path = output_path(STREAM_FILE)
+        stream = LinkStreamWriter(stream_path)
+        for url, image_urls in all_results.items():
+            stream.write(url, image_urls)
+        print(f"Streaming links to {stream_path} as posts finish")
+    
+    # Process URLs
+    start_time = time.time()
+    if QUIET:
+        progress_line = ProgressLine(len(post_urls), "posts")
+    http_stats = TierStats("http")
+    tab_stats = TierStats("tab")
+    browser_stats = TierStats("browser")
+    
+    if use_http_tier and post_urls:
+        print(f"Trying {len(post_urls)} posts over plain HTTP...")
+        http_results, post_urls = process_posts_http_tier(post_urls, expected_counts, http_stats, manifest,
+                                                          session_manager, stream)
+        all_results.update(http_results)
+        print(f"HTTP tier handled {len(http_results)} posts, {len(post_urls)} left for the browser")
+    
+    if TABS_PER_BROWSER > 1 and post_urls:
+        print(f"Loading {len(post_urls)} posts in {max_workers} browsers x {TABS_PER_BROWSER} tabs...")
+        tab_results, post_urls = process_posts_tab_tier(post_urls, session_manager, headless, max_workers,
+                                                        TABS_PER_BROWSER, expected_counts, tab_stats, manifest,
+                                                        stream)
+        all_results.update(tab_results)
+        print(f"Tab tier handled {len(tab_results)} posts, {len(post_urls)} left for the photo viewer")
+    
+    if not post_urls:
+        print("No posts left for the browser.")
+    elif parallel and len(post_urls) > 1:
+        print(f"Starting parallel processing with {max_workers} workers...")
+        all_results.update(process_multiple_posts_parallel(post_urls, use_login, session_manager, headless, max_workers,
+                                                           manifest, browser_stats, stream))
+    else:
+        print("Starting sequential processing...")
+        if not session_manager.is_valid():
+            print("Proceeding without login. Some content may not be accessible.")
+        pool = DriverPool(1, make_driver_factory(headless, session_manager))
+        
+        try:
+            # Process each URL sequentially
+            for i, url in enumerate(post_urls):
+                log(f"\n[{i+1}/{len(post_urls)}] Processing: {url}")
+                with pool.checkout() as driver:
+                    image_urls = extract_with_stats(url, driver, use_login, browser_stats, session_manager)
+                
+                if image_urls:
+                    log(f"Found {len(image_urls)} images for this post")
+                    all_results[url] = image_urls
+                else:
+                    log("No images found for this post")
+                    all_results[url] = []
+                record_post_result(manifest, url, image_urls, stream)
+        
+        except Exception as e:
+            print(f"An error occurred: {str(e)}")
+            
+        finally:
+            # Close the browser
+            print("Closing browser...")
+            pool.close()
+    
+    if manifest is not None:
+        manifest.close()
+    if stream is not None:
+        stream.close()
+    shared_links = photo_index.shared
+    photo_index.close()
+    photo_index = None
+    if progress_line is not None:
+        progress_line.close()
+        progress_line = None
+    
+    # Calculate elapsed time
+    elapsed_time = time.time() - start_time
+    
+    # Output results
+    total_images = sum(len(urls) for urls in all_results.values())
+    print(f"\nProcessed {len(all_results)} posts and found {total_images} images in total")
+    if shared_links:
+        print(f"{shared_links} of those photo links point to a photo another post already has; the scraper fetches each photo once")
+    print(f"Total processing time: {elapsed_time:.2f} seconds")
+    if use_http_tier or TABS_PER_BROWSER > 1:
+        for tier_stats in (http_stats, tab_stats, browser_stats):
+            if tier_stats.latencies:
+                print(tier_stats.report())
+    wait_lines = wait_report()
+    if wait_lines:
+        print("Browser wait times:")
+        for line in wait_lines:
+            print(line)
+    rate_lines = []
+    for name, controller in (("HTTP", http_rate_controller), ("Browser", browser_rate_controller)):
+        if controller.limiters:
+            rate_lines += [f"{name} {line}" for line in controller.report()]
+    if rate_lines:
+        print("Rate control:")
+        for line in rate_lines:
+            print(line)
+    if METRICS_REPORT:
+        report_path = output_path(METRICS_REPORT)
+        metrics.write_report(report_path)
+        print(f"Run report written to {report_path}")
+    return all_results
+
 def process_multiple_posts():
     print("Facebook Image URL Extractor (Multiple Posts - Optimized)")
     print("-----------------------------------------------------")
@@ -336,6 +1169,7 @@ def process_multiple_posts():
     input_method = input("Choose input method:\n1. Enter single URL\n2. Load URLs from file\nEnter choice (1/2): ")
     
     post_urls = []
+    expected_counts = {}
     
     if input_method == "1":
         url = input("Enter the Facebook post URL: ")
@@ -343,11 +1177,7 @@ def process_multiple_posts():
     elif input_method == "2":
         file_path = input("Enter the path to the text file containing Facebook post URLs: ")
         try:
-            with open(file_path, 'r') as file:
-                for line in file:
-                    url = line.strip()
-                    if url and url.startswith('http'):
-                        post_urls.append(url)
+            post_urls, expected_counts = read_post_urls(file_path)
             print(f"Loaded {len(post_urls)} URLs from file")
         except Exception as e:
             print(f"Error loading file: {str(e)}")
@@ -360,18 +1190,35 @@ def process_multiple_posts():
         print("No valid URLs found. Exiting.")
         return
     
-    # Ask if user wants to login
-    use_login = input("Do you want to login to Facebook? (y/n): ").lower() == 'y'
+    # Reuse the saved session; only ask for credentials when there is none
+    session_manager = SessionManager()
+    use_login = session_manager.is_valid()
     
     email = None
     password = None
     if use_login:
-        email = input("Enter your Facebook email: ")
-        password = input("Enter your Facebook password: ")
+        print(f"Using the saved Facebook session from {SESSION_FILE}")
+    else:
+        use_login = input("Do you want to login to Facebook? (y/n): ").lower() == 'y'
+        if use_login:
+            email = input("Enter your Facebook email: ")
+            password = input("Enter your Facebook password: ")
     
     # Ask if headless mode is preferred
     headless = input("Run in headless mode (no visible browser)? (y/n): ").lower() == 'y'
     
+    if email and password:
+        # Log in once; every browser and HTTP session reuses these cookies
+        session_manager.login_func = lambda: browser_login(email, password, headless)
+        try:
+            session_manager.ensure()
+        except Exception as e:
+            print(f"Login failed: {str(e)}")
+    
+    if MEASURE_BLOCKING:
+        compare_blocking_profiles(post_urls, headless)
+        return
+    
     # Ask for parallel processing
     parallel = input("Use parallel processing (faster but uses more memory)? (y/n): ").lower() == 'y'
     
@@ -383,51 +1230,12 @@ def process_multiple_posts():
         except:
             max_workers = 2  # Default if invalid input
     
-    # Process URLs
-    all_results = {}
-    start_time = time.time()
-    
-    if parallel and len(post_urls) > 1:
-        print(f"Starting parallel processing with {max_workers} workers...")
-        all_results = process_multiple_posts_parallel(post_urls, use_login, email, password, headless, max_workers)
-    else:
-        print("Starting sequential processing...")
-        driver = setup_driver(headless)
-        
-        try:
-            # Login if credentials provided
-            if use_login and email and password:
-                login_to_facebook(driver, email, password)
-            else:
-                print("Proceeding without login. Some content may not be accessible.")
-            
-            # Process each URL sequentially
-            for i, url in enumerate(post_urls):
-                print(f"\n[{i+1}/{len(post_urls)}] Processing: {url}")
-                image_urls = extract_facebook_image_urls(url, driver, use_login)
-                
-                if image_urls:
-                    print(f"Found {len(image_urls)} images for this post")
-                    all_results[url] = image_urls
-                else:
-                    print("No images found for this post")
-                    all_results[url] = []
-        
-        except Exception as e:
-            print(f"An error occurred: {str(e)}")
-            
-        finally:
-            # Close the browser
-            print("Closing browser...")
-            driver.quit()
-    
-    # Calculate elapsed time
-    elapsed_time = time.time() - start_time
+    # Ask whether to try a plain HTTP fetch before launching browsers
+    use_http_tier = input("Try a fast HTTP fetch before opening a browser? (y/n): ").lower() == 'y'
     
-    # Output results
+    all_results = run_extraction(post_urls, expected_counts, session_manager, use_login, headless, parallel,
+                                 max_workers, use_http_tier)
     total_images = sum(len(urls) for urls in all_results.values())
-    print(f"\nProcessed {len(post_urls)} posts and found {total_images} images in total")
-    print(f"Total processing time: {elapsed_time:.2f} seconds")
     
     # Ask to save to file
     if total_images > 0:
@@ -0,0 +1,54 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+from session_manager import DEFAULT_HEADERS
+
+def is_cdn_url(url):
+    """Return True if the URL points at the scontent/fbcdn image CDN."""
+    return 'scontent' in url or 'fbcdn' in url
+
+def build_session(cookies, session_manager=None, pool_size=10, rate_controller=None, metrics=None):
+    """Create a requests session with browser headers and Facebook cookies.
+
+    http_get() sends the session's requests through rate_controller and counts them in metrics, when given.
+    """
+    session = requests.Session()
+    session.headers.update(DEFAULT_HEADERS)
+    session.rate_controller = rate_controller
+    session.metrics = metrics
+
+    # Size the connection pool for the largest number of concurrent workers
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    if session_manager is not None and session_manager.is_valid():
+        # Shared login: saved cookies with their expiry, refreshed on a /login/ redirect
+        print("Using the saved Facebook session")
+        session_manager.apply_to_session(session)
+    elif cookies.get('c_user') and cookies.get('xs'):
+        print("Using provided authentication cookies")
+        for cookie_name, cookie_value in cookies.items():
+            session.cookies.set(cookie_name, cookie_value, domain='.facebook.com')
+    else:
+        print("⚠️ No authentication cookies provided. Facebook may require login.")
+
+    return session
+
+def http_get(session, url, **kwargs):
+    """GET through the session's rate controller: per-host adaptive limit, retries on 429/5xx and connection errors."""
+    rate_controller = getattr(session, 'rate_controller', None)
+    metrics = getattr(session, 'metrics', None)
+    host = 'cdn' if is_cdn_url(url) else 'page'
+    try:
+        if rate_controller is None:
+            response = session.get(url, **kwargs)
+        else:
+            response = rate_controller.call(url, lambda: session.get(url, **kwargs), stream=kwargs.get('stream', False))
+    except Exception:
+        if metrics is not None:
+            metrics.inc('http_errors_total', host=host)
+        raise
+    if metrics is not None:
+        metrics.inc('http_responses_total', host=host, status=response.status_code)
+    return response
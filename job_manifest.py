@@ -0,0 +1,143 @@
+import sqlite3
+import threading
+import time
+
+# Job states
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+# States that do not need to be retried on the next run
+FINISHED_STATES = (DONE, SKIPPED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    parent TEXT,
+    state TEXT NOT NULL,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    data TEXT,
+    updated REAL NOT NULL,
+    PRIMARY KEY (kind, key)
+)
+"""
+
+class JobManifest:
+    """Persistent record of post URLs, photo links and image URLs and their states.
+
+    `is_done` is a primary-key lookup in SQLite, so memory does not grow with
+    the number of finished items. State changes are buffered and written in
+    batched transactions; until a batch is written, its states are answered
+    from the buffer.
+    """
+
+    def __init__(self, path, batch_size=100, flush_interval=5.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+
+        self.pending_writes = []
+        # (kind, key) -> state of the buffered writes, cleared when they are written
+        self.pending_states = {}
+        self.pending_registrations = []
+        self.last_flush = time.time()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def is_done(self, kind, key):
+        """Return True if the item finished (done or skipped) in this or an earlier run."""
+        with self.lock:
+            state = self.pending_states.get((kind, key))
+            if state is None:
+                row = self.conn.execute("SELECT state FROM jobs WHERE kind = ? AND key = ?", (kind, key)).fetchone()
+                state = row[0] if row else None
+        return state in FINISHED_STATES
+
+    def register(self, kind, key, parent=None):
+        """Record an item as pending unless it is already known."""
+        with self.lock:
+            self.pending_registrations.append((kind, key, parent, PENDING, time.time()))
+            self._maybe_flush()
+
+    def mark(self, kind, key, state, parent=None, size=0, data=None):
+        """Record the state of an item, with its byte count and optional payload."""
+        with self.lock:
+            self.pending_states[kind, key] = state
+            self.pending_writes.append((kind, key, parent, state, size, data, time.time()))
+            self._maybe_flush()
+
+    def items(self, kind, state=DONE):
+        """Yield (key, data) for items of a kind in the given state."""
+        self.flush()
+        with self.lock:
+            rows = self.conn.execute("SELECT key, data FROM jobs WHERE kind = ? AND state = ?", (kind, state)).fetchall()
+        yield from rows
+
+    def parent(self, kind, key):
+        """Return the parent recorded for an item, or None."""
+        self.flush()
+        with self.lock:
+            row = self.conn.execute("SELECT parent FROM jobs WHERE kind = ? AND key = ?", (kind, key)).fetchone()
+        return row[0] if row else None
+
+    def data(self, kind, key):
+        """Return the payload recorded for an item, or None."""
+        self.flush()
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM jobs WHERE kind = ? AND key = ?", (kind, key)).fetchone()
+        return row[0] if row else None
+
+    def summary(self):
+        """Return {kind: {state: (count, bytes)}} for everything in the manifest."""
+        self.flush()
+        result = {}
+        with self.lock:
+            rows = self.conn.execute("SELECT kind, state, COUNT(*), SUM(bytes) FROM jobs GROUP BY kind, state")
+            for kind, state, count, total_bytes in rows:
+                result.setdefault(kind, {})[state] = (count, total_bytes or 0)
+        return result
+
+    def flush(self):
+        """Write buffered state changes in a single transaction."""
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            self.conn.close()
+
+    def _maybe_flush(self):
+        buffered = len(self.pending_writes) + len(self.pending_registrations)
+        if buffered >= self.batch_size or time.time() - self.last_flush >= self.flush_interval:
+            self._flush()
+
+    def _flush(self):
+        if self.pending_registrations or self.pending_writes:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO jobs (kind, key, parent, state, updated) VALUES (?, ?, ?, ?, ?)",
+                    self.pending_registrations,
+                )
+                self.conn.executemany(
+                    "INSERT INTO jobs (kind, key, parent, state, bytes, data, updated) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (kind, key) DO UPDATE SET parent = COALESCE(excluded.parent, parent), "
+                    "state = excluded.state, bytes = excluded.bytes, data = excluded.data, updated = excluded.updated",
+                    self.pending_writes,
+                )
+            self.pending_registrations = []
+            self.pending_writes = []
+            self.pending_states = {}
+        self.last_flush = time.time()
@@ -0,0 +1,109 @@
+import json
+import threading
+import time
+
+# Line-delimited link files: one {"post": url, "links": [...]} record per line,
+# appended as each post finishes, and a final {"end": true} record once the
+# writer is done. Readers can start while the file is still being written.
+STREAM_EXTENSIONS = ('.jsonl', '.ndjson')
+END_RECORD = {'end': True}
+
+class LinkStreamWriter:
+    """Append one JSON line per finished post, flushed so readers see it right away."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        # Each run starts a new stream; resumed posts are written again by the caller
+        self.file = open(path, 'w', encoding='utf-8')
+        self.posts = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, post_url, links):
+        line = json.dumps({'post': post_url, 'links': links}) + '\n'
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            self.posts += 1
+
+    def close(self):
+        """Write the end record so following readers stop, and close the file."""
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.write(json.dumps(END_RECORD) + '\n')
+            self.file.close()
+
+def is_link_stream(path):
+    """True for a JSONL link stream, False for the legacy {post: [links]} JSON file."""
+    if path.lower().endswith(STREAM_EXTENSIONS):
+        return True
+    with open(path, 'r', encoding='utf-8') as f:
+        first_line = f.readline().strip()
+    if not first_line:
+        # Nothing written yet: only a stream is ever read before its writer has output anything
+        return True
+    # A legacy file is one JSON object; its first line alone is not a post record
+    try:
+        record = json.loads(first_line)
+    except ValueError:
+        return False
+    return isinstance(record, dict) and ('post' in record or 'end' in record)
+
+def iter_link_stream(path, follow=False, poll_interval=1.0, idle_timeout=None):
+    """Yield (post_url, links) from a JSONL link stream, one line at a time.
+
+    With follow=True the file is tailed like `tail -f` until the end record
+    arrives, or until it has not grown for idle_timeout seconds.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = ''
+        last_growth = time.time()
+        while True:
+            chunk = f.readline()
+            if chunk:
+                last_growth = time.time()
+                buffer += chunk
+                # A line the writer has not finished yet stays buffered until its newline arrives
+                if not buffer.endswith('\n'):
+                    continue
+                line, buffer = buffer.strip(), ''
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    print(f"Skipping malformed line in {path}: {line[:80]}")
+                    continue
+                if record.get('end'):
+                    return
+                if record.get('post'):
+                    yield record['post'], record.get('links', [])
+                continue
+            if not follow:
+                # Last line without a trailing newline
+                if buffer.strip():
+                    try:
+                        record = json.loads(buffer)
+                    except ValueError:
+                        record = {}
+                    if record.get('post'):
+                        yield record['post'], record.get('links', [])
+                return
+            if idle_timeout is not None and time.time() - last_growth > idle_timeout:
+                print(f"No new links in {path} for {idle_timeout} seconds, stopping")
+                return
+            time.sleep(poll_interval)
+
+def iter_link_file(path, follow=False, poll_interval=1.0, idle_timeout=None):
+    """Yield (post_url, links) from either a JSONL link stream or a legacy JSON file."""
+    if is_link_stream(path):
+        yield from iter_link_stream(path, follow, poll_interval, idle_timeout)
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        yield from json.load(f).items()
@@ -0,0 +1,283 @@
+import glob
+import os
+import re
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import zlib
+
+# Configuration
+PACK_SHARD_BYTES = 1024 ** 3  # Start a new pack file once the current one reaches this size
+PACK_WRITE_BUFFER = 8 * 1024 * 1024  # Entries are buffered and committed in writes of about this size
+PACK_COMMIT_INTERVAL = 5.0  # Seconds before buffered entries are committed even if the buffer is not full
+
+# Entry header: magic, key length, image size, CRC-32 of the image; followed by the key and the image
+ENTRY_MAGIC = b'FBPK'
+ENTRY_HEADER = struct.Struct('<4sHII')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    fbid TEXT,
+    url TEXT,
+    pack TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    ext TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_fbid ON entries (fbid);
+CREATE INDEX IF NOT EXISTS entries_url ON entries (url);
+"""
+
+def key_fbid(key):
+    """fbid part of an fbid/index key, or None."""
+    fbid = key.partition('/')[0]
+    return fbid if fbid.isdigit() else None
+
+class PackStore:
+    """Image store that appends images to a few large pack files instead of one file per image.
+
+    Each image is collected in memory and appended as one entry (header, key,
+    bytes) to the current pack-NNNNN.pack, which rolls over at
+    PACK_SHARD_BYTES. Appends go through a large write buffer; every
+    PACK_WRITE_BUFFER bytes the pack is flushed and fsynced and only then are
+    the new entries' offsets committed to index.sqlite. The index is the
+    commit record: on open, any bytes past the last indexed entry (an
+    interrupted write) are truncated, so a partial entry is never visible.
+    Has the same lookup/save interface as ContentStore.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+        # key -> (pack, offset, length, size, ext)
+        self.entries = {}
+        self.url_keys = {}
+        for key, url, pack, offset, length, size, ext in self.conn.execute(
+                "SELECT key, url, pack, offset, length, size, ext FROM entries"):
+            self.entries[key] = (pack, offset, length, size, ext)
+            if url:
+                self.url_keys[url] = key
+        # (pack, offset) -> image size, for committed entries
+        self.locations = {(pack, offset): size for pack, offset, _, size, _ in self.entries.values()}
+        self.sizes = dict(self.locations)
+
+        self.recover()
+        packs = self.pack_names()
+        self.pack = packs[-1] if packs else None
+        self.file = None
+        self.position = 0
+        self.pending = []
+        self.pending_bytes = 0
+        self.last_commit = time.time()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def pack_names(self):
+        return sorted(os.path.basename(path) for path in glob.glob(os.path.join(self.root, "pack-*.pack")))
+
+    def recover(self):
+        """Cut every pack back to the end of its last indexed entry, dropping writes a crash interrupted."""
+        ends = {}
+        for pack, offset, length, _, _ in self.entries.values():
+            ends[pack] = max(ends.get(pack, 0), offset + length)
+        for pack in self.pack_names():
+            path = os.path.join(self.root, pack)
+            extra = os.path.getsize(path) - ends.get(pack, 0)
+            if extra > 0:
+                print(f"⚠️ Dropping {extra} bytes of uncommitted entries from {path}")
+                with open(path, 'r+b') as f:
+                    f.truncate(ends.get(pack, 0))
+
+    def location(self, pack, offset):
+        """How an entry is recorded in the scraper manifest: <pack path>:<offset>."""
+        return f"{os.path.join(self.root, pack)}:{offset}"
+
+    def parse_location(self, location):
+        """(pack, offset) of a location in this store, or None."""
+        path, _, offset = (location or '').rpartition(':')
+        if os.path.dirname(path) != self.root or not offset.isdigit():
+            return None
+        return os.path.basename(path), int(offset)
+
+    def is_missing(self, location):
+        """True if location points into this store but no committed entry is there (lost in a crash)."""
+        parsed = self.parse_location(location)
+        with self.lock:
+            return parsed is not None and parsed not in self.locations
+
+    def size(self, location):
+        """Image size of the entry at location, or 0."""
+        with self.lock:
+            return self.sizes.get(self.parse_location(location), 0)
+
+    def lookup(self, key, url=None):
+        """Return the location of a stored key (or source URL), or None if it must be downloaded."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None and url and url in self.url_keys:
+                # Same CDN URL reached under a new key: index the existing entry under it too
+                entry = self.entries[self.url_keys[url]]
+                self._add_entry(key, url, entry)
+            if entry is None:
+                return None
+            return self.location(entry[0], entry[1])
+
+    def save(self, key, chunks, url=None, ext=".jpg"):
+        """Append a complete image to the current pack. Returns (location, size)."""
+        # Nothing touches the pack until the whole image has arrived
+        data = b''.join(chunk for chunk in chunks if chunk)
+        key_bytes = key.encode('utf-8')
+        header = ENTRY_HEADER.pack(ENTRY_MAGIC, len(key_bytes), len(data), zlib.crc32(data))
+        length = len(header) + len(key_bytes) + len(data)
+        with self.lock:
+            if self.file is None:
+                current = os.path.join(self.root, self.pack) if self.pack else None
+                self._open(self.pack if current and os.path.getsize(current) < PACK_SHARD_BYTES else self.next_pack())
+            elif self.position > 0 and self.position + length > PACK_SHARD_BYTES:
+                self._open(self.next_pack())
+            offset = self.position
+            self.file.write(header)
+            self.file.write(key_bytes)
+            self.file.write(data)
+            self.position += length
+            entry = (self.pack, offset, length, len(data), ext)
+            self._add_entry(key, url, entry)
+            self.pending_bytes += length
+            if self.pending_bytes >= PACK_WRITE_BUFFER or time.time() - self.last_commit >= PACK_COMMIT_INTERVAL:
+                self._commit()
+            return self.location(self.pack, offset), len(data)
+
+    def read(self, fbid, index=1):
+        """Bytes of the index-th image of a photo (by fbid), or None if it is not stored."""
+        return self.read_key(f"{fbid}/{index}")
+
+    def read_key(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if self.pending:
+                self._commit()
+        pack, offset, length, size, _ = entry
+        with open(os.path.join(self.root, pack), 'rb') as f:
+            f.seek(offset)
+            record = f.read(length)
+        magic, key_length, stored_size, crc = ENTRY_HEADER.unpack_from(record)
+        data = record[length - size:]
+        if magic != ENTRY_MAGIC or stored_size != size or zlib.crc32(data) != crc:
+            raise ValueError(f"Corrupt pack entry for {key} at {pack}:{offset}")
+        return data
+
+    def keys(self, fbid=None):
+        """Stored keys, optionally only those of one fbid."""
+        with self.lock:
+            return sorted(key for key in self.entries if fbid is None or key_fbid(key) == str(fbid))
+
+    def extension(self, key):
+        with self.lock:
+            return self.entries[key][4]
+
+    def flush(self):
+        """Commit buffered entries now."""
+        with self.lock:
+            self._commit()
+
+    def close(self):
+        with self.lock:
+            self._commit()
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            self.conn.close()
+
+    def next_pack(self):
+        return f"pack-{int(self.pack[5:10]) + 1 if self.pack else 0:05d}.pack"
+
+    def _open(self, pack):
+        """Switch appends to pack, committing what was written to the previous one."""
+        self._commit()
+        if self.file is not None:
+            self.file.close()
+        self.pack = pack
+        self.file = open(os.path.join(self.root, pack), 'ab', buffering=PACK_WRITE_BUFFER)
+        self.position = self.file.tell()
+
+    def _add_entry(self, key, url, entry):
+        self.entries[key] = entry
+        self.sizes[entry[0], entry[1]] = entry[3]
+        if url:
+            self.url_keys[url] = key
+        self.pending.append((key, key_fbid(key), url) + entry + (time.time(),))
+
+    def _commit(self):
+        """Make the pack bytes durable, then index them; until then a crash just truncates them away."""
+        if self.pending:
+            if self.file is not None:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO entries (key, fbid, url, pack, offset, length, size, ext, updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    self.pending,
+                )
+            self.locations.update(((row[3], row[4]), row[6]) for row in self.pending)
+            self.pending = []
+            self.pending_bytes = 0
+        self.last_commit = time.time()
+
+def main():
+    """Inspect a pack store: python pack_store.py <store folder> list [fbid] | get <fbid> [index] [file] | extract <folder>"""
+    if len(sys.argv) < 3:
+        print(main.__doc__)
+        return
+    root, command, args = sys.argv[1], sys.argv[2], sys.argv[3:]
+    store = PackStore(root)
+    try:
+        if command == "list":
+            for key in store.keys(args[0] if args else None):
+                print(key)
+        elif command == "get":
+            fbid = args[0]
+            index = int(args[1]) if len(args) > 1 else 1
+            data = store.read(fbid, index)
+            if data is None:
+                print(f"❌ {fbid}/{index} is not in {root}")
+                return
+            path = args[2] if len(args) > 2 else f"fb_{fbid}_{index}{store.extension(f'{fbid}/{index}')}"
+            with open(path, 'wb') as f:
+                f.write(data)
+            print(f"✓ Wrote {len(data)} bytes to {path}")
+        elif command == "extract":
+            os.makedirs(args[0], exist_ok=True)
+            keys = store.keys()
+            for key in keys:
+                fbid, _, index = key.rpartition('/')
+                name = f"fb_{re.sub(r'[^0-9A-Za-z]+', '_', fbid)}_{index}{store.extension(key)}"
+                with open(os.path.join(args[0], name), 'wb') as f:
+                    f.write(store.read_key(key))
+            print(f"✓ Extracted {len(keys)} images to {args[0]}")
+        else:
+            print(main.__doc__)
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
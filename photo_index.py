@@ -0,0 +1,148 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Configuration
+PHOTO_INDEX_FILE = "photo_index.sqlite"  # Created inside the output folder
+PHOTO_CACHE_SIZE = 100000  # Recently seen fbids kept in memory; older ones are looked up in SQLite
+LOOKUP_BATCH = 500  # fbids per SQLite lookup (below SQLite's bound-parameter limit)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS photos (
+    fbid TEXT PRIMARY KEY,
+    photo_set TEXT,
+    link TEXT NOT NULL,
+    first_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS refs (
+    fbid TEXT NOT NULL,
+    post TEXT NOT NULL,
+    PRIMARY KEY (fbid, post)
+);
+"""
+
+FBID_PATTERN = re.compile(r'[?&]fbid=(\d+)')
+SET_PATTERN = re.compile(r'[?&]set=([^&#]+)')
+
+def photo_key(url):
+    """Canonical key of a photo link: (fbid, set), with set None when absent. None if the URL has no fbid."""
+    fbid = FBID_PATTERN.search(url)
+    if not fbid:
+        return None
+    photo_set = SET_PATTERN.search(url)
+    return fbid.group(1), photo_set.group(1) if photo_set else None
+
+def clean_photo_url(key):
+    """Tracking-free facebook.com photo URL for an (fbid, set) key."""
+    fbid, photo_set = key
+    return f"https://www.facebook.com/photo?fbid={fbid}&set={photo_set}" if photo_set else \
+        f"https://www.facebook.com/photo?fbid={fbid}"
+
+class PhotoIndex:
+    """Every photo (by fbid) seen in this and earlier runs, the link it was first seen under, and the posts that share it.
+
+    The same photo reached through a repost or a shared album has the same
+    fbid but another set and URL. add_post() maps every such link to the
+    first one recorded, so the photo page is fetched, and tracked in the
+    manifest, under one link only. Photos are looked up in SQLite once per
+    post; only the PHOTO_CACHE_SIZE most recently used fbids of this run are
+    kept in memory, so memory stays flat however long the history grows.
+    """
+
+    def __init__(self, path, cache_size=PHOTO_CACHE_SIZE):
+        self.path = path
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(photos)")}
+        if 'last_run' not in columns:
+            self.conn.execute("ALTER TABLE photos ADD COLUMN last_run TEXT")
+        self.conn.commit()
+
+        # Photos handed out in this run carry this run's ID in last_run
+        self.run_id = f"{time.time():.6f}-{os.getpid()}"
+        # fbid -> canonical link, for fbids already handed out in this run
+        self.cache = OrderedDict()
+        self.shared = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add_post(self, post_url, links):
+        """Record a post's photo links. Returns [(canonical link, True if first seen in this run)] in link order."""
+        keys = [photo_key(link) for link in links]
+        results = []
+        with self.lock:
+            known = self._lookup({key[0] for key in keys if key and key[0] not in self.cache})
+            new_photos = []
+            handed_out = []
+            refs = []
+            for link, key in zip(links, keys):
+                if key is None:
+                    results.append((link, True))
+                    continue
+                fbid = key[0]
+                refs.append((fbid, post_url))
+                if fbid in self.cache:
+                    self.cache.move_to_end(fbid)
+                    results.append((self.cache[fbid], False))
+                    self.shared += 1
+                    continue
+                if fbid in known:
+                    canonical, last_run = known[fbid]
+                    first = last_run != self.run_id
+                    if first:
+                        handed_out.append((self.run_id, fbid))
+                else:
+                    canonical, first = link, True
+                    new_photos.append((fbid, key[1], link, time.time(), self.run_id))
+                if not first:
+                    self.shared += 1
+                known[fbid] = (canonical, self.run_id)
+                self._remember(fbid, canonical)
+                results.append((canonical, first))
+            with self.conn:
+                self.conn.executemany("INSERT OR IGNORE INTO photos (fbid, photo_set, link, first_seen, last_run) "
+                                      "VALUES (?, ?, ?, ?, ?)", new_photos)
+                self.conn.executemany("UPDATE photos SET last_run = ? WHERE fbid = ?", handed_out)
+                if post_url:
+                    self.conn.executemany("INSERT OR IGNORE INTO refs (fbid, post) VALUES (?, ?)", refs)
+        return results
+
+    def add(self, link, post_url=None):
+        """Record one photo link. Returns (canonical link, True if first seen in this run)."""
+        return self.add_post(post_url, [link])[0]
+
+    def posts(self, fbid):
+        """Every post that links to the photo, in this or an earlier run."""
+        with self.lock:
+            return [post for (post,) in self.conn.execute("SELECT post FROM refs WHERE fbid = ? ORDER BY post", (str(fbid),))]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _lookup(self, fbids):
+        """{fbid: (link, last_run)} for the fbids already in the index, by primary key."""
+        fbids = list(fbids)
+        known = {}
+        for start in range(0, len(fbids), LOOKUP_BATCH):
+            batch = fbids[start:start + LOOKUP_BATCH]
+            rows = self.conn.execute(f"SELECT fbid, link, last_run FROM photos WHERE fbid IN ({','.join('?' * len(batch))})",
+                                     batch)
+            known.update((fbid, (link, last_run)) for fbid, link, last_run in rows)
+        return known
+
+    def _remember(self, fbid, link):
+        self.cache[fbid] = link
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
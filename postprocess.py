@@ -0,0 +1,218 @@
+import hashlib
+import importlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Configuration
+POSTPROCESS_STEPS = ("validate", "strip_exif", "sha256")  # Names from STEPS, or "module:function" for custom steps
+POSTPROCESS_WORKERS = os.cpu_count() or 1
+MAX_PENDING_PER_WORKER = 4  # Downloads block once this many images per worker are waiting
+SIDECAR_SUFFIX = ".json"  # Step results are written to <image file><suffix>
+THUMBNAIL_SIZE = (320, 320)
+THUMBNAIL_SUFFIX = ".thumb.jpg"
+WEBP_QUALITY = 80
+
+class ImageJob:
+    """One downloaded image as seen by the steps. A step that changes the image sets data and modified."""
+
+    def __init__(self, path, data):
+        self.path = path
+        self.data = data
+        self.modified = False
+
+def step_sha256(image):
+    return {'sha256': hashlib.sha256(image.data).hexdigest()}
+
+def step_validate(image):
+    """Check the container is complete, which catches downloads cut off mid-transfer. valid is None for other formats."""
+    data = image.data
+    if data[:3] == b'\xff\xd8\xff':
+        # Some encoders pad after the end-of-image marker
+        return {'format': 'jpeg', 'valid': data.rstrip(b'\x00').endswith(b'\xff\xd9')}
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return {'format': 'png', 'valid': data[-12:-8] == b'\x00\x00\x00\x00' and data[-8:-4] == b'IEND'}
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return {'format': 'gif', 'valid': data.endswith(b'\x3b')}
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return {'format': 'webp', 'valid': int.from_bytes(data[4:8], 'little') + 8 <= len(data)}
+    return {'format': 'unknown', 'valid': None}
+
+def step_strip_exif(image):
+    """Drop the JPEG's Exif (APP1) segments without re-encoding the image."""
+    data = image.data
+    if data[:2] != b'\xff\xd8':
+        return {'exif_removed': 0}
+    kept = [data[:2]]
+    removed = 0
+    position = 2
+    # Header segments run until start-of-scan; everything after it is copied as is
+    while position + 4 <= len(data) and data[position] == 0xFF and data[position + 1] not in (0xDA, 0xD9):
+        length = int.from_bytes(data[position + 2:position + 4], 'big')
+        segment = data[position:position + 2 + length]
+        if data[position + 1] == 0xE1 and segment[4:10] == b'Exif\x00\x00':
+            removed += 1
+        else:
+            kept.append(segment)
+        position += 2 + length
+    if removed:
+        kept.append(data[position:])
+        image.data = b''.join(kept)
+        image.modified = True
+    return {'exif_removed': removed}
+
+def step_thumbnail(image):
+    thumbnail = Image.open(io.BytesIO(image.data))
+    thumbnail.thumbnail(THUMBNAIL_SIZE)
+    path = os.path.splitext(image.path)[0] + THUMBNAIL_SUFFIX
+    thumbnail.convert('RGB').save(path, 'JPEG', quality=85)
+    return {'thumbnail': os.path.basename(path)}
+
+def step_webp(image):
+    path = os.path.splitext(image.path)[0] + '.webp'
+    Image.open(io.BytesIO(image.data)).save(path, 'WEBP', quality=WEBP_QUALITY)
+    return {'webp': os.path.basename(path)}
+
+STEPS = {
+    'sha256': step_sha256,
+    'validate': step_validate,
+    'strip_exif': step_strip_exif,
+    'thumbnail': step_thumbnail,
+    'webp': step_webp,
+}
+PILLOW_STEPS = ('thumbnail', 'webp')
+# Run after every other step, so they describe the bytes that end up on disk
+FINAL_STEPS = ('sha256',)
+
+def resolve_step(name):
+    if name in STEPS:
+        return STEPS[name]
+    module_name, _, function_name = name.partition(':')
+    return getattr(importlib.import_module(module_name), function_name)
+
+def write_atomic(path, data):
+    """Replace a file without ever leaving a half-written version in place."""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def run_steps(path, data, steps):
+    """Run the steps on one image in a worker process and write its sidecar. Returns the sidecar record."""
+    start = time.perf_counter()
+    if data is None:
+        with open(path, 'rb') as f:
+            data = f.read()
+    image = ImageJob(path, data)
+    record = {'file': os.path.basename(path), 'bytes': len(data)}
+    steps = [step for step in steps if step not in FINAL_STEPS] + [step for step in steps if step in FINAL_STEPS]
+    for name in steps:
+        try:
+            record.update(resolve_step(name)(image) or {})
+        except Exception as e:
+            record.setdefault('errors', {})[name] = str(e)
+    if image.modified:
+        write_atomic(path, image.data)
+        record['bytes_written'] = len(image.data)
+    record['seconds'] = round(time.perf_counter() - start, 4)
+    with open(path + SIDECAR_SUFFIX, 'w') as f:
+        json.dump(record, f)
+    return record
+
+class PostProcessor:
+    """Runs CPU-bound steps on downloaded images in a process pool, off the download threads.
+
+    submit() hands over the bytes already in memory, so nothing is read back
+    from disk, and blocks once too many images are waiting so a slow pool
+    holds back the downloads instead of buffering without limit. on_result is
+    called with (key, record) as each image finishes.
+    """
+
+    def __init__(self, steps=None, workers=None, on_result=None):
+        self.steps = tuple(steps or POSTPROCESS_STEPS)
+        workers = workers or POSTPROCESS_WORKERS
+        if Image is None and any(step in PILLOW_STEPS for step in self.steps):
+            print(f"⚠️ Pillow is not installed; skipping the {', '.join(s for s in self.steps if s in PILLOW_STEPS)} steps")
+            self.steps = tuple(step for step in self.steps if step not in PILLOW_STEPS)
+        self.on_result = on_result
+        # Spawned workers do not inherit the download threads' locks and sockets
+        self.executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+        self.slots = threading.BoundedSemaphore(workers * MAX_PENDING_PER_WORKER)
+        self.lock = threading.Lock()
+        self.counters = {'images': 0, 'invalid': 0, 'step_errors': 0, 'failed': 0, 'seconds': 0.0}
+
+    def submit(self, path, data=None, key=None):
+        """Queue an image for the steps; data is its content, or None to read it from path."""
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(run_steps, path, data, self.steps)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda done: self._finished(done, key or path))
+
+    def _finished(self, future, key):
+        self.slots.release()
+        try:
+            record = future.result()
+        except Exception as e:
+            print(f"Post-processing failed for {key}: {e}")
+            with self.lock:
+                self.counters['failed'] += 1
+            return
+        with self.lock:
+            self.counters['images'] += 1
+            self.counters['seconds'] += record['seconds']
+            if record.get('valid') is False:
+                self.counters['invalid'] += 1
+            if record.get('errors'):
+                self.counters['step_errors'] += 1
+        if self.on_result is not None:
+            self.on_result(key, record)
+
+    def close(self):
+        """Wait for every queued image."""
+        self.executor.shutdown(wait=True)
+
+    def report(self):
+        with self.lock:
+            c = dict(self.counters)
+        return (f"Post-processed {c['images']} images ({', '.join(self.steps)}) in {c['seconds']:.1f} worker-seconds: "
+                f"{c['invalid']} invalid, {c['step_errors']} with step errors, {c['failed']} failed")
+
+def main():
+    """Run the steps over images already on disk: python postprocess.py <folder> [step ...]"""
+    if len(sys.argv) < 2:
+        print(main.__doc__)
+        return
+    folder = sys.argv[1]
+    steps = sys.argv[2:] or POSTPROCESS_STEPS
+    extensions = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+    paths = [os.path.join(folder, name) for name in sorted(os.listdir(folder))
+             if name.lower().endswith(extensions) and not name.endswith(THUMBNAIL_SUFFIX)]
+    invalid = []
+    
+    def on_result(path, record):
+        if record.get('valid') is False:
+            invalid.append(path)
+    
+    processor = PostProcessor(steps, on_result=on_result)
+    for path in paths:
+        processor.submit(path)
+    processor.close()
+    print(processor.report())
+    for path in invalid:
+        print(f"❌ Invalid: {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+# Configuration
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+THROTTLE_STATUSES = (429, 503)  # Responses that mean "slow down", not just "failed"
+MAX_ATTEMPTS = 4  # First try plus up to three retries
+BACKOFF_BASE = 0.5  # Seconds; attempt n waits a random time up to BACKOFF_BASE * 2**(n-1)
+BACKOFF_CAP = 30.0
+MAX_RETRY_AFTER = 300.0  # Never sleep longer than this for a Retry-After header
+RETRY_BUDGET_RATIO = 0.2  # Each first attempt earns this many retry tokens
+RETRY_BUDGET_MIN = 10  # Retries always available, so a cold start can still recover
+RETRY_BUDGET_MAX = 100
+ADDITIVE_INCREASE = 1.0  # Limit grows by about this much per limit's worth of successes
+DECREASE_FACTOR = 0.5  # Limit is multiplied by this on a throttled or failed response
+
+def retry_after_seconds(headers):
+    """Seconds to wait from a Retry-After header (delta seconds or HTTP date), or None."""
+    value = headers.get('Retry-After') if headers is not None else None
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff, never shorter than the server's Retry-After."""
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (attempt - 1)))
+    return max(delay, retry_after or 0.0)
+
+class HostLimiter:
+    """AIMD concurrency limit for one host.
+
+    Successes raise the limit additively (about +1 per limit's worth of
+    successful requests) up to max_limit. A throttled or failed response
+    halves it, and a Retry-After pauses new requests to the host until it
+    has passed. Threads wait on a condition; coroutines wait on a future and
+    are handed freed slots in the order they queued.
+    """
+
+    def __init__(self, host, max_limit, initial_limit=None, min_limit=1):
+        self.host = host
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(initial_limit or max_limit)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.condition = threading.Condition()
+        # (loop, future) of coroutines waiting for a slot, oldest first
+        self.waiters = deque()
+        self.wake_at = 0.0
+        self.counters = {
+            'requests': 0, 'successes': 0, 'throttled': 0, 'errors': 0, 'retries': 0,
+            'increases': 0, 'decreases': 0, 'wait_seconds': 0.0,
+        }
+
+    def acquire(self):
+        start = time.time()
+        with self.condition:
+            while True:
+                pause = self.paused_until - time.time()
+                if pause > 0:
+                    self.condition.wait(pause)
+                elif self.waiters or self.in_flight >= int(self.limit):
+                    # Coroutines that queued earlier get freed slots first
+                    self.condition.wait()
+                else:
+                    break
+            self._take()
+            self.counters['wait_seconds'] += time.time() - start
+
+    async def async_acquire(self):
+        """acquire() for coroutines: waits without blocking the event loop, first come first served."""
+        start = time.time()
+        loop = asyncio.get_running_loop()
+        with self.condition:
+            if not self.waiters and self.paused_until <= time.time() and self.in_flight < int(self.limit):
+                self._take()
+                return
+            future = loop.create_future()
+            self.waiters.append((loop, future))
+            self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self.condition:
+                if (loop, future) in self.waiters:
+                    self.waiters.remove((loop, future))
+                elif not future.cancelled():
+                    # The slot was handed over just before the cancellation; pass it on
+                    self._give_back()
+            raise
+        with self.condition:
+            self.counters['wait_seconds'] += time.time() - start
+
+    def wake(self):
+        with self.condition:
+            self._wake()
+
+    def release(self, outcome, retry_after=None):
+        """Return a slot and adjust the limit: outcome is 'success', 'throttled' or 'error'."""
+        with self.condition:
+            self.in_flight -= 1
+            if outcome == 'success':
+                self.counters['successes'] += 1
+                if self.limit < self.max_limit:
+                    self.limit = min(self.max_limit, self.limit + ADDITIVE_INCREASE / self.limit)
+                    self.counters['increases'] += 1
+            else:
+                self.counters['throttled' if outcome == 'throttled' else 'errors'] += 1
+                if self.limit > self.min_limit:
+                    self.limit = max(self.min_limit, self.limit * DECREASE_FACTOR)
+                    self.counters['decreases'] += 1
+                if retry_after:
+                    self.paused_until = max(self.paused_until, time.time() + retry_after)
+            self._wake()
+            self.condition.notify_all()
+
+    def snapshot(self):
+        with self.condition:
+            return dict(self.counters, limit=round(self.limit, 2), in_flight=self.in_flight, waiting=len(self.waiters),
+                        paused=max(0.0, round(self.paused_until - time.time(), 1)))
+
+    def _take(self):
+        self.in_flight += 1
+        self.counters['requests'] += 1
+
+    def _give_back(self):
+        """Return a slot taken for a waiter that no longer wants it, without adjusting the limit."""
+        self.in_flight -= 1
+        self.counters['requests'] -= 1
+        self._wake()
+        self.condition.notify_all()
+
+    def _wake(self):
+        """Hand free slots to waiting coroutines, oldest first. Called with the condition held."""
+        pause = self.paused_until - time.time()
+        if pause > 0:
+            if self.waiters and self.wake_at < self.paused_until:
+                # Nothing may be released during the pause, so wake the waiters when it ends
+                self.wake_at = self.paused_until
+                for loop in {loop for loop, _ in self.waiters}:
+                    loop.call_soon_threadsafe(loop.call_later, pause, self.wake)
+            return
+        while self.waiters and self.in_flight < int(self.limit):
+            loop, future = self.waiters.popleft()
+            self._take()
+            loop.call_soon_threadsafe(self._hand_over, future)
+
+    def _hand_over(self, future):
+        """Runs on the waiter's event loop: resolve its future, or pass the slot on if it was cancelled."""
+        if future.done():
+            with self.condition:
+                self._give_back()
+        else:
+            future.set_result(None)
+
+class RetryBudget:
+    """Token bucket that caps retries to a fraction of first attempts, so an outage cannot multiply the load."""
+
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, minimum=RETRY_BUDGET_MIN, maximum=RETRY_BUDGET_MAX):
+        self.ratio = ratio
+        self.maximum = maximum
+        self.tokens = float(minimum)
+        self.lock = threading.Lock()
+        self.granted = 0
+        self.denied = 0
+
+    def deposit(self):
+        with self.lock:
+            self.tokens = min(self.maximum, self.tokens + self.ratio)
+
+    def withdraw(self):
+        with self.lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.granted += 1
+                return True
+            self.denied += 1
+            return False
+
+    def snapshot(self):
+        with self.lock:
+            return {'tokens': round(self.tokens, 1), 'retries_granted': self.granted, 'retries_denied': self.denied}
+
+class RetryableError(Exception):
+    """Raised by a send function for an outcome that should be retried, e.g. a rate-limit page."""
+
+    def __init__(self, message, throttled=False, retry_after=None):
+        super().__init__(message)
+        self.throttled = throttled
+        self.retry_after = retry_after
+
+def release_when_done(response, release):
+    """Call release() once, when a streamed response's body has been read to the end or it is closed."""
+    lock = threading.Lock()
+    state = {'released': False}
+
+    def release_once():
+        with lock:
+            if state['released']:
+                return
+            state['released'] = True
+        release()
+
+    if hasattr(response, 'aiter_bytes'):
+        # httpx async response
+        aiter_bytes, aclose = response.aiter_bytes, response.aclose
+
+        async def wrapped_aiter_bytes(*args, **kwargs):
+            try:
+                async for chunk in aiter_bytes(*args, **kwargs):
+                    yield chunk
+            finally:
+                release_once()
+
+        async def wrapped_aclose():
+            try:
+                await aclose()
+            finally:
+                release_once()
+
+        response.aiter_bytes, response.aclose = wrapped_aiter_bytes, wrapped_aclose
+    else:
+        # requests response
+        iter_content, close = response.iter_content, response.close
+
+        def wrapped_iter_content(*args, **kwargs):
+            try:
+                yield from iter_content(*args, **kwargs)
+            finally:
+                release_once()
+
+        def wrapped_close():
+            try:
+                close()
+            finally:
+                release_once()
+
+        response.iter_content, response.close = wrapped_iter_content, wrapped_close
+    return response
+
+class RateController:
+    """Per-host adaptive concurrency, retries with jittered backoff and a shared retry budget.
+
+    call()/async_call() run a send function under the host's limiter and retry
+    retryable statuses and exceptions while attempts and the budget allow. The
+    last response is returned (or the last exception raised) when they run out.
+    With stream=True a successful response keeps its slot until its body has
+    been read or it is closed, so body transfers count against the limit too.
+    """
+
+    def __init__(self, default_max_limit=10, max_limits=None, max_attempts=MAX_ATTEMPTS):
+        self.default_max_limit = default_max_limit
+        self.max_limits = dict(max_limits or {})
+        self.max_attempts = max_attempts
+        self.budget = RetryBudget()
+        self.limiters = {}
+        self.lock = threading.Lock()
+
+    def limiter(self, url_or_host):
+        host = urlsplit(url_or_host).hostname if '://' in url_or_host else url_or_host
+        with self.lock:
+            if host not in self.limiters:
+                self.limiters[host] = HostLimiter(host, self.max_limits.get(host, self.default_max_limit))
+            return self.limiters[host]
+
+    def classify(self, response=None, error=None):
+        """Return (outcome, retry_after) for a response or a raised exception."""
+        if error is not None:
+            if isinstance(error, RetryableError):
+                return ('throttled' if error.throttled else 'error'), error.retry_after
+            return 'error', None
+        status = getattr(response, 'status_code', None)
+        if status in THROTTLE_STATUSES:
+            return 'throttled', retry_after_seconds(getattr(response, 'headers', None))
+        if status in RETRY_STATUSES:
+            return 'error', retry_after_seconds(getattr(response, 'headers', None))
+        return 'success', None
+
+    def _should_retry(self, limiter, attempt):
+        if attempt >= self.max_attempts or not self.budget.withdraw():
+            return False
+        with limiter.condition:
+            limiter.counters['retries'] += 1
+        return True
+
+    def _settle(self, limiter, attempt, response, error, stream):
+        """Release an attempt's slot and decide what comes next: ('return', response), ('raise', error) or ('retry', delay)."""
+        outcome, retry_after = self.classify(response, error)
+        # An error status is not read any further, so only a response with a body to stream keeps its slot
+        if outcome == 'success' and stream and getattr(response, 'status_code', 200) < 400:
+            return 'return', release_when_done(response, lambda: limiter.release(outcome))
+        limiter.release(outcome, retry_after)
+        if outcome == 'success':
+            return 'return', response
+        if not self._should_retry(limiter, attempt):
+            return ('raise', error) if error is not None else ('return', response)
+        return 'retry', backoff_delay(attempt, retry_after)
+
+    def call(self, url, send, retry_on=(OSError, RetryableError), stream=False):
+        """Run send() (which returns a response) with per-host limiting and retries."""
+        limiter = self.limiter(url)
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            attempt += 1
+            limiter.acquire()
+            response, error = None, None
+            try:
+                response = send()
+            except retry_on as e:
+                error = e
+            except BaseException:
+                limiter.release('error')
+                raise
+            action, value = self._settle(limiter, attempt, response, error, stream)
+            if action == 'return':
+                return value
+            if action == 'raise':
+                raise value
+            if response is not None:
+                response.close()
+            time.sleep(value)
+
+    async def async_call(self, url, send, retry_on=(OSError, RetryableError), stream=False):
+        """Async counterpart of call(); send() returns an awaitable response."""
+        limiter = self.limiter(url)
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            attempt += 1
+            await limiter.async_acquire()
+            response, error = None, None
+            try:
+                response = await send()
+            except retry_on as e:
+                error = e
+            except BaseException:
+                limiter.release('error')
+                raise
+            action, value = self._settle(limiter, attempt, response, error, stream)
+            if action == 'return':
+                return value
+            if action == 'raise':
+                raise value
+            if response is not None:
+                await response.aclose()
+            await asyncio.sleep(value)
+
+    def metrics(self):
+        """Current limit, in-flight count and decision counters per host, plus the retry budget."""
+        with self.lock:
+            limiters = list(self.limiters.values())
+        return {
+            'hosts': {limiter.host: limiter.snapshot() for limiter in limiters},
+            'retry_budget': self.budget.snapshot(),
+        }
+
+    def report(self):
+        """Human-readable lines summarizing what the controller did."""
+        metrics = self.metrics()
+        lines = []
+        for host, m in sorted(metrics['hosts'].items()):
+            lines.append(f"{host}: limit {m['limit']} ({m['increases']} up / {m['decreases']} down), "
+                         f"{m['requests']} requests, {m['successes']} ok, {m['throttled']} throttled, "
+                         f"{m['errors']} errors, {m['retries']} retries, {m['wait_seconds']:.1f}s waiting")
+        budget = metrics['retry_budget']
+        lines.append(f"retry budget: {budget['retries_granted']} granted, {budget['retries_denied']} denied, "
+                     f"{budget['tokens']} tokens left")
+        return lines
@@ -0,0 +1,194 @@
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is unbounded
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def metric_key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+class RunMetrics:
+    """Counters and latency histograms for one run, cheap enough to record on every request.
+
+    Each thread writes to its own shard without taking a lock; shards are
+    merged only when a snapshot or report is taken.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.local = threading.local()
+        self.shards = []
+        self.shards_lock = threading.Lock()
+        self.started = time.time()
+
+    def _shard(self):
+        shard = getattr(self.local, 'shard', None)
+        if shard is None:
+            shard = {'counters': {}, 'histograms': {}}
+            self.local.shard = shard
+            with self.shards_lock:
+                self.shards.append(shard)
+        return shard
+
+    def inc(self, name, value=1, **labels):
+        counters = self._shard()['counters']
+        key = metric_key(name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        histograms = self._shard()['histograms']
+        key = metric_key(name, labels)
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        histogram[0][index] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the duration of the with-block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        """Merge every thread's shard. Returns (counters, histograms) keyed by (name, labels)."""
+        counters = {}
+        histograms = {}
+        with self.shards_lock:
+            shards = list(self.shards)
+        for shard in shards:
+            for key, value in list(shard['counters'].items()):
+                counters[key] = counters.get(key, 0) + value
+            for key, (bucket_counts, total, count) in list(shard['histograms'].items()):
+                merged = histograms.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0, 0])
+                merged[0] = [a + b for a, b in zip(merged[0], bucket_counts)]
+                merged[1] += total
+                merged[2] += count
+        return counters, histograms
+
+    def reset(self):
+        """Zero every counter and histogram, e.g. between benchmark runs in one process."""
+        with self.shards_lock:
+            for shard in self.shards:
+                shard['counters'].clear()
+                shard['histograms'].clear()
+            self.started = time.time()
+
+    def counter(self, name, **labels):
+        """Total of a counter, summed over all label sets that include the given labels."""
+        counters, _ = self.snapshot()
+        wanted = set(labels.items())
+        return sum(value for (key_name, key_labels), value in counters.items()
+                   if key_name == name and wanted <= set(key_labels))
+
+    def quantile(self, bucket_counts, q):
+        """Upper bound of the bucket holding the q-th quantile."""
+        target = q * sum(bucket_counts)
+        seen = 0
+        for index, count in enumerate(bucket_counts):
+            seen += count
+            if count and seen >= target:
+                return self.buckets[index] if index < len(self.buckets) else float('inf')
+        return 0.0
+
+    def to_dict(self):
+        counters, histograms = self.snapshot()
+        return {
+            'elapsed_seconds': round(time.time() - self.started, 3),
+            'counters': [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(counters.items())
+            ],
+            'histograms': [
+                {'name': name, 'labels': dict(labels), 'count': count, 'sum': round(total, 6),
+                 'p50': self.quantile(bucket_counts, 0.5), 'p99': self.quantile(bucket_counts, 0.99),
+                 'buckets': dict(zip([str(b) for b in self.buckets] + ['+Inf'], bucket_counts))}
+                for (name, labels), (bucket_counts, total, count) in sorted(histograms.items())
+            ],
+        }
+
+    def to_prometheus(self):
+        """Prometheus text exposition format."""
+        counters, histograms = self.snapshot()
+        lines = []
+        for (name, labels), value in sorted(counters.items()):
+            lines.append(f"{name}{format_labels(labels)} {value}")
+        for (name, labels), (bucket_counts, total, count) in sorted(histograms.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(list(self.buckets) + ['+Inf'], bucket_counts):
+                cumulative += bucket_count
+                bucket_labels = labels + (('le', bound),)
+                lines.append(f"{name}_bucket{format_labels(bucket_labels)} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{format_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def write_report(self, path):
+        """Write the report as Prometheus text for .prom/.txt paths, JSON otherwise."""
+        with open(path, 'w') as f:
+            if path.endswith(('.prom', '.txt')):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.to_dict(), f, indent=2)
+
+    def summary_lines(self):
+        """Short human-readable run report: every counter, and count/mean/p50/p99 per histogram."""
+        counters, histograms = self.snapshot()
+        lines = []
+        for (name, labels), value in sorted(counters.items()):
+            lines.append(f"{name}{format_labels(labels)}: {value}")
+        for (name, labels), (bucket_counts, total, count) in sorted(histograms.items()):
+            lines.append(f"{name}{format_labels(labels)}: {count} obs, mean {total / count:.3f}s, "
+                         f"p50 <= {self.quantile(bucket_counts, 0.5)}s, p99 <= {self.quantile(bucket_counts, 0.99)}s")
+        return lines
+
+class ProgressLine:
+    """One self-overwriting status line for quiet mode."""
+
+    def __init__(self, total=None, label="posts", interval=0.5, stream=sys.stderr):
+        self.total = total
+        self.label = label
+        self.interval = interval
+        self.stream = stream
+        self.started = time.time()
+        self.last_draw = 0.0
+        self.done = 0
+        self.lock = threading.Lock()
+
+    def advance(self, extra=''):
+        """Count one finished item and redraw the line (at most every interval seconds)."""
+        with self.lock:
+            self.done += 1
+            done = self.done
+        self.update(done, extra)
+
+    def update(self, done, extra=''):
+        now = time.time()
+        with self.lock:
+            if now - self.last_draw < self.interval and done != self.total:
+                return
+            self.last_draw = now
+            rate = done / max(now - self.started, 1e-9)
+            total = f"/{self.total}" if self.total else ''
+            self.stream.write(f"\r{done}{total} {self.label} | {rate:.2f}/s {extra}".ljust(79))
+            self.stream.flush()
+
+    def close(self):
+        with self.lock:
+            self.stream.write('\n')
+            self.stream.flush()
@@ -1,232 +1,1231 @@
-import requests
 from bs4 import BeautifulSoup
 import os
+import hashlib
 import time
 import re
 import json
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+import queue
+import itertools
+from html import unescape
+from urllib.parse import urlsplit, parse_qs
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from tqdm import tqdm
 import threading
 
+from job_manifest import JobManifest, PENDING, DONE, FAILED, SKIPPED
+from content_store import ContentStore
+from pack_store import PackStore
+from photo_index import PhotoIndex, PHOTO_INDEX_FILE
+from embedded_media import extract_embedded_media
+from session_manager import SessionManager, DEFAULT_HEADERS
+from http_client import build_session, http_get, is_cdn_url
+from link_stream import is_link_stream, iter_link_file
+from sharding import shard_links, shard_name
+from rate_control import RateController, RetryableError
+from run_metrics import RunMetrics
+from postprocess import PostProcessor
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2  # noqa: F401 - enables HTTP/2 in httpx when installed
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
 # Configuration
 DISPLAY_IMAGES = False  # Image preview disabled
+DOWNLOAD_ENGINE = "threads"  # "threads", "pipeline", "asyncio" (requires httpx) or "compare"
+THREAD_WORKERS = 5  # Worker threads for the "threads" engine
+PIPELINE_PAGE_WORKERS = 5  # Page fetch/parse workers for the "pipeline" engine
+PIPELINE_DOWNLOAD_WORKERS = 10  # Image download workers for the "pipeline" engine
+PIPELINE_QUEUE_SIZE = 100  # Bounded queue size between pipeline stages (backpressure)
+PAGE_CONCURRENCY = 5  # Concurrent facebook.com page fetches for the "asyncio" engine
+CDN_CONCURRENCY = 100  # Concurrent scontent CDN downloads for the "asyncio" engine
+USE_MANIFEST = True  # Record progress so an interrupted run resumes where it stopped
+MANIFEST_FILE = "scraper_manifest.sqlite"  # Created inside the output folder
+OUTPUT_MODE = "files"  # "files" (fb_<fbid>_<index>.jpg), "content" (stored once by SHA-256 digest) or "pack" (appended to large pack files)
+CONTENT_STORE_DIR = "content"  # Created inside the output folder for the "content" mode
+PACK_STORE_DIR = "packs"  # Created inside the output folder for the "pack" mode
+VARIANT_POLICY = "largest"  # Which size variant of an scontent image to keep: "largest" or "closest"
+VARIANT_TARGET_WIDTH = 1080  # Target width for the "closest" variant policy
+ALBUM_MODE = True  # Resolve a post's photos from its embedded page JSON; fetch photo pages only as a fallback
+EXTRACTOR_BACKEND = "fast"  # "fast" (regex pre-scan, BeautifulSoup fallback) or "soup"
+PROBE_IMAGES = True  # Read the image header first and drop images that fail the size filter
+PROBE_BYTES = 65536  # Stop probing after this many bytes if no dimensions were found
+MIN_IMAGE_WIDTH = 200
+MIN_IMAGE_HEIGHT = 200
+MAX_ASPECT_RATIO = 4.0  # Longest side / shortest side; rejects banners and sprites
+MIN_CONTENT_LENGTH = 10000  # Size filter used when the header cannot be parsed
+MAX_IN_FLIGHT = 200  # Photo links submitted but not finished at any time; memory stays flat for any input size
+FILE_LIST = None  # e.g. "downloaded_files.txt": write every saved path there (inside the output folder) instead of keeping them
+ADAPTIVE_RATE_CONTROL = True  # Per-host AIMD concurrency, Retry-After and jittered retries for every request
+STREAM_IDLE_TIMEOUT = 300  # Stop following a JSONL link stream after this many seconds without new lines
+DEDUPLICATE_PHOTOS = True  # Fetch a photo linked from several posts (same fbid) once; photo_index.sqlite maps it to every post
+POSTPROCESS = False  # Hash, validate and strip EXIF from each image in a process pool (steps in postprocess.py); "files" mode only
+QUIET = False  # Only the progress bar: no per-image log lines
+METRICS_REPORT = "scraper_metrics.json"  # Run report inside the output folder (.prom/.txt for Prometheus text); None to disable
 
 # Lock for thread-safe progress bar updates
 pbar_lock = threading.Lock()
 
-def download_image(session, url, output_folder, index, total, pbar):
-    """Download an image from a URL and save it to the specified folder."""
+# Stage timings, bytes, status codes and skip reasons for the run report
+metrics = RunMetrics()
+
+# Set by run() when POSTPROCESS is on; downloads hand their bytes to it
+postprocessor = None
+
+# Set by run() when DEDUPLICATE_PHOTOS is on; photo links are collected through it
+photo_index = None
+
+def log(pbar, message):
+    """Write a message above the progress bar, unless QUIET is set."""
+    if QUIET:
+        return
+    with pbar_lock:
+        pbar.write(message)
+
+# Set by run(): shared by every engine of the run, so each run starts from the full limits
+rate_controller = None
+
+# Hosts that get the page limit; every other host (the scontent CDN) gets CDN_CONCURRENCY
+PAGE_HOSTS = ('www.facebook.com',)
+
+def new_rate_controller():
+    """Fresh per-host limits and retry budget: facebook.com pages get a small limit, scontent CDN hosts a large one."""
+    page_limit = max(THREAD_WORKERS, PIPELINE_PAGE_WORKERS, PAGE_CONCURRENCY)
+    return RateController(default_max_limit=CDN_CONCURRENCY, max_limits={host: page_limit for host in PAGE_HOSTS})
+
+async def async_http_get(client, url, stream=False, **kwargs):
+    """Async counterpart of http_get; with stream=True the caller must aclose() the response.
+    
+    Like a requests session from build_session, a client with a SessionManager refreshes the shared
+    login on a /login/ redirect and sends the request once more with the fresh cookies.
+    """
+    send = lambda: client.send(client.build_request('GET', url), stream=stream, **kwargs)
+    host = 'cdn' if is_cdn_url(url) else 'page'
+    session_manager = getattr(client, 'session_manager', None)
+    for attempt in range(2):
+        # The cookie generation this request is sent with, so a late redirect cannot log in twice
+        generation = getattr(client, 'session_generation', None)
+        try:
+            if not ADAPTIVE_RATE_CONTROL:
+                response = await send()
+            else:
+                response = await rate_controller.async_call(url, send,
+                                                            retry_on=(OSError, RetryableError, httpx.TransportError),
+                                                            stream=stream)
+        except Exception:
+            metrics.inc('http_errors_total', host=host)
+            raise
+        metrics.inc('http_responses_total', host=host, status=response.status_code)
+        if attempt or session_manager is None or not is_login_redirect(response):
+            return response
+        if not await session_manager.refresh_async_client(client, generation):
+            return response
+        await response.aclose()
+    return response
+
+def is_login_redirect(response):
+    """True if an httpx response, or a redirect it followed, sends the client to the login page."""
+    return any(hop.is_redirect and '/login' in hop.headers.get('location', '')
+               for hop in list(response.history) + [response])
+
+def image_filename(url, index, fbid=None):
+    """Generate a filename from the photo's fbid, or from the image URL when there is none."""
+    # CDN image URLs never carry the fbid, so it comes from the photo link
+    fbid = fbid or link_fbid(url)
+    if fbid:
+        return f"fb_{fbid}_{index}.jpg"
+    # Same name for the same URL on every run, so a resumed run finds the file it wrote
+    return f"facebook_image_{hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]}_{index}.jpg"
+
+def link_fbid(url):
+    """Return the fbid parameter of a photo link, or None."""
+    fbid = re.search(r'fbid=(\d+)', url)
+    return fbid.group(1) if fbid else None
+
+def store_key(photo_link, index):
+    """Content store key for the index-th image of a photo link (fbid/index)."""
+    return f"{link_fbid(photo_link) or photo_link}/{index}"
+
+def image_extension(url):
+    """File extension from an image URL, defaulting to .jpg."""
+    ext = os.path.splitext(urlsplit(url).path)[1].lower()
+    return ext if ext in ('.jpg', '.jpeg', '.png', '.gif', '.webp') else '.jpg'
+
+# JPEG start-of-frame markers carry the image dimensions
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+def parse_image_dimensions(data):
+    """Return (width, height) from the first bytes of a JPEG, PNG, GIF or WebP file, or None."""
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and len(data) >= 24:
+        return int.from_bytes(data[16:20], 'big'), int.from_bytes(data[20:24], 'big')
+    
+    if data[:6] in (b'GIF87a', b'GIF89a') and len(data) >= 10:
+        return int.from_bytes(data[6:8], 'little'), int.from_bytes(data[8:10], 'little')
+    
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP' and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b'VP8 ':
+            return int.from_bytes(data[26:28], 'little') & 0x3FFF, int.from_bytes(data[28:30], 'little') & 0x3FFF
+        if chunk == b'VP8L':
+            b0, b1, b2, b3 = data[21:25]
+            return 1 + (((b1 & 0x3F) << 8) | b0), 1 + (((b3 & 0x0F) << 10) | (b2 << 2) | ((b1 & 0xC0) >> 6))
+        if chunk == b'VP8X':
+            return 1 + int.from_bytes(data[24:27], 'little'), 1 + int.from_bytes(data[27:30], 'little')
+        return None
+    
+    if data[:2] == b'\xff\xd8':
+        i = 2
+        while i + 4 <= len(data):
+            if data[i] != 0xFF:
+                i += 1
+                continue
+            marker = data[i + 1]
+            if marker == 0xFF or marker == 0x01 or 0xD0 <= marker <= 0xD8:
+                # Fill byte or marker without a length field
+                i += 1 if marker == 0xFF else 2
+                continue
+            if marker in JPEG_SOF_MARKERS:
+                if i + 9 > len(data):
+                    return None
+                return int.from_bytes(data[i+7:i+9], 'big'), int.from_bytes(data[i+5:i+7], 'big')
+            i += 2 + int.from_bytes(data[i+2:i+4], 'big')
+    
+    return None
+
+def image_skip_reason(head, content_length):
+    """Decide from the first bytes of an image whether to skip it. Returns a reason or None."""
+    dimensions = parse_image_dimensions(head) if PROBE_IMAGES else None
+    if dimensions:
+        width, height = dimensions
+        if width < MIN_IMAGE_WIDTH or height < MIN_IMAGE_HEIGHT:
+            return f"Skipping small image ({width}x{height})"
+        if max(width, height) / max(min(width, height), 1) > MAX_ASPECT_RATIO:
+            return f"Skipping banner/sprite image ({width}x{height})"
+        return None
+    
+    # Fall back to the byte-size filter, but only when the server actually sent a length
+    if content_length is not None and content_length < MIN_CONTENT_LENGTH:
+        return f"Skipping small image (size: {content_length} bytes)"
+    return None
+
+def read_image_head(chunks):
+    """Read chunks until the image dimensions can be parsed or PROBE_BYTES is reached."""
+    head_chunks = []
+    size = 0
+    for chunk in chunks:
+        head_chunks.append(chunk)
+        size += len(chunk)
+        if size >= PROBE_BYTES or parse_image_dimensions(b''.join(head_chunks)):
+            break
+    return head_chunks
+
+def response_content_length(headers):
+    """Content-Length as an int, or None for chunked responses without one."""
+    content_length = headers.get('Content-Length')
+    return int(content_length) if content_length else None
+
+def manifest_mark(manifest, kind, key, state, **kwargs):
+    """Record a job state when a manifest is in use."""
+    if manifest is not None:
+        manifest.mark(kind, key, state, **kwargs)
+
+def record_skip(skip_reason):
+    """Count a skipped image under a short reason label ("small image", "banner/sprite image")."""
+    metrics.inc('images_total', result='skipped')
+    metrics.inc('images_skipped_total', reason=skip_reason.split(' (')[0].replace('Skipping ', ''))
+
+def record_download(download_time, write_time, size):
+    """Record a finished image: transfer time, disk write time (None if not measured separately) and bytes."""
+    metrics.observe('stage_seconds', download_time, stage='download')
+    if write_time is not None:
+        metrics.observe('stage_seconds', write_time, stage='disk_write')
+    metrics.inc('images_total', result='done')
+    metrics.inc('image_bytes_total', size)
+
+def image_already_done(manifest, url, pbar):
+    """Return True (and log it) if the manifest says this image was already handled."""
+    if manifest is not None and manifest.is_done('image', url):
+        log(pbar, f"Already handled in a previous run: {url}")
+        metrics.inc('images_total', result='already_done')
+        return True
+    return False
+
+def record_photo_result(manifest, photo_link, image_urls):
+    """Mark a photo link done once every one of its images is finished."""
+    if manifest is None:
+        return
+    if image_urls and all(manifest.is_done('image', url) for url in image_urls):
+        manifest.mark('photo', photo_link, DONE)
+    else:
+        manifest.mark('photo', photo_link, FAILED)
+
+def forget_lost_pack_entries(manifest, store):
+    """Reset images the manifest has as done whose pack entry was dropped after a crash, so they are downloaded again."""
+    lost = [url for url, location in manifest.items('image') if store.is_missing(location)]
+    for url in lost:
+        # The photo link is reopened too, or the next run would skip it without reaching the image
+        photo_link = manifest.parent('image', url)
+        if photo_link:
+            manifest.mark('photo', photo_link, PENDING)
+        manifest.mark('image', url, PENDING)
+    if lost:
+        print(f"⚠️ {len(lost)} images were not committed to the pack store before the last run stopped; downloading them again")
+
+def stored_image(store, key, url, pbar, manifest=None):
+    """Return the store path for an image that is already stored, skipping the transfer."""
+    if store is None:
+        return None
+    stored_path = store.lookup(key or url, url)
+    if stored_path:
+        log(pbar, f"Already stored: {stored_path}")
+        metrics.inc('images_total', result='stored')
+        manifest_mark(manifest, 'image', url, DONE, data=stored_path)
+    return stored_path
+
+def download_image(session, url, output_folder, index, total, pbar, manifest=None, store=None, key=None, fbid=None):
+    """Download an image from a URL and save it to the specified folder (or content store)."""
+    if image_already_done(manifest, url, pbar):
+        return None
+    stored_path = stored_image(store, key, url, pbar, manifest)
+    if stored_path:
+        return stored_path
+    
+    img_response = None
     try:
-        # Generate a filename based on post ID or timestamp
-        post_id = re.search(r'fbid=(\d+)', url)
-        if post_id:
-            filename = f"fb_{post_id.group(1)}_{index}.jpg"
-        else:
-            filename = f"facebook_image_{int(time.time())}_{index}.jpg"
-        
+        filename = image_filename(url, index, fbid)
         file_path = os.path.join(output_folder, filename)
         
         # Log the download start
-        with pbar_lock:
-            pbar.write(f"Downloading image {index}/{total}: {filename}")
+        log(pbar, f"Downloading image {index}/{total}: {filename}")
         
         # Download the image
-        img_response = session.get(url, stream=True)
+        start_time = time.perf_counter()
+        img_response = http_get(session, url, stream=True)
         img_response.raise_for_status()
         
-        # Skip small images (e.g., icons)
-        content_length = int(img_response.headers.get('Content-Length', 0))
-        if content_length < 10000:
-            with pbar_lock:
-                pbar.write(f"Skipping small image (size: {content_length} bytes)")
+        # Skip small images (e.g., icons) and banners from the header bytes alone
+        content_length = response_content_length(img_response.headers)
+        chunks = img_response.iter_content(chunk_size=8192)
+        head_chunks = read_image_head(chunks) if PROBE_IMAGES else []
+        skip_reason = image_skip_reason(b''.join(head_chunks), content_length)
+        if skip_reason:
+            # Closing the unread response drops the connection instead of draining the body
+            img_response.close()
+            log(pbar, skip_reason)
+            record_skip(skip_reason)
+            manifest_mark(manifest, 'image', url, SKIPPED, size=sum(len(chunk) for chunk in head_chunks))
             return None
+        chunks = itertools.chain(head_chunks, chunks)
         
         # Save the image to disk
-        with open(file_path, 'wb') as f:
-            for chunk in img_response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
+        write_time = 0.0
+        kept_chunks = None
+        if store is not None:
+            file_path, size = store.save(key or url, chunks, url, image_extension(url))
+        else:
+            size = 0
+            # Post-processing gets the bytes already in memory instead of reading the file back
+            if postprocessor is not None:
+                kept_chunks = []
+            with open(file_path, 'wb') as f:
+                for chunk in chunks:
+                    if chunk:
+                        write_start = time.perf_counter()
+                        f.write(chunk)
+                        write_time += time.perf_counter() - write_start
+                        size += len(chunk)
+                        if kept_chunks is not None:
+                            kept_chunks.append(chunk)
         
-        with pbar_lock:
-            pbar.write(f"✓ Successfully downloaded: {filename}")
+        record_download(time.perf_counter() - start_time - write_time, write_time if store is None else None, size)
+        log(pbar, f"✓ Successfully downloaded: {filename}")
         
+        manifest_mark(manifest, 'image', url, DONE, size=size, data=file_path)
+        if kept_chunks is not None:
+            # After the done mark, so an invalid result can overwrite it
+            postprocessor.submit(file_path, b''.join(kept_chunks), url)
         return file_path
     
     except Exception as e:
-        with pbar_lock:
-            pbar.write(f"Error downloading image: {e}")
+        if img_response is not None:
+            # Frees the host slot the streamed response holds
+            img_response.close()
+        log(pbar, f"Error downloading image: {e}")
+        metrics.inc('images_total', result='failed')
+        manifest_mark(manifest, 'image', url, FAILED)
         return None
 
 def process_facebook_link(session, url, pbar):
     """Process a single Facebook link and extract image URLs."""
     try:
-        with pbar_lock:
-            pbar.write(f"\nFetching post: {url}")
+        log(pbar, f"\nFetching post: {url}")
         
         # Fetch the page content
-        response = session.get(url, allow_redirects=True)
-        response.raise_for_status()
+        with metrics.timer('stage_seconds', stage='fetch'):
+            response = http_get(session, url, allow_redirects=True)
+            response.raise_for_status()
+            html = response.text
         
         # Check for login redirect
         if '/login/' in response.url:
-            with pbar_lock:
-                pbar.write("⚠️ Redirected to login page. Authentication required.")
+            log(pbar, "⚠️ Redirected to login page. Authentication required.")
+            metrics.inc('login_redirects_total')
             return []
         
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Look for images with specific attributes
-        images = soup.find_all('img', attrs={'data-visualcompletion': 'media-vc-image'})
-        
-        if not images:
-            with pbar_lock:
-                pbar.write("No images found with data-visualcompletion='media-vc-image'")
-                pbar.write("Trying alternative method...")
-            # Fallback to regex pattern matching
-            image_pattern = r'https:\/\/scontent[^"\']+\.(?:jpg|jpeg|png|gif)'
-            image_urls = re.findall(image_pattern, response.text)
-            
-            if image_urls:
-                with pbar_lock:
-                    pbar.write(f"Found {len(image_urls)} image URLs using pattern matching")
-                image_urls = list(dict.fromkeys(image_urls))  # Remove duplicates
-                images = []
-                for img_url in image_urls:
-                    fake_img = soup.new_tag('img')
-                    fake_img['src'] = img_url
-                    images.append(fake_img)
-            else:
-                images = soup.find_all('img')
-                with pbar_lock:
-                    pbar.write(f"Found {len(images)} other images on the page")
-        else:
-            with pbar_lock:
-                pbar.write(f"Found {len(images)} images with data-visualcompletion='media-vc-image'")
-        
-        # Extract and filter image URLs
-        image_urls = []
-        for img in images:
-            if 'src' in img.attrs:
-                src = img['src']
-                clean_url = src.replace('&', '&')  # Ensure URL integrity
-                if 'icon' in clean_url.lower() or 'logo' in clean_url.lower():
-                    continue
-                image_urls.append(clean_url)
-        
-        return image_urls
+        with metrics.timer('stage_seconds', stage='parse'):
+            return extract_image_urls(html, pbar)
     
     except Exception as e:
-        with pbar_lock:
-            pbar.write(f"Error processing URL {url}: {e}")
+        log(pbar, f"Error processing URL {url}: {e}")
         return []
 
-def process_photo_link(session, photo_link, output_folder, pbar):
+# scontent URLs name the underlying asset in the file name
+# (e.g. .../123_456_789_n.jpg) while size and crop live in the path or the
+# stp= parameter (s960x960, p720x720, c0.79.720.720a), so variants of one photo
+# share an asset key.
+SCONTENT_ASSET_PATTERN = re.compile(r'/(\d+_\d+_\d+_[a-z])\.(?:jpg|jpeg|png|gif|webp)$', re.IGNORECASE)
+SCONTENT_SIZE_PATTERN = re.compile(r'(?:^|[/_])[sp](\d+)x(\d+)(?=$|[/_&])')
+SCONTENT_CROP_PATTERN = re.compile(r'(?:^|[/_])c\d+\.\d+\.\d+\.\d+a?(?=$|[/_&])')
+
+def scontent_asset_key(url):
+    """Return the asset ID shared by every size variant of an scontent image, or None."""
+    if not is_cdn_url(url):
+        return None
+    match = SCONTENT_ASSET_PATTERN.search(urlsplit(url).path)
+    return match.group(1) if match else None
+
+def scontent_variant(url):
+    """Return (width, cropped) for an scontent URL; width is None for the original size."""
+    parts = urlsplit(url)
+    hints = [parts.path] + parse_qs(parts.query).get('stp', [])
+    width = None
+    cropped = False
+    for hint in hints:
+        for match in SCONTENT_SIZE_PATTERN.finditer(hint):
+            width = max(int(match.group(1)), int(match.group(2)))
+        if SCONTENT_CROP_PATTERN.search(hint):
+            cropped = True
+    return width, cropped
+
+def variant_rank(url, policy=VARIANT_POLICY, target_width=VARIANT_TARGET_WIDTH):
+    """Sort key for picking the best variant of an asset (lower is better)."""
+    width, cropped = scontent_variant(url)
+    if policy == "closest":
+        distance = abs(width - target_width) if width else float('inf')
+        return (cropped, distance)
+    return (cropped, -(width or float('inf')))
+
+def select_image_variants(image_urls, policy=VARIANT_POLICY, target_width=VARIANT_TARGET_WIDTH):
+    """Keep one URL per scontent asset, chosen by the variant policy, in first-seen order."""
+    best = {}
+    order = []
+    for url in image_urls:
+        key = scontent_asset_key(url) or url
+        if key not in best:
+            order.append(key)
+            best[key] = url
+        elif variant_rank(url, policy, target_width) < variant_rank(best[key], policy, target_width):
+            best[key] = url
+    return [best[key] for key in order]
+
+# Fallback pattern for scontent image URLs embedded anywhere in the page
+SCONTENT_URL_PATTERN = re.compile(r'https:\/\/scontent[^"\'\s]+?\.(?:jpg|jpeg|png|gif)(?:\?[^"\'\s]*)?')
+MEDIA_IMG_TAG_PATTERN = re.compile(r'<img\b[^>]*?\bdata-visualcompletion=["\']media-vc-image["\'][^>]*>', re.IGNORECASE)
+IMG_SRC_PATTERN = re.compile(r'(?<![\w-])src=["\']([^"\']+)["\']', re.IGNORECASE)
+
+def filter_image_urls(image_urls, pbar):
+    """Drop icons/logos and redundant size variants from extracted image URLs."""
+    filtered_urls = []
+    for url in image_urls:
+        if 'icon' in url.lower() or 'logo' in url.lower():
+            continue
+        filtered_urls.append(url)
+    
+    selected_urls = select_image_variants(filtered_urls)
+    if len(selected_urls) < len(filtered_urls):
+        log(pbar, f"Kept {len(selected_urls)} of {len(filtered_urls)} URLs after removing size variants")
+    return selected_urls
+
+def extract_image_urls_fast(html, pbar):
+    """Find media-vc-image tags and scontent URLs with regex scans, without building a DOM."""
+    # A substring check is far cheaper than the tag regex on pages without the marker
+    if 'media-vc-image' in html:
+        image_urls = []
+        for tag in MEDIA_IMG_TAG_PATTERN.finditer(html):
+            src = IMG_SRC_PATTERN.search(tag.group(0))
+            if src:
+                image_urls.append(unescape(src.group(1)))
+        if image_urls:
+            log(pbar, f"Found {len(image_urls)} images with data-visualcompletion='media-vc-image'")
+            return filter_image_urls(image_urls, pbar)
+    
+    image_urls = [unescape(url) for url in SCONTENT_URL_PATTERN.findall(html)]
+    if image_urls:
+        log(pbar, f"Found {len(image_urls)} image URLs using pattern matching")
+        return filter_image_urls(image_urls, pbar)
+    
+    return []
+
+def extract_image_urls_soup(html, pbar):
+    """Extract image URLs from a full BeautifulSoup parse of the page."""
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # Look for images with specific attributes
+    images = soup.find_all('img', attrs={'data-visualcompletion': 'media-vc-image'})
+    
+    if not images:
+        log(pbar, "No images found with data-visualcompletion='media-vc-image'")
+        log(pbar, "Trying alternative method...")
+        # Fallback to regex pattern matching
+        image_urls = [unescape(url) for url in SCONTENT_URL_PATTERN.findall(html)]
+        
+        if image_urls:
+            log(pbar, f"Found {len(image_urls)} image URLs using pattern matching")
+            return filter_image_urls(image_urls, pbar)
+        
+        images = soup.find_all('img')
+        log(pbar, f"Found {len(images)} other images on the page")
+    else:
+        log(pbar, f"Found {len(images)} images with data-visualcompletion='media-vc-image'")
+    
+    # Extract and filter image URLs
+    return filter_image_urls([img['src'] for img in images if 'src' in img.attrs], pbar)
+
+# Extractor backends are tried in order until one finds images
+EXTRACTOR_BACKENDS = {
+    "fast": [extract_image_urls_fast, extract_image_urls_soup],
+    "soup": [extract_image_urls_soup],
+}
+
+def extract_image_urls(html, pbar, backend=None):
+    """Extract image URLs from the HTML of a photo page with the configured backend."""
+    for extractor in EXTRACTOR_BACKENDS[backend or EXTRACTOR_BACKEND]:
+        image_urls = extractor(html, pbar)
+        if image_urls:
+            return image_urls
+    return []
+
+def is_photo_link(photo_link):
+    """Return True for photo viewer links that can be scraped."""
+    return "pcb" in photo_link and "download" not in photo_link
+
+def photo_image_urls(session, photo_link, pbar, resolved=None):
+    """Image URLs for a photo link: from the resolved album JSON if available, else from its page."""
+    # Each link is processed once, so its entry is dropped to keep memory flat on long streams
+    image_urls = resolved.pop(photo_link, None) if resolved else None
+    if image_urls:
+        return image_urls
+    return process_facebook_link(session, photo_link, pbar)
+
+def process_photo_link(session, photo_link, output_folder, pbar, manifest=None, store=None, resolved=None):
     """Process a single photo link and download its images."""
     # Skip non-photo or download links
-    if "download" in photo_link or "pcb" not in photo_link:
-        with pbar_lock:
-            pbar.write(f"Skipping non-photo link: {photo_link}")
+    if not is_photo_link(photo_link):
+        log(pbar, f"Skipping non-photo link: {photo_link}")
         return []
     
     # Get image URLs from the photo link
-    image_urls = process_facebook_link(session, photo_link, pbar)
+    image_urls = photo_image_urls(session, photo_link, pbar, resolved)
     downloaded_files = []
     
     # Download each image
     for j, img_url in enumerate(image_urls):
-        file_path = download_image(session, img_url, output_folder, j+1, len(image_urls), pbar)
+        if manifest is not None:
+            manifest.register('image', img_url, parent=photo_link)
+        file_path = download_image(session, img_url, output_folder, j+1, len(image_urls), pbar,
+                                   manifest, store, store_key(photo_link, j+1), link_fbid(photo_link))
         if file_path:
             downloaded_files.append(file_path)
     
+    record_photo_result(manifest, photo_link, image_urls)
     return downloaded_files
 
+# Album mode: a post page (or the first photo page of its set) embeds the media
+# set as JSON, so one fetch can resolve every photo link of the post instead of
+# one fetch per photo.
+
+def resolve_album(session, post_url, photo_links, pbar):
+    """Resolve a post's photo links to full-size image URLs from the embedded page JSON."""
+    wanted = {link_fbid(link): link for link in photo_links if link_fbid(link)}
+    resolved = {}
+    
+    for page_url in [post_url] + photo_links[:1]:
+        if len(resolved) == len(wanted):
+            break
+        try:
+            with metrics.timer('stage_seconds', stage='fetch'):
+                response = http_get(session, page_url, allow_redirects=True)
+                response.raise_for_status()
+                html = response.text
+            if '/login/' in response.url:
+                log(pbar, "⚠️ Redirected to login page. Authentication required.")
+                metrics.inc('login_redirects_total')
+                break
+            with metrics.timer('stage_seconds', stage='parse'):
+                media = extract_embedded_media(html)
+        except Exception as e:
+            log(pbar, f"Error reading album JSON from {page_url}: {e}")
+            continue
+        
+        for fbid, info in media.items():
+            link = wanted.get(fbid)
+            if link and link not in resolved:
+                resolved[link] = [info['url']]
+    
+    log(pbar, f"Album {post_url}: resolved {len(resolved)}/{len(wanted)} photos from embedded JSON")
+    return resolved
+
+def resolve_albums(session, post_photo_links, pbar):
+    """Resolve every post's photo links in parallel. Unresolved links fall back to per-photo fetches."""
+    resolved = {}
+    with ThreadPoolExecutor(max_workers=THREAD_WORKERS) as executor:
+        futures = [
+            executor.submit(resolve_album, session, post_url, photo_links, pbar)
+            for post_url, photo_links in post_photo_links.items() if photo_links
+        ]
+        for future in as_completed(futures):
+            try:
+                resolved.update(future.result())
+            except Exception as e:
+                log(pbar, f"Error resolving album: {e}")
+            finally:
+                pbar.update(1)
+    return resolved
+
+def new_session(cookies, session_manager=None):
+    """requests session for the run: sized for the engines' workers, rate-controlled and counted in the run metrics."""
+    pool_size = max(THREAD_WORKERS, PIPELINE_PAGE_WORKERS + PIPELINE_DOWNLOAD_WORKERS)
+    return build_session(cookies, session_manager, pool_size, rate_controller if ADAPTIVE_RATE_CONTROL else None, metrics)
+
+class DownloadSummary:
+    """Thread-safe run counters. Saved paths go to an optional file list instead of memory."""
+    
+    def __init__(self, file_list_path=None, store=None):
+        self.photo_links = 0
+        self.empty_links = 0
+        self.images = 0
+        self.bytes = 0
+        # Set by run() when it stopped on an error, so callers can tell a partial run from a complete one
+        self.error = None
+        self.lock = threading.Lock()
+        self.file_list_path = file_list_path
+        self.file_list = open(file_list_path, 'a', encoding='utf-8') if file_list_path else None
+        # Pack store locations are not files; their sizes come from the pack index
+        self.pack_store = store if isinstance(store, PackStore) else None
+    
+    def add(self, downloaded_files):
+        """Count one finished photo link and the files saved for it."""
+        if self.pack_store is not None:
+            sizes = [self.pack_store.size(location) for location in downloaded_files]
+        else:
+            sizes = [os.path.getsize(file_path) for file_path in downloaded_files if os.path.exists(file_path)]
+        with self.lock:
+            self.photo_links += 1
+            if not downloaded_files:
+                self.empty_links += 1
+            self.images += len(downloaded_files)
+            self.bytes += sum(sizes)
+            if self.file_list is not None:
+                for file_path in downloaded_files:
+                    self.file_list.write(file_path + '\n')
+    
+    def close(self):
+        if self.file_list is not None:
+            self.file_list.close()
+
+def run_thread_engine(session, photo_links, output_folder, pbar, manifest=None, store=None, resolved=None,
+                      summary=None):
+    """Process photo links on a thread pool sharing one requests session."""
+    summary = summary or DownloadSummary()
+    
+    def collect(future):
+        try:
+            summary.add(future.result())
+        except Exception as e:
+            log(pbar, f"Error processing photo link: {e}")
+        finally:
+            pbar.update(1)
+    
+    with ThreadPoolExecutor(max_workers=THREAD_WORKERS) as executor:
+        # Only MAX_IN_FLIGHT futures exist at once; the next link is submitted as one finishes
+        in_flight = set()
+        for photo_link in photo_links:
+            if len(in_flight) >= MAX_IN_FLIGHT:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future)
+            in_flight.add(executor.submit(process_photo_link, session, photo_link, output_folder, pbar,
+                                          manifest, store, resolved))
+        
+        for future in as_completed(in_flight):
+            collect(future)
+    
+    return summary
+
+# Pipeline engine: page workers parse photo pages and feed image URLs into a
+# bounded queue drained by a separately sized pool of download workers. A full
+# queue blocks the producers, so neither stage can run away from the other.
+
+class StageStats:
+    """Thread-safe throughput counters for one pipeline stage."""
+    
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy_time = 0.0
+        self.blocked_time = 0.0
+        self.lock = threading.Lock()
+    
+    def record(self, busy_time, blocked_time=0.0):
+        with self.lock:
+            self.items += 1
+            self.busy_time += busy_time
+            self.blocked_time += blocked_time
+    
+    def report(self, wall_time):
+        wall_time = max(wall_time, 1e-9)
+        capacity = wall_time * self.workers
+        return (f"{self.name:>9}: {self.items} items, {self.workers} workers, "
+                f"{self.items / wall_time:.1f} items/s, "
+                f"{self.busy_time / capacity:.0%} busy, {self.blocked_time / capacity:.0%} blocked downstream")
+
+def run_pipeline_engine(session, photo_links, output_folder, pbar, manifest=None, store=None, resolved=None,
+                        summary=None):
+    """Process photo links through separately sized fetch and download stages."""
+    link_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    image_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    fetch_stats = StageStats("fetch", PIPELINE_PAGE_WORKERS)
+    download_stats = StageStats("download", PIPELINE_DOWNLOAD_WORKERS)
+    summary = summary or DownloadSummary()
+    files_lock = threading.Lock()
+    # Images still outstanding per photo link, so the link is marked and counted once all finish
+    remaining_images = {}
+    
+    def finish_image(photo_link, file_path):
+        with files_lock:
+            entry = remaining_images[photo_link]
+            entry[0] -= 1
+            if file_path:
+                entry[2].append(file_path)
+            if entry[0] > 0:
+                return
+            del remaining_images[photo_link]
+        record_photo_result(manifest, photo_link, entry[1])
+        summary.add(entry[2])
+    
+    def fetch_worker():
+        while True:
+            photo_link = link_queue.get()
+            if photo_link is None:
+                break
+            start_time = time.time()
+            image_urls = []
+            try:
+                if is_photo_link(photo_link):
+                    image_urls = photo_image_urls(session, photo_link, pbar, resolved)
+                else:
+                    log(pbar, f"Skipping non-photo link: {photo_link}")
+            except Exception as e:
+                log(pbar, f"Error processing photo link: {e}")
+            busy_time = time.time() - start_time
+            
+            if image_urls:
+                with files_lock:
+                    remaining_images[photo_link] = [len(image_urls), image_urls, []]
+            else:
+                if is_photo_link(photo_link):
+                    record_photo_result(manifest, photo_link, image_urls)
+                summary.add([])
+            
+            # put() blocks while the download stage is saturated
+            for j, img_url in enumerate(image_urls):
+                if manifest is not None:
+                    manifest.register('image', img_url, parent=photo_link)
+                image_queue.put((photo_link, img_url, j+1, len(image_urls)))
+            fetch_stats.record(busy_time, time.time() - start_time - busy_time)
+            pbar.update(1)
+    
+    def download_worker():
+        while True:
+            item = image_queue.get()
+            if item is None:
+                break
+            photo_link, img_url, index, total = item
+            start_time = time.time()
+            file_path = download_image(session, img_url, output_folder, index, total, pbar,
+                                       manifest, store, store_key(photo_link, index), link_fbid(photo_link))
+            download_stats.record(time.time() - start_time)
+            finish_image(photo_link, file_path)
+    
+    start_time = time.time()
+    fetchers = [threading.Thread(target=fetch_worker, daemon=True) for _ in range(PIPELINE_PAGE_WORKERS)]
+    downloaders = [threading.Thread(target=download_worker, daemon=True) for _ in range(PIPELINE_DOWNLOAD_WORKERS)]
+    for worker in fetchers + downloaders:
+        worker.start()
+    
+    for photo_link in photo_links:
+        link_queue.put(photo_link)
+    for _ in fetchers:
+        link_queue.put(None)
+    for worker in fetchers:
+        worker.join()
+    
+    for _ in downloaders:
+        image_queue.put(None)
+    for worker in downloaders:
+        worker.join()
+    
+    wall_time = time.time() - start_time
+    with pbar_lock:
+        pbar.write("\nPipeline stage throughput:")
+        pbar.write(fetch_stats.report(wall_time))
+        pbar.write(download_stats.report(wall_time))
+    
+    return summary
+
+# Asyncio engine: one event loop keeps many transfers in flight over pooled
+# keep-alive (HTTP/2 when h2 is installed) connections. Page fetches and CDN
+# downloads are limited separately so a burst of images never starves parsing.
+
+def pick_semaphore(url, semaphores):
+    """Return the concurrency limit that applies to the URL's host."""
+    return semaphores['cdn'] if is_cdn_url(url) else semaphores['page']
+
+async def async_process_facebook_link(client, url, semaphores, pbar):
+    """Async counterpart of process_facebook_link."""
+    try:
+        log(pbar, f"\nFetching post: {url}")
+        
+        start_time = time.perf_counter()
+        async with pick_semaphore(url, semaphores):
+            response = await async_http_get(client, url, follow_redirects=True)
+        response.raise_for_status()
+        metrics.observe('stage_seconds', time.perf_counter() - start_time, stage='fetch')
+        
+        # Check for login redirect
+        if '/login/' in str(response.url):
+            log(pbar, "⚠️ Redirected to login page. Authentication required.")
+            metrics.inc('login_redirects_total')
+            return []
+        
+        # Parse off the event loop so transfers keep flowing while BeautifulSoup runs
+        start_time = time.perf_counter()
+        image_urls = await asyncio.to_thread(extract_image_urls, response.text, pbar)
+        metrics.observe('stage_seconds', time.perf_counter() - start_time, stage='parse')
+        return image_urls
+    
+    except Exception as e:
+        log(pbar, f"Error processing URL {url}: {e}")
+        return []
+
+async def async_download_image(client, url, output_folder, index, total, semaphores, pbar,
+                               manifest=None, store=None, key=None, fbid=None):
+    """Async counterpart of download_image; writes the same file names."""
+    if image_already_done(manifest, url, pbar):
+        return None
+    stored_path = stored_image(store, key, url, pbar, manifest)
+    if stored_path:
+        return stored_path
+    
+    try:
+        filename = image_filename(url, index, fbid)
+        file_path = os.path.join(output_folder, filename)
+        
+        log(pbar, f"Downloading image {index}/{total}: {filename}")
+        
+        start_time = time.perf_counter()
+        async with pick_semaphore(url, semaphores):
+            img_response = await async_http_get(client, url, stream=True)
+            try:
+                img_response.raise_for_status()
+                
+                # Skip small images (e.g., icons) and banners from the header bytes alone
+                content_length = response_content_length(img_response.headers)
+                chunks = img_response.aiter_bytes(8192)
+                head = b''
+                if PROBE_IMAGES:
+                    async for chunk in chunks:
+                        head += chunk
+                        if len(head) >= PROBE_BYTES or parse_image_dimensions(head):
+                            break
+                skip_reason = image_skip_reason(head, content_length)
+                if skip_reason:
+                    log(pbar, skip_reason)
+                    record_skip(skip_reason)
+                    manifest_mark(manifest, 'image', url, SKIPPED, size=len(head))
+                    return None
+                
+                data = head + b''.join([chunk async for chunk in chunks])
+            finally:
+                await img_response.aclose()
+        download_time = time.perf_counter() - start_time
+        
+        start_time = time.perf_counter()
+        if store is not None:
+            file_path, _ = await asyncio.to_thread(store.save, key or url, [data], url, image_extension(url))
+        else:
+            await asyncio.to_thread(save_image_bytes, file_path, data)
+        
+        record_download(download_time, time.perf_counter() - start_time, len(data))
+        log(pbar, f"✓ Successfully downloaded: {filename}")
+        
+        manifest_mark(manifest, 'image', url, DONE, size=len(data), data=file_path)
+        if postprocessor is not None and store is None:
+            # submit() blocks while the pool is behind, so it runs off the event loop
+            await asyncio.to_thread(postprocessor.submit, file_path, data, url)
+        return file_path
+    
+    except Exception as e:
+        log(pbar, f"Error downloading image: {e}")
+        metrics.inc('images_total', result='failed')
+        manifest_mark(manifest, 'image', url, FAILED)
+        return None
+
+def save_image_bytes(file_path, data):
+    """Write a fully downloaded image to disk."""
+    with open(file_path, 'wb') as f:
+        f.write(data)
+
+async def async_process_photo_link(client, photo_link, output_folder, semaphores, pbar,
+                                   manifest=None, store=None, resolved=None):
+    """Async counterpart of process_photo_link; downloads a page's images concurrently."""
+    # Skip non-photo or download links
+    if not is_photo_link(photo_link):
+        log(pbar, f"Skipping non-photo link: {photo_link}")
+        return []
+    
+    # Each link is processed once, so its entry is dropped to keep memory flat on long streams
+    image_urls = resolved.pop(photo_link, None) if resolved else None
+    if not image_urls:
+        image_urls = await async_process_facebook_link(client, photo_link, semaphores, pbar)
+    if manifest is not None:
+        for img_url in image_urls:
+            manifest.register('image', img_url, parent=photo_link)
+    results = await asyncio.gather(*(
+        async_download_image(client, img_url, output_folder, j+1, len(image_urls), semaphores, pbar,
+                             manifest, store, store_key(photo_link, j+1), link_fbid(photo_link))
+        for j, img_url in enumerate(image_urls)
+    ))
+    record_photo_result(manifest, photo_link, image_urls)
+    return [file_path for file_path in results if file_path]
+
+async def run_async_engine(photo_links, output_folder, cookies, pbar, manifest=None, store=None, resolved=None,
+                           summary=None, session_manager=None):
+    """Process photo links on a single event loop with per-host concurrency limits."""
+    if httpx is None:
+        raise RuntimeError("The asyncio engine requires httpx (pip install httpx[http2])")
+    
+    summary = summary or DownloadSummary()
+    semaphores = {
+        'page': asyncio.Semaphore(PAGE_CONCURRENCY),
+        'cdn': asyncio.Semaphore(CDN_CONCURRENCY),
+    }
+    pool_size = PAGE_CONCURRENCY + CDN_CONCURRENCY
+    limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+    
+    # Connection is a hop-by-hop header and is not allowed over HTTP/2
+    headers = {k: v for k, v in DEFAULT_HEADERS.items() if k != 'Connection'}
+    cookie_jar = httpx.Cookies()
+    if (session_manager is None or not session_manager.is_valid()) and cookies.get('c_user') and cookies.get('xs'):
+        for cookie_name, cookie_value in cookies.items():
+            cookie_jar.set(cookie_name, cookie_value, domain='.facebook.com')
+    
+    async with httpx.AsyncClient(headers=headers, cookies=cookie_jar, http2=HTTP2_AVAILABLE,
+                                 limits=limits, timeout=30) as client:
+        if session_manager is not None and session_manager.is_valid():
+            # Shared login: the saved jar, refreshed on a /login/ redirect like the requests sessions
+            session_manager.apply_to_async_client(client)
+        loop = asyncio.get_running_loop()
+        # The workers hold MAX_IN_FLIGHT links; the queue only hands over the next one
+        link_queue = asyncio.Queue(maxsize=1)
+        no_more_links = object()
+        
+        # A followed link stream sleeps while it waits for new lines and album resolution makes
+        # blocking requests, so links are read in a thread and handed to the loop through the queue
+        def read_links():
+            put = lambda item: asyncio.run_coroutine_threadsafe(link_queue.put(item), loop).result()
+            try:
+                for photo_link in photo_links:
+                    put(photo_link)
+            except Exception as e:
+                log(pbar, f"Error reading photo links: {e}")
+            finally:
+                for _ in range(MAX_IN_FLIGHT):
+                    put(no_more_links)
+        
+        # MAX_IN_FLIGHT workers take links from the queue, so only that many links (plus the one
+        # waiting in the queue) are pending at once, however slowly the reader produces them
+        async def worker():
+            while True:
+                photo_link = await link_queue.get()
+                if photo_link is no_more_links:
+                    return
+                try:
+                    summary.add(await async_process_photo_link(client, photo_link, output_folder, semaphores, pbar,
+                                                               manifest, store, resolved))
+                except Exception as e:
+                    log(pbar, f"Error processing photo link: {e}")
+                finally:
+                    pbar.update(1)
+        
+        await asyncio.gather(asyncio.to_thread(read_links), *(worker() for _ in range(MAX_IN_FLIGHT)))
+    
+    return summary
+
+def compare_download_engines(photo_links, output_folder, cookies):
+    """Run each download engine on the same links and print their throughput."""
+    global rate_controller
+    results = {}
+    for engine in ("threads", "pipeline", "asyncio"):
+        # Each engine starts from the full limits, not the ones the previous engine left behind
+        rate_controller = new_rate_controller()
+        engine_folder = os.path.join(output_folder, f"compare_{engine}")
+        os.makedirs(engine_folder, exist_ok=True)
+        
+        start_time = time.time()
+        with tqdm(total=len(photo_links), desc=f"Engine: {engine}") as pbar:
+            if engine == "threads":
+                summary = run_thread_engine(new_session(cookies), photo_links, engine_folder, pbar)
+            elif engine == "pipeline":
+                summary = run_pipeline_engine(new_session(cookies), photo_links, engine_folder, pbar)
+            else:
+                summary = asyncio.run(run_async_engine(photo_links, engine_folder, cookies, pbar))
+        elapsed = max(time.time() - start_time, 1e-9)
+        
+        results[engine] = (summary.images, summary.bytes, elapsed)
+    
+    print(f"\n{'='*80}")
+    print("ENGINE COMPARISON")
+    print(f"{'='*80}")
+    for engine, (count, total_bytes, elapsed) in results.items():
+        print(f"{engine:>8}: {count} images, {total_bytes / 1e6:.1f} MB in {elapsed:.2f}s "
+              f"({count / elapsed:.1f} images/s, {total_bytes / 1e6 / elapsed:.2f} MB/s)")
+    
+    return results
+
+def collect_photo_links(post_url, links, counts, manifest=None):
+    """Return a post's photo links still to download, registering them in the manifest."""
+    photo_links = []
+    candidates = [photo_link for photo_link in links if is_photo_link(photo_link)]
+    if photo_index is not None:
+        # A shared photo is fetched once, under the link it was first seen with in any run
+        indexed = photo_index.add_post(post_url, candidates)
+        counts['shared'] += sum(not first for _, first in indexed)
+        candidates = [photo_link for photo_link, first in indexed if first]
+    for photo_link in candidates:
+        if manifest is not None and manifest.is_done('photo', photo_link):
+            counts['finished'] += 1
+            continue
+        if manifest is not None:
+            manifest.register('photo', photo_link, parent=post_url)
+        photo_links.append(photo_link)
+    counts['posts'] += 1
+    counts['photo_links'] += len(photo_links)
+    return photo_links
+
+def stream_photo_links(session, stream_path, pbar, counts, manifest=None, resolved=None, follow=False, shard=None):
+    """Yield photo links lazily from a link file, resolving each post's album as it arrives."""
+    for post_url, links in shard_links(iter_link_file(stream_path, follow, idle_timeout=STREAM_IDLE_TIMEOUT), shard):
+        photo_links = collect_photo_links(post_url, links, counts, manifest)
+        if not photo_links:
+            continue
+        if resolved is not None:
+            resolved.update(resolve_album(session, post_url, photo_links, pbar))
+        with pbar_lock:
+            pbar.total = counts['photo_links']
+            pbar.refresh()
+        yield from photo_links
+
 def main():
     """Main function to process JSON file and download images in parallel."""
     # User input
-    json_file_path = input("Enter the path to the JSON file: ")
+    json_file_path = input("Enter the path to the JSON or JSONL file: ")
     output_folder = input("Enter the output folder path: ")
     
+    follow = False
+    if os.path.exists(json_file_path) and is_link_stream(json_file_path) and DOWNLOAD_ENGINE != "compare":
+        follow = input("Keep reading new links while the extractor is still writing? (y/n): ").lower() == 'y'
+    run(json_file_path, output_folder, follow)
+
+def run(json_file_path, output_folder, follow=False, shard=None):
+    """Download every photo link of a link file into output_folder without prompting. Returns the DownloadSummary.
+    
+    With shard=(index, count), only that shard's posts are downloaded, into their own shard folder.
+    If the run stops on an error, the summary's error says why.
+    """
+    global postprocessor, photo_index, rate_controller
+    if shard is not None:
+        output_folder = os.path.join(output_folder, shard_name(*shard))
+    
     # Ensure output directory exists
     if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
+        # Shards sharing one output folder may create it at the same moment
+        os.makedirs(output_folder, exist_ok=True)
         print(f"Created output directory: {output_folder}")
     else:
         print(f"Using existing output directory: {output_folder}")
-
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.5',
-        'Referer': 'https://www.facebook.com/',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-        'Cache-Control': 'max-age=0',
-    }
     
-    session = requests.Session()
-    session.headers.update(headers)
+    rate_controller = new_rate_controller()
+    session_manager = SessionManager()
+    cookies = session_manager.as_dict()
+    session = new_session(cookies, session_manager)
     
-    if cookies['c_user'] and cookies['xs']:
-        print("Using provided authentication cookies")
-        for cookie_name, cookie_value in cookies.items():
-            session.cookies.set(cookie_name, cookie_value, domain='.facebook.com')
-    else:
-        print("⚠️ No authentication cookies provided. Facebook may require login.")
+    manifest = None
+    if USE_MANIFEST:
+        manifest_path = os.path.join(output_folder, MANIFEST_FILE)
+        manifest = JobManifest(manifest_path)
+        print(f"Recording progress in {manifest_path}")
     
-    try:
-        # Load JSON file
-        print(f"Loading JSON file: {json_file_path}")
-        with open(json_file_path, 'r') as f:
-            facebook_links = json.load(f)
+    store = None
+    if OUTPUT_MODE == "content":
+        store = ContentStore(os.path.join(output_folder, CONTENT_STORE_DIR))
+        print(f"Storing images by content digest in {store.root}")
+    elif OUTPUT_MODE == "pack":
+        store = PackStore(os.path.join(output_folder, PACK_STORE_DIR))
+        print(f"Appending images to pack files in {store.root}")
+        if manifest is not None:
+            forget_lost_pack_entries(manifest, store)
+    
+    if POSTPROCESS and store is None:
+        def postprocess_result(url, record):
+            metrics.observe('stage_seconds', record['seconds'], stage='postprocess')
+            if record.get('valid') is False:
+                # A truncated download is retried on the next run
+                print(f"❌ Invalid image (truncated download?): {record['file']}")
+                metrics.inc('images_invalid_total')
+                manifest_mark(manifest, 'image', url, FAILED)
+                if manifest is not None:
+                    # The photo link was already marked done; reopen it so the next run gets to the image
+                    photo_link = manifest.parent('image', url)
+                    if photo_link:
+                        manifest.mark('photo', photo_link, PENDING)
         
-        # Collect all valid photo links for parallel processing
-        all_photo_links = []
-        for post_url, photo_links in facebook_links.items():
-            for photo_link in photo_links:
-                if "pcb" in photo_link and "download" not in photo_link:
-                    all_photo_links.append(photo_link)
+        postprocessor = PostProcessor(on_result=postprocess_result)
+        print(f"Post-processing images ({', '.join(postprocessor.steps)}) in a process pool")
+    
+    if DEDUPLICATE_PHOTOS:
+        photo_index = PhotoIndex(os.path.join(output_folder, PHOTO_INDEX_FILE))
+    
+    # Counters only; saved paths are appended to FILE_LIST when it is set
+    summary = DownloadSummary(os.path.join(output_folder, FILE_LIST) if FILE_LIST else None, store)
+    
+    try:
+        # Load JSON file, or follow a JSONL link stream as the extractor writes it
+        streaming = is_link_stream(json_file_path) and DOWNLOAD_ENGINE != "compare"
+        print(f"{'Streaming' if streaming else 'Loading'} links from: {json_file_path}")
         
-        total_photo_links = len(all_photo_links)
-        all_downloaded_files = []
+        resolved = None
+        counts = {'posts': 0, 'photo_links': 0, 'finished': 0, 'shared': 0}
+        if streaming:
+            # Links are read, resolved and downloaded post by post; the total grows as the stream is read
+            total_photo_links = None
+            if ALBUM_MODE:
+                resolved = {}
+        else:
+            facebook_links = dict(shard_links(iter_link_file(json_file_path), shard))
+            
+            # Collect all valid photo links for parallel processing
+            all_photo_links = []
+            post_photo_links = {}
+            for post_url, photo_links in facebook_links.items():
+                photo_links = collect_photo_links(post_url, photo_links, counts, manifest)
+                all_photo_links.extend(photo_links)
+                if photo_links:
+                    post_photo_links[post_url] = photo_links
+            
+            total_photo_links = len(all_photo_links)
+            if counts['finished']:
+                print(f"Skipping {counts['finished']} photo links completed in a previous run")
+            
+            if ALBUM_MODE and post_photo_links:
+                with tqdm(total=len(post_photo_links), desc="Resolving albums") as pbar:
+                    resolved = resolve_albums(session, post_photo_links, pbar)
+                print(f"Resolved {len(resolved)}/{total_photo_links} photo links from embedded album JSON")
+            
+            if DOWNLOAD_ENGINE == "compare":
+                compare_download_engines(all_photo_links, output_folder, cookies)
+                return summary
         
         # Process photo links in parallel
         with tqdm(total=total_photo_links, desc="Processing photo links") as pbar:
-            with ThreadPoolExecutor(max_workers=5) as executor:  # Adjust max_workers as needed
-                future_to_photo_link = {
-                    executor.submit(process_photo_link, session, photo_link, output_folder, pbar): photo_link
-                    for photo_link in all_photo_links
-                }
-                
-                for future in as_completed(future_to_photo_link):
-                    try:
-                        downloaded_files = future.result()
-                        all_downloaded_files.extend(downloaded_files)
-                    except Exception as e:
-                        with pbar_lock:
-                            pbar.write(f"Error processing photo link: {e}")
-                    finally:
-                        pbar.update(1)
+            if streaming:
+                all_photo_links = stream_photo_links(session, json_file_path, pbar, counts, manifest, resolved, follow,
+                                                     shard)
+            if DOWNLOAD_ENGINE == "asyncio":
+                asyncio.run(run_async_engine(all_photo_links, output_folder, cookies, pbar, manifest, store, resolved, summary,
+                                             session_manager))
+            elif DOWNLOAD_ENGINE == "pipeline":
+                run_pipeline_engine(session, all_photo_links, output_folder, pbar, manifest, store, resolved, summary)
+            else:
+                run_thread_engine(session, all_photo_links, output_folder, pbar, manifest, store, resolved, summary)
         
         # Print summary
         print(f"\n{'='*80}")
         print(f"DOWNLOAD SUMMARY")
         print(f"{'='*80}")
-        print(f"Processed {len(facebook_links)} posts with {total_photo_links} photo links")
-        print(f"Successfully downloaded {len(all_downloaded_files)} images to {output_folder}")
+        if streaming and counts['finished']:
+            print(f"Skipped {counts['finished']} photo links completed in a previous run")
+        print(f"Processed {counts['posts']} posts with {counts['photo_links']} photo links")
+        if counts['shared']:
+            print(f"Skipped {counts['shared']} links to photos another post already had")
+        print(f"Successfully downloaded {summary.images} images ({summary.bytes / 1e6:.1f} MB) to {output_folder}")
+        if summary.empty_links:
+            print(f"{summary.empty_links} photo links produced no image")
         
-        if all_downloaded_files:
-            print("\nDownloaded files:")
-            for file in all_downloaded_files:
-                print(f"- {file}")
-        else:
+        if not summary.images:
             print("\n❌ No images were downloaded.")
+        elif summary.file_list_path:
+            print(f"File list written to {summary.file_list_path}")
+        
+        if postprocessor is not None:
+            # Wait for the pool so the report and manifest include every image
+            postprocessor.close()
+            print(postprocessor.report())
+        
+        if ADAPTIVE_RATE_CONTROL:
+            print("\nRate control:")
+            for line in rate_controller.report():
+                print(f"  {line}")
+        
+        if not QUIET:
+            print("\nMetrics:")
+            for line in metrics.summary_lines():
+                print(f"  {line}")
+        if METRICS_REPORT:
+            report_path = os.path.join(output_folder, METRICS_REPORT)
+            metrics.write_report(report_path)
+            print(f"Run report written to {report_path}")
     
     except FileNotFoundError:
-        print(f"Error: JSON file '{json_file_path}' not found.")
+        summary.error = f"JSON file '{json_file_path}' not found."
+        print(f"Error: {summary.error}")
     except json.JSONDecodeError:
-        print(f"Error: '{json_file_path}' is not a valid JSON file.")
+        summary.error = f"'{json_file_path}' is not a valid JSON file."
+        print(f"Error: {summary.error}")
     except Exception as e:
+        summary.error = str(e) or type(e).__name__
         print(f"Error in main function: {e}")
+    finally:
+        if postprocessor is not None:
+            postprocessor.close()
+            postprocessor = None
+        if photo_index is not None:
+            photo_index.close()
+            photo_index = None
+        if manifest is not None:
+            manifest.close()
+        if store is not None:
+            store.close()
+        summary.close()
+    return summary
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,264 @@
+import json
+import os
+import sys
+import time
+import queue
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+from extractor_script import (DriverPool, TierStats, make_driver_factory, browser_login, extract_links_http,
+                              extract_with_stats, record_post_result, read_post_urls, browser_rate_controller,
+                              http_rate_controller, metrics, MANIFEST_FILE, USE_MANIFEST, HTTP_TIER_WORKERS)
+from job_manifest import JobManifest
+from http_client import build_session
+from session_manager import SessionManager
+
+# Configuration
+SERVICE_HOST = "127.0.0.1"  # Only accept jobs from this machine
+SERVICE_PORT = 8765
+SERVICE_WORKERS = 3  # Warm browsers kept open, one worker thread each
+SERVICE_HEADLESS = True
+SERVICE_HTTP_TIER = True  # Try a plain HTTP fetch before handing a post to a browser
+
+class ExtractionService:
+    """Long-running extractor that keeps its browsers, login and HTTP session warm between jobs.
+
+    Jobs are lists of post URLs. Their posts share one FIFO task queue that the
+    worker threads drain, and each post's result is handed back to the job that
+    submitted it as soon as it is done. Posts an earlier job already finished
+    are answered from the manifest.
+    """
+
+    def __init__(self, workers=SERVICE_WORKERS, headless=SERVICE_HEADLESS, use_http_tier=SERVICE_HTTP_TIER):
+        self.workers = workers
+        self.use_http_tier = use_http_tier
+
+        # Saved session, or one login from FB_EMAIL/FB_PASSWORD; never an interactive prompt
+        self.session_manager = SessionManager()
+        email = os.environ.get('FB_EMAIL')
+        password = os.environ.get('FB_PASSWORD')
+        if email and password:
+            self.session_manager.login_func = lambda: browser_login(email, password, headless)
+        try:
+            if not self.session_manager.ensure():
+                print("⚠️ No saved Facebook session. Some content may not be accessible.")
+        except Exception as e:
+            print(f"Login failed: {str(e)}")
+
+        self.http_session = build_session(self.session_manager.as_dict(), self.session_manager, HTTP_TIER_WORKERS,
+                                          http_rate_controller, metrics)
+        print(f"Starting {workers} browsers...")
+        self.pool = DriverPool(workers, make_driver_factory(headless, self.session_manager))
+        self.manifest = JobManifest(MANIFEST_FILE) if USE_MANIFEST else None
+
+        self.http_stats = TierStats("http")
+        self.browser_stats = TierStats("browser")
+        self.tasks = queue.Queue()
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.busy = 0
+        self.busy_seconds = 0.0
+        self.jobs = 0
+        self.posts_done = 0
+
+        self.threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, urls, expected_counts=None):
+        """Queue a job's posts. Returns a queue that receives one result dict per post."""
+        expected_counts = expected_counts or {}
+        results = queue.Queue()
+        with self.lock:
+            self.jobs += 1
+        for url in urls:
+            self.tasks.put((url, expected_counts.get(url, 1), results))
+        return results
+
+    def extract(self, url, expected_count=1):
+        """Extract one post, over plain HTTP if that finds enough links, otherwise in a warm browser."""
+        if self.use_http_tier:
+            start = time.time()
+            try:
+                links = extract_links_http(self.http_session, url)
+            except Exception as e:
+                print(f"HTTP fetch failed for {url}: {str(e)}")
+                links = []
+            self.http_stats.record(time.time() - start, len(links))
+            if links and len(links) >= expected_count:
+                return {'url': url, 'links': links, 'tier': 'http'}
+
+        with self.pool.checkout() as driver:
+            links = extract_with_stats(url, driver, self.session_manager.is_valid(), self.browser_stats,
+                                       self.session_manager)
+        return {'url': url, 'links': links, 'tier': 'browser'}
+
+    def finished_result(self, url):
+        """The saved result of a post an earlier job already finished, or None."""
+        if self.manifest is None or not self.manifest.is_done('post', url):
+            return None
+        return {'url': url, 'links': json.loads(self.manifest.data('post', url) or '[]'), 'tier': 'manifest'}
+
+    def _worker(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                break
+            url, expected_count, results = task
+            start = time.time()
+            with self.lock:
+                self.busy += 1
+            try:
+                result = self.finished_result(url) or self.extract(url, expected_count)
+            except Exception as e:
+                print(f"Error processing {url}: {str(e)}")
+                result = {'url': url, 'links': [], 'tier': None, 'error': str(e)}
+            finally:
+                with self.lock:
+                    self.busy -= 1
+                    self.busy_seconds += time.time() - start
+                    self.posts_done += 1
+            result['seconds'] = round(time.time() - start, 3)
+            if result['tier'] != 'manifest':
+                record_post_result(self.manifest, url, result['links'])
+            results.put(result)
+
+    def stats(self):
+        """Queue depth, worker utilization and tier latencies since the service started."""
+        with self.lock:
+            uptime = time.time() - self.started
+            return {
+                'queue_depth': self.tasks.qsize(),
+                'workers': self.workers,
+                'busy_workers': self.busy,
+                'utilization': round(self.busy_seconds / (uptime * self.workers), 3) if uptime else 0.0,
+                'jobs': self.jobs,
+                'posts_done': self.posts_done,
+                'browser_restarts': self.pool.restarts,
+                'uptime_seconds': round(uptime, 1),
+                'tiers': [self.http_stats.report(), self.browser_stats.report()],
+                'rate_control': {'http': http_rate_controller.metrics(), 'browser': browser_rate_controller.metrics()},
+            }
+
+    def close(self):
+        for _ in self.threads:
+            self.tasks.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.pool.close()
+        if self.manifest is not None:
+            self.manifest.close()
+
+def parse_job(body):
+    """(urls, expected_counts) of a job body. Raises ValueError if it is not {"urls": [...], "expected_counts": {...}}."""
+    job = json.loads(body or b'{}')
+    if not isinstance(job, dict):
+        raise ValueError("the job must be a JSON object")
+    urls = job.get('urls', [])
+    if not isinstance(urls, list):
+        raise ValueError("urls must be a list")
+    expected_counts = job.get('expected_counts')
+    if expected_counts is None:
+        expected_counts = {}
+    if not isinstance(expected_counts, dict) or not all(
+            isinstance(count, int) and not isinstance(count, bool) for count in expected_counts.values()):
+        raise ValueError("expected_counts must map post URLs to photo counts")
+    return [url for url in urls if isinstance(url, str) and url.startswith('http')], expected_counts
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """POST /jobs streams one JSON line per finished post; GET /stats returns the service stats, GET /metrics the run metrics as Prometheus text."""
+
+    service = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self.send_json(200, self.service.stats())
+        elif self.path == '/metrics':
+            body = metrics.to_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.path != '/jobs':
+            self.send_json(404, {'error': 'not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            urls, expected_counts = parse_job(self.rfile.read(length))
+        except ValueError as e:
+            self.send_json(400, {'error': f"invalid job: {e}"})
+            return
+
+        start = time.time()
+        results = self.service.submit(urls, expected_counts)
+
+        # No Content-Length: the stream ends when the connection closes after the summary line
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.end_headers()
+        images = 0
+        for _ in urls:
+            result = results.get()
+            images += len(result['links'])
+            self.wfile.write((json.dumps(result) + '\n').encode('utf-8'))
+            self.wfile.flush()
+        summary = {'done': True, 'posts': len(urls), 'images': images, 'seconds': round(time.time() - start, 3)}
+        self.wfile.write((json.dumps(summary) + '\n').encode('utf-8'))
+        self.close_connection = True
+
+def serve(host=SERVICE_HOST, port=SERVICE_PORT):
+    """Run the service until interrupted."""
+    service = ExtractionService()
+    ServiceHandler.service = service
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    print(f"Extraction service listening on http://{host}:{port} (POST /jobs, GET /stats, GET /metrics)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+    finally:
+        server.server_close()
+        service.close()
+
+def submit_job(urls, expected_counts=None, host=SERVICE_HOST, port=SERVICE_PORT):
+    """Send a job to a running service and yield its result lines as they arrive."""
+    response = requests.post(f"http://{host}:{port}/jobs", json={'urls': urls, 'expected_counts': expected_counts or {}},
+                             stream=True, timeout=None)
+    response.raise_for_status()
+    for line in response.iter_lines():
+        if line:
+            yield json.loads(line)
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "serve"
+    if command == "serve":
+        serve()
+    elif command == "submit" and len(sys.argv) > 2:
+        urls, expected_counts = read_post_urls(sys.argv[2])
+        for result in submit_job(urls, expected_counts):
+            print(json.dumps(result))
+    elif command == "stats":
+        print(json.dumps(requests.get(f"http://{SERVICE_HOST}:{SERVICE_PORT}/stats", timeout=10).json(), indent=2))
+    else:
+        print("Usage: python service_script.py [serve | submit <urls.txt> | stats]")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+SESSION_FILE = "fb_session.json"  # Saved cookie jar shared by the extractor and the scraper
+COOKIES_FILE = "cookies.json"  # Legacy {"c_user": ..., "xs": ...} file
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Referer': 'https://www.facebook.com/',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Cache-Control': 'max-age=0',
+}
+
+# Cookies that identify a logged-in session
+AUTH_COOKIES = ('c_user', 'xs')
+
+def load_cookies(cookies_file=COOKIES_FILE):
+    """Load Facebook cookies from a JSON file, falling back to environment variables."""
+    if os.path.exists(cookies_file):
+        try:
+            with open(cookies_file, 'r') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error reading {cookies_file}: {e}")
+    return {
+        'c_user': os.environ.get('FB_C_USER', ''),
+        'xs': os.environ.get('FB_XS', ''),
+    }
+
+class SessionManager:
+    """One Facebook login shared by every browser and HTTP session.
+
+    Cookies come from the saved jar (SESSION_FILE), the legacy cookies file or
+    environment variables, or from a single login through login_func. They are
+    saved with their expiry, injected into each new WebDriver and
+    requests.Session, and refreshed only when a /login/ redirect is seen.
+    """
+
+    def __init__(self, session_file=SESSION_FILE, login_func=None):
+        self.session_file = session_file
+        self.login_func = login_func
+        self.lock = threading.Lock()
+        self.cookies = []
+        self.generation = 0
+        self.load()
+
+    def load(self):
+        """Load the saved cookie jar, or the legacy cookies if there is none."""
+        if os.path.exists(self.session_file):
+            try:
+                with open(self.session_file, 'r') as f:
+                    self.cookies = json.load(f)
+                return
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Error reading {self.session_file}: {e}")
+        legacy = load_cookies()
+        self.cookies = [
+            {'name': name, 'value': value, 'domain': '.facebook.com', 'path': '/'}
+            for name, value in legacy.items() if value
+        ]
+
+    def save(self):
+        with open(self.session_file, 'w') as f:
+            json.dump(self.cookies, f, indent=2)
+
+    def is_valid(self):
+        """True if the auth cookies are present and not expired."""
+        now = time.time()
+        names = {
+            cookie['name'] for cookie in self.cookies
+            if cookie.get('value') and (not cookie.get('expiry') or cookie['expiry'] > now)
+        }
+        return all(name in names for name in AUTH_COOKIES)
+
+    def ensure(self):
+        """Log in once if there is no valid saved session. Returns True if the session is valid."""
+        if not self.is_valid() and self.login_func is not None:
+            self.refresh(self.generation)
+        return self.is_valid()
+
+    def refresh(self, seen_generation):
+        """Get fresh cookies, unless another thread already did since seen_generation."""
+        with self.lock:
+            if self.generation != seen_generation:
+                return
+            if self.login_func is not None:
+                print("Logging in to refresh the Facebook session...")
+                self.cookies = self.login_func()
+                self.save()
+            else:
+                # No way to log in here: pick up a jar another process may have refreshed
+                self.load()
+            self.generation += 1
+
+    def as_dict(self):
+        return {cookie['name']: cookie['value'] for cookie in self.cookies}
+
+    def apply_to_driver(self, driver):
+        """Inject the cookies into a WebDriver (it must be on a facebook.com page first)."""
+        if not self.cookies:
+            return
+        driver.get("https://www.facebook.com/")
+        # Drivers with page load strategy "none" return from get() before the page commits
+        deadline = time.time() + 10
+        while 'facebook.com' not in driver.current_url and time.time() < deadline:
+            time.sleep(0.1)
+        for cookie in self.cookies:
+            selenium_cookie = {key: cookie[key] for key in ('name', 'value', 'path', 'domain', 'secure', 'httpOnly', 'expiry', 'sameSite') if key in cookie}
+            try:
+                driver.add_cookie(selenium_cookie)
+            except Exception as e:
+                print(f"Could not set cookie {cookie['name']}: {e}")
+
+    def apply_to_session(self, session):
+        """Inject the cookies into a requests.Session and refresh them on /login/ redirects."""
+        for cookie in self.cookies:
+            session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain', '.facebook.com'),
+                                path=cookie.get('path', '/'), expires=cookie.get('expiry'))
+        if not getattr(session, 'login_refresh_hook', None):
+            session.login_refresh_hook = self.make_response_hook(session)
+            session.hooks['response'].append(session.login_refresh_hook)
+            session.prepare_request = self.tag_generation(session.prepare_request)
+
+    def apply_to_async_client(self, client):
+        """Inject the cookies into an httpx.AsyncClient; async_http_get refreshes them on /login/ redirects."""
+        for cookie in self.cookies:
+            client.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain', '.facebook.com'),
+                               path=cookie.get('path', '/'))
+        client.session_manager = self
+        client.session_generation = self.generation
+
+    async def refresh_async_client(self, client, seen_generation):
+        """Refresh after a request sent with seen_generation hit /login/. Returns True if the client has valid cookies to retry with."""
+        # Logging in can drive a browser, so it runs off the event loop
+        await asyncio.to_thread(self.refresh, seen_generation)
+        if not self.is_valid():
+            return False
+        if client.session_generation != self.generation:
+            self.apply_to_async_client(client)
+        return True
+
+    def tag_generation(self, prepare_request):
+        """Wrap Session.prepare_request to record which cookie generation each request is sent with."""
+        def prepare(request):
+            prepared = prepare_request(request)
+            prepared.session_generation = self.generation
+            return prepared
+        return prepare
+
+    def make_response_hook(self, session):
+        """Build a requests response hook that refreshes the session and retries once on a login redirect."""
+        local = threading.local()
+
+        def hook(response, *args, **kwargs):
+            location = response.headers.get('Location', '')
+            if not response.is_redirect or '/login' not in location or getattr(local, 'retrying', False):
+                return None
+            # A late redirect for a request sent before another thread's refresh must not log in again
+            # Redirect hops are copies without the tag, so the first request that has it counts
+            tagged = [r.request for r in response.history + [response] if hasattr(r.request, 'session_generation')]
+            self.refresh(tagged[0].session_generation if tagged else self.generation)
+            if not self.is_valid():
+                return None
+            self.apply_to_session(session)
+
+            # Resend the original request with the fresh cookies
+            request = response.request.copy()
+            request.headers.pop('Cookie', None)
+            request.prepare_cookies(session.cookies)
+            local.retrying = True
+            try:
+                return session.send(request, **kwargs)
+            finally:
+                local.retrying = False
+
+        return hook
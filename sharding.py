@@ -0,0 +1,204 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+from job_manifest import SCHEMA, PENDING, FAILED, SKIPPED, DONE
+
+# Configuration
+DEFAULT_SHARDS = os.cpu_count() or 1
+EXTRACT_BROWSERS = 2  # Browsers per extractor shard
+MERGED_LINKS_FILE = "image_urls.json"  # Written by merge-extract in the output folder
+
+# Better states win when the same key was handled by more than one shard
+STATE_RANK = {PENDING: 0, FAILED: 1, SKIPPED: 2, DONE: 3}
+
+def shard_of(key, shards):
+    """Stable shard index of a key, the same on every machine and run (unlike hash())."""
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % shards
+
+def shard_name(index, shards):
+    return f"shard-{index:03d}-of-{shards:03d}"
+
+def shard_links(items, shard=None):
+    """Yield the (post URL, links) pairs that belong to shard=(index, count); all of them when shard is None."""
+    for post_url, links in items:
+        if shard is None or shard_of(post_url, shard[1]) == shard[0]:
+            yield post_url, links
+
+def parse_shard_indexes(text, shards):
+    """Parse "3", "0,2,5" or "0-3" into shard indexes below shards."""
+    indexes = []
+    for part in text.split(','):
+        first, _, last = part.strip().partition('-')
+        indexes.extend(range(int(first), int(last or first) + 1))
+    for index in indexes:
+        if not 0 <= index < shards:
+            raise ValueError(f"shard {index} is not between 0 and {shards - 1}")
+    return sorted(set(indexes))
+
+def shard_manifests(output_folder, manifest_file):
+    """Manifest paths of every shard folder under output_folder."""
+    return sorted(glob.glob(os.path.join(output_folder, "shard-*-of-*", manifest_file)))
+
+def merge_manifests(paths, merged_path):
+    """Combine shard manifests into one, keeping the best state of every (kind, key). Returns the number of rows."""
+    def rank(column):
+        return "CASE " + column + " " + " ".join(f"WHEN '{state}' THEN {value}" for state, value in STATE_RANK.items()) + " ELSE 0 END"
+
+    conn = sqlite3.connect(merged_path)
+    try:
+        conn.execute(SCHEMA)
+        for path in paths:
+            conn.execute("ATTACH DATABASE ? AS shard", (path,))
+            with conn:
+                # "WHERE true" lets SQLite parse the upsert after INSERT ... SELECT
+                conn.execute(
+                    "INSERT INTO jobs (kind, key, parent, state, bytes, data, updated) "
+                    "SELECT kind, key, parent, state, bytes, data, updated FROM shard.jobs WHERE true "
+                    "ON CONFLICT (kind, key) DO UPDATE SET parent = COALESCE(jobs.parent, excluded.parent), "
+                    "state = excluded.state, bytes = excluded.bytes, data = excluded.data, updated = excluded.updated "
+                    f"WHERE {rank('excluded.state')} > {rank('jobs.state')} "
+                    f"OR ({rank('excluded.state')} = {rank('jobs.state')} AND excluded.updated > jobs.updated)"
+                )
+            conn.execute("DETACH DATABASE shard")
+        return conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+    finally:
+        conn.close()
+
+def print_manifest_summary(path):
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute("SELECT kind, state, COUNT(*), SUM(bytes) FROM jobs GROUP BY kind, state ORDER BY kind, state")
+        for kind, state, count, total_bytes in rows:
+            print(f"  {kind:>6} {state:>8}: {count} ({(total_bytes or 0) / 1e6:.1f} MB)")
+    finally:
+        conn.close()
+
+def merge_scrape(output_folder):
+    """Merge the scraper shards' manifests into output_folder/scraper_manifest.sqlite."""
+    import scraper_script
+    paths = shard_manifests(output_folder, scraper_script.MANIFEST_FILE)
+    if not paths:
+        print(f"No shard manifests found in {output_folder}")
+        return None
+    merged_path = os.path.join(output_folder, scraper_script.MANIFEST_FILE)
+    rows = merge_manifests(paths, merged_path)
+    print(f"Merged {len(paths)} shard manifests ({rows} unique items) into {merged_path}")
+    print_manifest_summary(merged_path)
+    return merged_path
+
+def merge_extract(output_folder):
+    """Merge the extractor shards' manifests and write every post's links to one JSON file for the scraper."""
+    import extractor_script
+    paths = shard_manifests(output_folder, extractor_script.MANIFEST_FILE)
+    if not paths:
+        print(f"No shard manifests found in {output_folder}")
+        return None
+    merged_path = os.path.join(output_folder, extractor_script.MANIFEST_FILE)
+    rows = merge_manifests(paths, merged_path)
+    print(f"Merged {len(paths)} shard manifests ({rows} unique posts) into {merged_path}")
+
+    conn = sqlite3.connect(merged_path)
+    try:
+        results = {key: json.loads(data) if data else []
+                   for key, data in conn.execute("SELECT key, data FROM jobs WHERE kind = 'post' ORDER BY key")}
+    finally:
+        conn.close()
+    links_path = os.path.join(output_folder, MERGED_LINKS_FILE)
+    with open(links_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved {sum(len(links) for links in results.values())} URLs from {len(results)} posts to {links_path}")
+    return links_path
+
+def run_shard(command, input_path, output_folder, index, shards, browsers=EXTRACT_BROWSERS, http_tier=True):
+    """Run one shard in this process. Returns False if it stopped on an error."""
+    if command == "scrape":
+        import scraper_script
+        scraper_script.QUIET = True
+        summary = scraper_script.run(input_path, output_folder, shard=(index, shards))
+        if summary.error:
+            print(f"❌ Shard {index}/{shards} stopped: {summary.error}")
+            return False
+    else:
+        import extractor_script
+        extractor_script.QUIET = True
+        post_urls, expected_counts = extractor_script.read_post_urls(input_path)
+        post_urls = [url for url in post_urls if shard_of(url, shards) == index]
+        print(f"Shard {index}/{shards}: {len(post_urls)} posts")
+        extractor_script.run_extraction(post_urls, expected_counts, headless=True, parallel=True,
+                                        max_workers=browsers, use_http_tier=http_tier,
+                                        output_dir=os.path.join(output_folder, shard_name(index, shards)))
+    return True
+
+def launch_shards(args, indexes):
+    """Run each shard in its own process, logging to <shard>.log in the output folder. Returns the failed indexes."""
+    os.makedirs(args.output_folder, exist_ok=True)
+    processes = []
+    for index in indexes:
+        log_path = os.path.join(args.output_folder, shard_name(index, args.shards) + ".log")
+        command = [sys.executable, os.path.abspath(__file__), args.command, args.input, args.output_folder,
+                   "--shards", str(args.shards), "--shard", str(index), "--browsers", str(args.browsers)]
+        if not args.http_tier:
+            command.append("--no-http-tier")
+        with open(log_path, 'w') as log_file:
+            processes.append((index, subprocess.Popen(command, stdout=log_file, stderr=subprocess.STDOUT)))
+        print(f"Started shard {index}/{args.shards} (log: {log_path})")
+
+    failed = []
+    for index, process in processes:
+        if process.wait() != 0:
+            failed.append(index)
+            print(f"❌ Shard {index} exited with code {process.returncode}")
+        else:
+            print(f"✓ Shard {index} finished")
+    return failed
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Split a run into shards by a stable hash of the post URL and merge the shard results")
+    parser.add_argument("command", choices=["extract", "scrape", "merge-extract", "merge-scrape"])
+    parser.add_argument("input", help="Post URL list (extract), link JSON/JSONL (scrape) or output folder (merge)")
+    parser.add_argument("output_folder", nargs="?")
+    parser.add_argument("--shards", type=int, default=DEFAULT_SHARDS, help="Total number of shards across all nodes")
+    parser.add_argument("--shard", help="Shard indexes to run here, e.g. 3, 0,2 or 0-3 (default: all)")
+    parser.add_argument("--browsers", type=int, default=EXTRACT_BROWSERS, help="Browsers per extractor shard")
+    parser.add_argument("--no-http-tier", dest="http_tier", action="store_false")
+    args = parser.parse_args()
+
+    if args.command == "merge-extract":
+        merge_extract(args.input)
+        return
+    if args.command == "merge-scrape":
+        merge_scrape(args.input)
+        return
+    if not args.output_folder:
+        parser.error("an output folder is required")
+
+    indexes = parse_shard_indexes(args.shard, args.shards) if args.shard else list(range(args.shards))
+    if len(indexes) == 1:
+        # A non-zero exit keeps launch_shards and merge from treating a partial shard as finished
+        if not run_shard(args.command, args.input, args.output_folder, indexes[0], args.shards, args.browsers,
+                         args.http_tier):
+            sys.exit(1)
+        return
+
+    failed = launch_shards(args, indexes)
+    if failed:
+        sys.exit(1)
+    # Shards run on other nodes are merged once they have finished too
+    if len(indexes) == args.shards:
+        if args.command == "scrape":
+            merge_scrape(args.output_folder)
+        else:
+            merge_extract(args.output_folder)
+    else:
+        print(f"Run '{os.path.basename(__file__)} merge-{args.command} {args.output_folder}' once every shard is done")
+
+if __name__ == "__main__":
+    main()
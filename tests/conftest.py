@@ -0,0 +1,29 @@
+"""Shared fixtures: the scraper modules on sys.path and the local mock site from benchmarks/."""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import scraper_script
+from mock_facebook import MockConfig, start_server
+
+@pytest.fixture
+def mock_site():
+    """Mock facebook.com and CDN with fast, error-free responses and 4 photos per post."""
+    server = start_server(MockConfig(latency=0.002, photos_per_post=4))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def scraper(monkeypatch):
+    """scraper_script with per-image logging off; settings changed by a test are restored after it."""
+    monkeypatch.setattr(scraper_script, "QUIET", True)
+    monkeypatch.setattr(scraper_script, "DOWNLOAD_ENGINE", "threads")
+    monkeypatch.setattr(scraper_script, "OUTPUT_MODE", "files")
+    monkeypatch.setattr(scraper_script, "POSTPROCESS", False)
+    return scraper_script
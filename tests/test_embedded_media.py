@@ -0,0 +1,28 @@
+"""Unit tests for reading photo nodes from embedded page JSON and captured GraphQL responses."""
+import json
+
+from embedded_media import extract_embedded_media, extract_media_from_documents, iter_json_lines
+
+def cdn(name, width):
+    return {'uri': f"https://scontent.example/{name}.jpg", 'width': width, 'height': width * 3 // 4}
+
+POST_DATA = {'data': {'node': {
+    'actor': {'id': "100", 'profile_picture': {'id': "101", 'image': cdn('avatar', 160)}},
+    'cover_photo': {'__typename': 'Photo', 'id': "102", 'image': cdn('cover', 960)},
+    'attachments': [{'media': {'__typename': 'Photo', 'id': "1", 'image': cdn('p1-small', 960),
+                               'viewer_image': cdn('p1', 2048)}},
+                    {'media': {'id': "2", 'viewer_image': cdn('p2', 1440)}},
+                    {'media': {'__typename': 'Video', 'id': "3", 'image': cdn('thumb', 960)}}],
+    # An untyped node with only a plain image is a profile picture or cover, wherever it sits
+    'related': [{'id': "104", 'image': cdn('page-logo', 200)}],
+}}}
+
+def test_photo_nodes_from_embedded_json():
+    html = '<script type="application/json">' + json.dumps(POST_DATA) + '</script>'
+    media = extract_embedded_media(html)
+    assert list(media) == ["1", "2"]
+    assert media["1"] == {'url': "https://scontent.example/p1.jpg", 'width': 2048, 'height': 1536}
+
+def test_network_capture_path_uses_the_same_checks():
+    body = "for (;;);" + json.dumps(POST_DATA) + "\n" + json.dumps({'data': {'id': "5", 'image': cdn('banner', 960)}})
+    assert list(extract_media_from_documents(iter_json_lines(body))) == ["1", "2"]
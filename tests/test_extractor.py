@@ -0,0 +1,15 @@
+"""Unit tests for the extractor's browser wait accounting (no browsers started)."""
+import extractor_script
+from run_metrics import RunMetrics
+
+def test_waits_are_recorded_in_the_bounded_histogram(monkeypatch):
+    monkeypatch.setattr(extractor_script, "metrics", RunMetrics())
+    for _ in range(1000):
+        assert extractor_script.timed_wait(object(), 'page_ready', lambda driver: "ready", timeout=1) == "ready"
+    assert extractor_script.timed_wait(object(), 'page_ready', lambda driver: False, timeout=0.05) is None
+
+    _, histograms = extractor_script.metrics.snapshot()
+    assert [count for _, _, count in histograms.values()] == [1001]
+    [line] = extractor_script.wait_report()
+    assert line.strip().startswith("page_ready: 1001 waits")
+    assert line.endswith("1 timeouts")
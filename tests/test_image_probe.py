@@ -0,0 +1,36 @@
+"""Unit tests for reading image dimensions from the first bytes of a download."""
+import io
+
+import pytest
+
+from scraper_script import parse_image_dimensions
+
+Image = pytest.importorskip("PIL.Image")
+
+def encode(size, fmt, mode="RGB", **options):
+    buffer = io.BytesIO()
+    Image.new(mode, size, (200, 30, 30, 128)[:len(mode)]).save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+@pytest.mark.parametrize("fmt, mode, options", [
+    ("JPEG", "RGB", {}),
+    ("JPEG", "RGB", {'progressive': True, 'exif': b'Exif\x00\x00' + b'\x00' * 2000}),
+    ("PNG", "RGB", {}),
+    ("GIF", "P", {}),
+    ("WEBP", "RGB", {}),
+    ("WEBP", "RGB", {'lossless': True}),
+    ("WEBP", "RGBA", {'exif': b'Exif\x00\x00metadata'}),
+])
+def test_dimensions_of_each_format(fmt, mode, options):
+    data = encode((1031, 517), fmt, mode, **options)
+    assert parse_image_dimensions(data) == (1031, 517)
+    # The header is enough; the scraper only reads the first chunks
+    assert parse_image_dimensions(data[:4096]) == (1031, 517)
+
+def test_unparseable_heads():
+    jpeg = encode((640, 480), "JPEG", exif=b'Exif\x00\x00' + b'\x00' * 2000)
+    # Cut off before the frame header
+    assert parse_image_dimensions(jpeg[:1000]) is None
+    assert parse_image_dimensions(b'') is None
+    assert parse_image_dimensions(b'<html>not an image</html>') is None
+    assert parse_image_dimensions(b'\x89PNG\r\n\x1a\n\x00\x00') is None
@@ -0,0 +1,55 @@
+"""Unit tests for the JSONL link stream: tailing a file that is still being written."""
+import json
+import threading
+import time
+
+from link_stream import LinkStreamWriter, is_link_stream, iter_link_file, iter_link_stream
+
+def test_follow_waits_for_partial_lines_and_stops_at_the_end_record(tmp_path):
+    path = tmp_path / "links.jsonl"
+    path.write_text('')
+    received = []
+    reader = threading.Thread(target=lambda: received.extend(iter_link_stream(str(path), follow=True, poll_interval=0.01,
+                                                                              idle_timeout=5)))
+    reader.start()
+
+    with open(path, 'a', encoding='utf-8') as f:
+        line = json.dumps({'post': "https://www.facebook.com/posts/1", 'links': ["a", "b"]}) + '\n'
+        # The writer is caught halfway through a line
+        f.write(line[:20])
+        f.flush()
+        time.sleep(0.1)
+        assert received == []
+        f.write(line[20:])
+        f.write('{"post": broken}\n')
+        f.flush()
+        time.sleep(0.1)
+        assert received == [("https://www.facebook.com/posts/1", ["a", "b"])]
+        f.write(json.dumps({'post': "https://www.facebook.com/posts/2", 'links': []}) + '\n{"end": true}\n')
+    reader.join(5)
+
+    assert not reader.is_alive()
+    assert received == [("https://www.facebook.com/posts/1", ["a", "b"]), ("https://www.facebook.com/posts/2", [])]
+
+def test_follow_stops_after_idle_timeout(tmp_path):
+    path = tmp_path / "links.jsonl"
+    path.write_text(json.dumps({'post': "p1", 'links': ["a"]}) + '\n')
+    start = time.time()
+    assert list(iter_link_stream(str(path), follow=True, poll_interval=0.01, idle_timeout=0.1)) == [("p1", ["a"])]
+    assert time.time() - start < 2
+
+def test_read_without_follow_keeps_a_final_line_without_newline(tmp_path):
+    path = tmp_path / "links.jsonl"
+    path.write_text(json.dumps({'post': "p1", 'links': ["a"]}) + '\n' + json.dumps({'post': "p2", 'links': ["b"]}))
+    assert list(iter_link_stream(str(path))) == [("p1", ["a"]), ("p2", ["b"])]
+
+def test_writer_output_and_legacy_files_are_told_apart(tmp_path):
+    stream = tmp_path / "links.txt"
+    with LinkStreamWriter(str(stream)) as writer:
+        writer.write("p1", ["a"])
+    legacy = tmp_path / "links.json"
+    legacy.write_text(json.dumps({"p1": ["a"], "p2": ["b"]}, indent=2))
+
+    assert is_link_stream(str(stream)) and not is_link_stream(str(legacy))
+    assert list(iter_link_file(str(stream), follow=True, poll_interval=0.01)) == [("p1", ["a"])]
+    assert list(iter_link_file(str(legacy))) == [("p1", ["a"]), ("p2", ["b"])]
@@ -0,0 +1,58 @@
+"""Unit tests for PackStore: crash recovery truncates uncommitted bytes and reads check the CRC."""
+import os
+
+import pytest
+
+from pack_store import PackStore
+
+def pack_path(store):
+    return os.path.join(store.root, store.pack_names()[-1])
+
+def test_recover_truncates_uncommitted_bytes(tmp_path):
+    with PackStore(str(tmp_path)) as store:
+        location, size = store.save("1/1", [b'first', b' image'], url="https://scontent.example/1.jpg")
+        assert size == 11
+        path = pack_path(store)
+    committed = os.path.getsize(path)
+    # A crash in the middle of an append leaves a partial entry past the last indexed one
+    with open(path, 'ab') as f:
+        f.write(b'FBPK\x03\x00partial')
+
+    with PackStore(str(tmp_path)) as store:
+        assert os.path.getsize(path) == committed
+        assert store.keys() == ["1/1"]
+        assert store.read(1) == b'first image'
+        assert store.lookup("2/1", url="https://scontent.example/1.jpg") == location
+        second, _ = store.save("3/1", [b'third'])
+        assert second == f"{path}:{committed}"
+    with PackStore(str(tmp_path)) as store:
+        assert store.read(3) == b'third'
+        assert store.read(2) == b'first image'
+
+def test_entries_lost_in_a_crash_are_reported_missing(tmp_path):
+    store = PackStore(str(tmp_path))
+    store.save("1/1", [b'one'])
+    store.flush()
+    location, _ = store.save("2/1", [b'two'])
+    # Simulate a crash: the second entry never reaches the index
+    store.pending = []
+    store.file.close()
+    store.file = None
+    store.conn.close()
+
+    with PackStore(str(tmp_path)) as reopened:
+        assert reopened.keys() == ["1/1"]
+        assert reopened.is_missing(location)
+        assert not reopened.is_missing(reopened.lookup("1/1"))
+
+def test_read_detects_corrupt_entries(tmp_path):
+    with PackStore(str(tmp_path)) as store:
+        store.save("1/1", [b'image bytes'])
+        path = pack_path(store)
+    with open(path, 'r+b') as f:
+        f.seek(-1, os.SEEK_END)
+        f.write(b'X')
+
+    with PackStore(str(tmp_path)) as store:
+        with pytest.raises(ValueError, match="Corrupt pack entry"):
+            store.read(1)
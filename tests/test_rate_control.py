@@ -0,0 +1,181 @@
+"""Unit tests for rate_control: AIMD limits, Retry-After, the retry budget and the retry loop."""
+import asyncio
+import threading
+import time
+from email.utils import formatdate
+
+import pytest
+
+import rate_control
+from rate_control import HostLimiter, RateController, RetryBudget, retry_after_seconds
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.closed = False
+
+    def iter_content(self, chunk_size=1):
+        yield b'body'
+
+    def close(self):
+        self.closed = True
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(rate_control, "BACKOFF_BASE", 0.0)
+
+def test_limit_halves_on_failure_and_grows_additively():
+    limiter = HostLimiter("example.com", max_limit=4)
+    limiter.acquire()
+    limiter.release('throttled')
+    assert limiter.limit == 2
+    limiter.acquire()
+    limiter.release('error')
+    assert limiter.limit == 1
+    limiter.acquire()
+    limiter.release('error')
+    assert limiter.limit == 1
+
+    for _ in range(3):
+        limiter.acquire()
+        limiter.release('success')
+    assert limiter.limit == pytest.approx(1 + 1 + 1 / 2 + 1 / 2.5)
+    for _ in range(50):
+        limiter.acquire()
+        limiter.release('success')
+    assert limiter.limit == 4
+    assert limiter.in_flight == 0
+
+def test_acquire_blocks_at_the_limit_until_a_release():
+    limiter = HostLimiter("example.com", max_limit=1)
+    limiter.acquire()
+    acquired = threading.Event()
+
+    def second():
+        limiter.acquire()
+        acquired.set()
+
+    threading.Thread(target=second, daemon=True).start()
+    assert not acquired.wait(0.1)
+    limiter.release('success')
+    assert acquired.wait(1)
+
+def test_retry_after_pauses_the_host():
+    limiter = HostLimiter("example.com", max_limit=5)
+    limiter.acquire()
+    limiter.release('throttled', retry_after=0.3)
+    start = time.time()
+    limiter.acquire()
+    assert time.time() - start >= 0.25
+
+def test_retry_after_header_values():
+    assert retry_after_seconds({'Retry-After': '7'}) == 7
+    assert retry_after_seconds({'Retry-After': '-3'}) == 0
+    assert retry_after_seconds({'Retry-After': '99999'}) == rate_control.MAX_RETRY_AFTER
+    assert retry_after_seconds({'Retry-After': formatdate(time.time() + 60, usegmt=True)}) == pytest.approx(60, abs=2)
+    assert retry_after_seconds({'Retry-After': 'soon'}) is None
+    assert retry_after_seconds({}) is None
+
+def test_retry_budget_caps_retries_to_a_share_of_first_attempts():
+    budget = RetryBudget(ratio=0.5, minimum=2, maximum=3)
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+    for _ in range(20):
+        budget.deposit()
+    assert budget.snapshot() == {'tokens': 3, 'retries_granted': 3, 'retries_denied': 2}
+
+def test_call_retries_throttled_responses_and_closes_them():
+    responses = [FakeResponse(429, {'Retry-After': '0'}), FakeResponse(503), FakeResponse(200)]
+    sent = []
+    controller = RateController(default_max_limit=4)
+
+    def send():
+        sent.append(responses[len(sent)])
+        return sent[-1]
+
+    assert controller.call("http://example.com/a", send).status_code == 200
+    assert [response.closed for response in sent] == [True, True, False]
+    assert controller.limiter("example.com").snapshot()['retries'] == 2
+
+def test_call_returns_the_last_response_when_attempts_run_out():
+    controller = RateController(default_max_limit=4, max_attempts=2)
+    response = controller.call("http://example.com/a", lambda: FakeResponse(500))
+    assert response.status_code == 500
+    assert controller.limiter("example.com").in_flight == 0
+
+def test_call_raises_the_last_error_when_the_budget_is_spent():
+    controller = RateController(default_max_limit=4)
+    controller.budget = RetryBudget(minimum=0)
+    calls = []
+
+    def send():
+        calls.append(1)
+        raise ConnectionError("refused")
+
+    with pytest.raises(ConnectionError):
+        controller.call("http://example.com/a", send)
+    assert len(calls) == 1
+
+def test_streamed_response_keeps_its_slot_until_read():
+    controller = RateController(default_max_limit=4)
+    response = controller.call("http://example.com/a", lambda: FakeResponse(200), stream=True)
+    limiter = controller.limiter("example.com")
+    assert limiter.in_flight == 1
+    assert b''.join(response.iter_content()) == b'body'
+    assert limiter.in_flight == 0
+    response.close()
+    assert limiter.in_flight == 0
+
+def test_waiting_coroutines_get_slots_in_arrival_order():
+    async def scenario():
+        limiter = HostLimiter("example.com", max_limit=1)
+        await limiter.async_acquire()
+        order = []
+
+        async def waiter(name):
+            await limiter.async_acquire()
+            order.append(name)
+            await asyncio.sleep(0.01)
+            limiter.release('success')
+
+        tasks = []
+        for name in "abc":
+            tasks.append(asyncio.create_task(waiter(name)))
+            await asyncio.sleep(0.01)
+        assert limiter.snapshot()['waiting'] == 3
+        limiter.release('success')
+        await asyncio.gather(*tasks)
+        return order, limiter.in_flight
+
+    assert asyncio.run(scenario()) == (list("abc"), 0)
+
+def test_cancelled_waiter_passes_its_slot_on():
+    async def scenario():
+        limiter = HostLimiter("example.com", max_limit=1)
+        await limiter.async_acquire()
+        cancelled = asyncio.create_task(limiter.async_acquire())
+        waiting = asyncio.create_task(limiter.async_acquire())
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        limiter.release('success')
+        await asyncio.wait_for(waiting, 1)
+        limiter.release('success')
+        return limiter.in_flight, limiter.snapshot()['waiting']
+
+    assert asyncio.run(scenario()) == (0, 0)
+
+def test_paused_waiters_are_woken_when_the_pause_ends():
+    async def scenario():
+        limiter = HostLimiter("example.com", max_limit=2)
+        await limiter.async_acquire()
+        limiter.release('throttled', retry_after=0.2)
+        start = time.time()
+        await asyncio.wait_for(limiter.async_acquire(), 2)
+        return time.time() - start
+
+    assert asyncio.run(scenario()) >= 0.15
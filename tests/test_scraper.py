@@ -0,0 +1,97 @@
+"""End-to-end tests of scraper_script.run against the local mock site."""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from link_stream import LinkStreamWriter
+from pack_store import PackStore
+
+def saved_images(folder):
+    return sorted(name for name in os.listdir(folder) if name.endswith('.jpg'))
+
+def test_files_are_named_by_fbid(mock_site, scraper, tmp_path):
+    links = tmp_path / "links.json"
+    mock_site.write_link_file(links, 2)
+    summary = scraper.run(str(links), str(tmp_path / "out"))
+
+    assert summary.images == 8
+    assert saved_images(tmp_path / "out") == sorted(f"fb_{post_id * 1000 + index}_1.jpg"
+                                                    for post_id in (100000, 100001) for index in range(4))
+
+def test_resume_downloads_only_new_posts(mock_site, scraper, tmp_path):
+    links = tmp_path / "links.json"
+    out = str(tmp_path / "out")
+    mock_site.write_link_file(links, 2)
+    assert scraper.run(str(links), out).images == 8
+
+    # The same posts again download nothing; a post added since is the only work left
+    assert scraper.run(str(links), out).images == 0
+    mock_site.write_link_file(links, 3)
+    summary = scraper.run(str(links), out)
+
+    assert summary.images == 4
+    assert summary.photo_links == 4
+    assert len(saved_images(out)) == 12
+
+def test_shared_photos_are_downloaded_once(mock_site, scraper, tmp_path):
+    # The second post links to the first post's photos through its own set, then to its own photos
+    first = mock_site.post_links(100000)
+    second = [link.replace("set=pcb.100000", "set=pcb.100001") for link in first] + mock_site.post_links(100001)
+    links = tmp_path / "links.json"
+    links.write_text(json.dumps({f"{mock_site.page_base}/posts/100000": first,
+                                 f"{mock_site.page_base}/posts/100001": second}))
+    summary = scraper.run(str(links), str(tmp_path / "out"))
+
+    assert summary.images == 8
+    assert summary.photo_links == 8
+    assert len(saved_images(tmp_path / "out")) == 8
+
+def test_follow_mode_downloads_while_the_stream_is_written(mock_site, scraper, monkeypatch, tmp_path):
+    monkeypatch.setattr(scraper, "DOWNLOAD_ENGINE", "asyncio")
+    links = str(tmp_path / "links.jsonl")
+    out = tmp_path / "out"
+    writer = LinkStreamWriter(links)
+    writer.write(f"{mock_site.page_base}/posts/100000", mock_site.post_links(100000))
+    downloaded_before_second_post = []
+
+    def write_rest():
+        deadline = time.time() + 20
+        while time.time() < deadline and not (out.is_dir() and saved_images(out)):
+            time.sleep(0.05)
+        downloaded_before_second_post.append(bool(out.is_dir() and saved_images(out)))
+        writer.write(f"{mock_site.page_base}/posts/100001", mock_site.post_links(100001))
+        writer.close()
+
+    thread = threading.Thread(target=write_rest)
+    thread.start()
+    summary = scraper.run(links, str(out), follow=True)
+    thread.join()
+
+    assert downloaded_before_second_post == [True]
+    assert summary.images == 8
+
+def test_pack_entries_lost_in_a_crash_are_downloaded_again(mock_site, scraper, monkeypatch, tmp_path):
+    monkeypatch.setattr(scraper, "OUTPUT_MODE", "pack")
+    links = tmp_path / "links.json"
+    out = tmp_path / "out"
+    packs = out / scraper.PACK_STORE_DIR
+    mock_site.write_link_file(links, 2)
+    assert scraper.run(str(links), str(out)).images == 8
+
+    # A crash after the last image was appended but before its index commit leaves bytes no entry covers
+    with sqlite3.connect(packs / "index.sqlite") as conn:
+        key, pack, offset, length = conn.execute(
+            "SELECT key, pack, offset, length FROM entries ORDER BY pack DESC, offset DESC LIMIT 1").fetchone()
+        conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+    assert os.path.getsize(packs / pack) == offset + length
+
+    summary = scraper.run(str(links), str(out))
+
+    assert summary.images == 1
+    assert os.path.getsize(packs / pack) == offset + length
+    with PackStore(str(packs)) as store:
+        assert len(store.keys()) == 8
+        fbid, _, index = key.rpartition('/')
+        assert len(store.read(fbid, int(index))) == mock_site.image_for(fbid)[2]
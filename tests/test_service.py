@@ -0,0 +1,48 @@
+"""Unit tests for the extraction service's job parsing and manifest resume (no browsers started)."""
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+import requests
+
+import service_script
+from job_manifest import JobManifest
+from service_script import ExtractionService, ServiceHandler, parse_job
+
+@pytest.mark.parametrize("body", [b'[]', b'"urls"', b'{"urls": "https://x"}', b'{"urls": [], "expected_counts": []}',
+                                  b'{"urls": [], "expected_counts": {"https://x": "3"}}', b'not json'])
+def test_parse_job_rejects_malformed_bodies(body):
+    with pytest.raises(ValueError):
+        parse_job(body)
+
+def test_parse_job_keeps_http_urls():
+    body = json.dumps({'urls': ["https://www.facebook.com/posts/1", 7, "ftp://x"], 'expected_counts': {"a": 3}})
+    assert parse_job(body.encode()) == (["https://www.facebook.com/posts/1"], {"a": 3})
+    assert parse_job(b'') == ([], {})
+
+def test_malformed_job_gets_a_400():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ServiceHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/jobs"
+        response = requests.post(url, json={'urls': ["https://www.facebook.com/posts/1"], 'expected_counts': ["x"]},
+                                 timeout=10)
+        assert response.status_code == 400
+        assert "expected_counts" in response.json()['error']
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_resubmitted_posts_are_answered_from_the_manifest(tmp_path):
+    service = ExtractionService.__new__(ExtractionService)
+    service.manifest = JobManifest(str(tmp_path / service_script.MANIFEST_FILE))
+    service_script.record_post_result(service.manifest, "https://www.facebook.com/posts/1", ["https://p/1", "https://p/2"])
+    service_script.record_post_result(service.manifest, "https://www.facebook.com/posts/2", [])
+
+    assert service.finished_result("https://www.facebook.com/posts/1") == {
+        'url': "https://www.facebook.com/posts/1", 'links': ["https://p/1", "https://p/2"], 'tier': 'manifest'}
+    # A post that came back empty is tried again
+    assert service.finished_result("https://www.facebook.com/posts/2") is None
+    assert service.finished_result("https://www.facebook.com/posts/3") is None
+    service.manifest.close()
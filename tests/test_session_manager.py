@@ -0,0 +1,60 @@
+"""Unit tests for the shared Facebook session: validity and the asyncio engine's login refresh."""
+import asyncio
+import time
+
+import httpx
+
+import scraper_script
+from session_manager import SessionManager
+
+def session_cookies(xs, expiry=None):
+    cookies = [{'name': 'c_user', 'value': '1', 'domain': '.facebook.com', 'path': '/'},
+               {'name': 'xs', 'value': xs, 'domain': '.facebook.com', 'path': '/'},
+               {'name': 'datr', 'value': 'browser', 'domain': '.facebook.com', 'path': '/'}]
+    if expiry is not None:
+        cookies[1]['expiry'] = expiry
+    return cookies
+
+def test_session_is_valid_only_with_unexpired_auth_cookies(tmp_path):
+    manager = SessionManager(str(tmp_path / "session.json"))
+    manager.cookies = session_cookies("x", expiry=time.time() + 60)
+    assert manager.is_valid()
+    manager.cookies = session_cookies("x", expiry=time.time() - 60)
+    assert not manager.is_valid()
+    manager.cookies = session_cookies("")
+    assert not manager.is_valid()
+
+def test_async_client_gets_the_full_jar_and_logs_in_once_on_redirects(tmp_path, monkeypatch):
+    monkeypatch.setattr(scraper_script, "rate_controller", scraper_script.new_rate_controller())
+    logins = []
+
+    def login():
+        logins.append(time.time())
+        time.sleep(0.05)
+        return session_cookies("fresh")
+
+    manager = SessionManager(str(tmp_path / "session.json"), login_func=login)
+    manager.cookies = session_cookies("stale")
+    seen_cookies = []
+
+    def handler(request):
+        if request.url.path.startswith('/login'):
+            return httpx.Response(200, text="login page")
+        cookie = request.headers.get('cookie', '')
+        seen_cookies.append(cookie)
+        if 'xs=fresh' not in cookie:
+            return httpx.Response(302, headers={'Location': 'https://www.facebook.com/login/?next=x'})
+        return httpx.Response(200, text="photo page")
+
+    async def fetch_all():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            manager.apply_to_async_client(client)
+            responses = await asyncio.gather(*(
+                scraper_script.async_http_get(client, f"https://www.facebook.com/photo/?fbid={fbid}", follow_redirects=True)
+                for fbid in range(3)))
+            return [response.text for response in responses]
+
+    assert asyncio.run(fetch_all()) == ["photo page"] * 3
+    assert len(logins) == 1
+    assert 'datr=browser' in seen_cookies[0]
+    assert (tmp_path / "session.json").exists()
@@ -0,0 +1,73 @@
+"""Unit tests for sharding: the stable shard hash, shard index parsing and the manifest merge."""
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+import sharding
+from job_manifest import JobManifest, DONE, FAILED, PENDING, SKIPPED
+from sharding import merge_manifests, parse_shard_indexes, shard_links, shard_name, shard_of
+
+def test_shard_of_is_stable_and_spreads_keys():
+    keys = [f"https://www.facebook.com/posts/{post_id}" for post_id in range(1000)]
+    # Fixed values: every machine and Python process must agree on the split
+    assert [shard_of(key, 8) for key in keys[:5]] == [1, 2, 4, 7, 3]
+    assert shard_of("https://www.facebook.com/posts/1", 1) == 0
+    counts = [0] * 8
+    for key in keys:
+        counts[shard_of(key, 8)] += 1
+    assert min(counts) > 80
+
+def test_shard_of_does_not_depend_on_hash_randomization():
+    code = "import sharding; print(sharding.shard_of('https://www.facebook.com/posts/42', 16))"
+    outputs = {subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                              cwd=os.path.dirname(sharding.__file__), env={"PYTHONHASHSEED": seed}).stdout
+               for seed in ("1", "2")}
+    assert outputs == {f"{shard_of('https://www.facebook.com/posts/42', 16)}\n"}
+
+def test_shard_links_splits_posts_without_overlap():
+    items = [(f"post-{index}", [f"link-{index}"]) for index in range(50)]
+    shards = [list(shard_links(items, (index, 3))) for index in range(3)]
+    assert sorted(sum(shards, [])) == sorted(items)
+    assert list(shard_links(items)) == items
+
+def test_parse_shard_indexes():
+    assert parse_shard_indexes("3", 8) == [3]
+    assert parse_shard_indexes("0,2,5", 8) == [0, 2, 5]
+    assert parse_shard_indexes("1-3,2", 8) == [1, 2, 3]
+    with pytest.raises(ValueError):
+        parse_shard_indexes("8", 8)
+    assert shard_name(3, 8) == "shard-003-of-008"
+
+def write_manifest(path, rows):
+    with JobManifest(str(path)) as manifest:
+        for kind, key, state, parent in rows:
+            manifest.mark(kind, key, state, parent=parent)
+
+def test_merge_keeps_the_best_state_of_every_item(tmp_path):
+    write_manifest(tmp_path / "a.sqlite", [('photo', 'p1', DONE, 'post-1'), ('photo', 'p2', FAILED, None),
+                                           ('photo', 'p3', PENDING, None)])
+    write_manifest(tmp_path / "b.sqlite", [('photo', 'p1', FAILED, None), ('photo', 'p2', SKIPPED, 'post-2'),
+                                           ('image', 'i1', DONE, 'p1')])
+    merged = tmp_path / "merged.sqlite"
+
+    assert merge_manifests([str(tmp_path / "a.sqlite"), str(tmp_path / "b.sqlite")], str(merged)) == 4
+    # Merging again is idempotent
+    assert merge_manifests([str(tmp_path / "b.sqlite")], str(merged)) == 4
+    conn = sqlite3.connect(merged)
+    rows = {(kind, key): (state, parent) for kind, key, state, parent in conn.execute("SELECT kind, key, state, parent FROM jobs")}
+    conn.close()
+    assert rows == {
+        ('photo', 'p1'): (DONE, 'post-1'),
+        ('photo', 'p2'): (SKIPPED, 'post-2'),
+        ('photo', 'p3'): (PENDING, None),
+        ('image', 'i1'): (DONE, 'p1'),
+    }
+
+def test_failed_scrape_shard_exits_non_zero(tmp_path):
+    result = subprocess.run([sys.executable, sharding.__file__, "scrape", str(tmp_path / "missing.json"), str(tmp_path / "out"),
+                             "--shards", "2", "--shard", "1"], capture_output=True, text=True, timeout=120)
+    assert result.returncode == 1
+    assert "not found" in result.stdout